@@ -0,0 +1,45 @@
+"""
+Setup and helpers shared by the scripts in bench/.
+
+Scripts that import main in process call setup() before that import: it
+points DB_FILE at a throwaway database, turns the keep-alive ping off and
+makes the repo root importable and current. Scripts that only drive a
+server in a subprocess just use ROOT.
+"""
+import os
+import socket
+import sys
+import tempfile
+
+ROOT  = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEAMS = ["Ferrari", "McLaren", "Mercedes", "Red Bull", "Aston Martin",
+         "Alpine", "Williams", "Haas", "Sauber", "RB"]
+
+
+def temp_db() -> str:
+    """Path to a database file in a fresh temp directory."""
+    return os.path.join(tempfile.mkdtemp(prefix="shrimp-bench-"), "bench.db")
+
+
+def use_root():
+    sys.path.insert(0, ROOT)
+    os.chdir(ROOT)
+
+
+def setup(**env: str) -> str:
+    """Environment for an in-process `import main`; returns the DB path."""
+    db_file = temp_db()
+    os.environ.update(DB_FILE=db_file, KEEPALIVE_URL="", **env)
+    use_root()
+    return db_file
+
+
+def pct(values: list, p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else float("nan")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
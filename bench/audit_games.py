@@ -0,0 +1,96 @@
+"""
+RTP / house-edge audit for every registered game, and a regression check.
+
+Simulates `--rounds` rounds of each payout table (and the weighted /gamble
+mix) with NumPy through the same alias sampling the games use, and prints
+simulated vs exact RTP, spread and a 95% CI. `--players` also gambles a
+synthetic channel economy forward to show how its supply drifts.
+
+    python bench/audit_games.py [--rounds 10000000] [--wager 100] [--seed 1]
+    python bench/audit_games.py --write-baseline   # after an intended table change
+    python bench/audit_games.py --check            # exit 1 if tables or sampling drifted
+
+--check compares each game's exact RTP and variance with bench/audit_baseline.json
+and fails if a table changed without the baseline being rewritten, or if a
+simulated RTP lands more than 4 standard errors from its exact value.
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import time
+
+from _common import ROOT, setup
+
+setup()
+
+import main  # noqa: E402
+
+BASELINE = os.path.join(ROOT, "bench", "audit_baseline.json")
+
+
+def check(report: dict, baseline: dict) -> list:
+    problems = []
+    for name, a in report.items():
+        base = baseline.get(name)
+        if base is None:
+            problems.append(f"{name}: not in baseline")
+            continue
+        if a["wager"] != base["wager"]:
+            problems.append(f"{name}: baseline is for wager {base['wager']}, not {a['wager']}")
+            continue
+        for key in ("exact_rtp", "exact_variance"):
+            if not math.isclose(a[key], base[key], rel_tol=1e-9, abs_tol=1e-12):
+                problems.append(f"{name}: {key} {base[key]:.6f} -> {a[key]:.6f}")
+        stderr = math.sqrt(a["exact_variance"] / a["rounds"])
+        if abs(a["rtp"] - a["exact_rtp"]) > 4 * stderr:
+            problems.append(f"{name}: simulated RTP {a['rtp']:.5f} is off exact {a['exact_rtp']:.5f}")
+    problems += [f"{name}: missing from registry" for name in baseline if name not in report]
+    return problems
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    p.add_argument("--rounds", type=int, default=10_000_000)
+    p.add_argument("--wager", type=int, default=100)
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--players", type=int, default=0, help="synthetic holders for the economy run")
+    p.add_argument("--balance", type=int, default=1000, help="starting balance per holder")
+    p.add_argument("--economy-rounds", type=int, default=100)
+    p.add_argument("--json", action="store_true", help="print the report as JSON")
+    p.add_argument("--check", action="store_true")
+    p.add_argument("--write-baseline", action="store_true")
+    args = p.parse_args()
+
+    start  = time.perf_counter()
+    report = main.audit_games(args.rounds, args.wager, args.seed)
+    elapsed = time.perf_counter() - start
+    economy = (main.simulate_economy([args.balance] * args.players, args.economy_rounds, args.wager, args.seed)
+               if args.players else None)
+
+    if args.json:
+        print(json.dumps({"games": report, "economy": economy, "seconds": elapsed}, indent=2))
+    else:
+        print(f"{args.rounds} rounds per game at wager {args.wager} in {elapsed:.1f}s")
+        for line in main.format_audit(report):
+            print("  " + line)
+        if economy:
+            print(f"economy: {economy['holders']} holders x {economy['rounds']} rounds, "
+                  f"supply {economy['start_total']} -> {economy['end_total']} ({economy['drift']:+.1%}), "
+                  f"{economy['broke']} broke, median {economy['median_balance']:.0f}")
+
+    if args.write_baseline:
+        with open(BASELINE, "w") as f:
+            json.dump({name: {key: a[key] for key in ("wager", "exact_rtp", "exact_variance")}
+                       for name, a in report.items()}, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+        print(f"wrote {os.path.relpath(BASELINE, ROOT)}", file=sys.stderr)
+    if args.check:
+        with open(BASELINE) as f:
+            problems = check(report, json.load(f))
+        for line in problems:
+            print("FAIL " + line, file=sys.stderr)
+        if problems:
+            sys.exit(1)
+        print("audit matches baseline", file=sys.stderr)
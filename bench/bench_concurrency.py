@@ -0,0 +1,87 @@
+"""
+Concurrency benchmark: tail latency with many chat commands in flight.
+
+Fires `--concurrency` simultaneous /points, /add, /gamble and /rob requests at
+the app in-process (httpx ASGI transport, temp database) and reports request
+latency percentiles plus how late the event loop ran a 10 ms heartbeat while
+the burst was being served.
+
+    python bench/bench_concurrency.py [--concurrency 500] [--rounds 5] [--users 200]
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+from _common import pct, setup
+
+setup()
+
+import httpx  # noqa: E402
+import main   # noqa: E402
+
+
+async def heartbeat(lags: list, stop: asyncio.Event, every: float = 0.01):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(every)
+        lags.append(time.perf_counter() - start - every)
+
+
+async def run(concurrency: int, rounds: int, users: int, seed: int):
+    rnd   = random.Random(seed)
+    random.seed(seed)
+    names = [f"user{i}" for i in range(users)]
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await asyncio.gather(*(client.get("/add", params={"user": u, "amount": 10_000}) for u in names))
+
+        def command():
+            u = rnd.choice(names)
+            kind = rnd.random()
+            if kind < 0.4:
+                return "/points", {"user": u}
+            if kind < 0.6:
+                return "/add", {"user": u, "amount": 5}
+            if kind < 0.9:
+                return "/gamble", {"user": u, "wager": str(rnd.randint(1, 50))}
+            return "/rob", {"robber": u, "victim": rnd.choice(names)}
+
+        async def timed(path, params):
+            start = time.perf_counter()
+            r = await client.get(path, params=params)
+            return time.perf_counter() - start, r.status_code
+
+        latencies, lags, errors = [], [], 0
+        stop = asyncio.Event()
+        beat = asyncio.create_task(heartbeat(lags, stop))
+        wall = time.perf_counter()
+        for _ in range(rounds):
+            results = await asyncio.gather(*(timed(*command()) for _ in range(concurrency)))
+            latencies += [t for t, _ in results]
+            errors    += sum(1 for _, code in results if code >= 500)
+        wall = time.perf_counter() - wall
+        stop.set()
+        await beat
+
+    ms = lambda s: s * 1000  # noqa: E731
+    print(f"{len(latencies)} requests, {concurrency} in flight, {wall:.2f}s "
+          f"({len(latencies) / wall:.0f} req/s), {errors} server errors")
+    print(f"latency   p50 {ms(pct(latencies, .50)):7.1f} ms   p95 {ms(pct(latencies, .95)):7.1f} ms   "
+          f"p99 {ms(pct(latencies, .99)):7.1f} ms   max {ms(max(latencies)):7.1f} ms")
+    if lags:
+        print(f"loop lag  mean {ms(statistics.mean(lags)):6.2f} ms   p99 {ms(pct(lags, .99)):6.2f} ms   "
+              f"max {ms(max(lags)):6.2f} ms")
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    p.add_argument("--concurrency", type=int, default=500)
+    p.add_argument("--rounds", type=int, default=5)
+    p.add_argument("--users", type=int, default=200)
+    p.add_argument("--seed", type=int, default=1)
+    args = p.parse_args()
+    asyncio.run(run(args.concurrency, args.rounds, args.users, args.seed))
+    main.dbx.close()
+    main.db.close()
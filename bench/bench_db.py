@@ -0,0 +1,103 @@
+"""
+Micro-benchmark: per-call cost of the points/settings helpers.
+
+Compares the old connect-per-call pattern against the shared connection pool
+in main.py on a throwaway database. The pooled helpers are coroutines; each
+call is awaited on its own, so "after" includes the hop to the executor.
+
+    python bench/bench_db.py [--calls 20000] [--users 1000]
+"""
+import argparse
+import asyncio
+import random
+import sqlite3
+import time
+
+from _common import setup
+
+setup()
+
+import main  # noqa: E402
+
+CHANNEL = "bench"
+
+
+# ——— "before": one connection per call, as the helpers used to do ——————————
+def old_get_points(user: str, channel: str) -> int:
+    conn = sqlite3.connect(main.DB_FILE)
+    c = conn.cursor()
+    c.execute("SELECT points FROM users WHERE channel = ? AND username = ?", (channel, user))
+    row = c.fetchone()
+    conn.close()
+    return row[0] if row else 0
+
+def old_add_points(user: str, channel: str, amount: int):
+    conn = sqlite3.connect(main.DB_FILE)
+    c = conn.cursor()
+    c.execute("""
+      INSERT INTO users(channel, username, points)
+      VALUES(?, ?, ?)
+      ON CONFLICT(channel, username) DO UPDATE
+        SET points = points + ?
+    """, (channel, user, amount, amount))
+    conn.commit()
+    conn.close()
+
+def old_get_points_name(channel: str) -> str:
+    conn = sqlite3.connect(main.DB_FILE)
+    c = conn.cursor()
+    c.execute("SELECT points_name FROM settings WHERE channel = ?", (channel,))
+    row = c.fetchone()
+    conn.close()
+    return row[0] if row else "points"
+
+
+def timed(label: str, fn, calls: int) -> float:
+    start = time.perf_counter()
+    for i in range(calls):
+        fn(i)
+    elapsed = time.perf_counter() - start
+    per_call = elapsed / calls * 1e6
+    print(f"  {label:<28} {per_call:9.1f} µs/call  ({calls} calls)")
+    return per_call
+
+
+def main_bench(calls: int, users: int):
+    names = [f"user{i}" for i in range(users)]
+    loop  = asyncio.new_event_loop()
+    rnd   = random.Random(1)
+
+    # the "before" helpers open their own connections, so create the schema
+    # up front rather than waiting for the pool's first connection
+    with main.db.connection() as conn:
+        main.init_db(conn, force=True)
+    print(f"DB: {main.DB_FILE}")
+    results = {}
+    for label, get_pts, add_pts, get_name in (
+        ("before (connect per call)", old_get_points, old_add_points, old_get_points_name),
+        ("after (shared pool)",
+         lambda u, c: loop.run_until_complete(main.get_points_table(u, c)),
+         lambda u, c, a: loop.run_until_complete(main.add_user_points(u, c, a)),
+         lambda c: loop.run_until_complete(main.get_points_name(c))),
+    ):
+        print(label)
+        results[label] = (
+            timed("get_points_table", lambda i: get_pts(rnd.choice(names), CHANNEL), calls),
+            timed("add_user_points", lambda i: add_pts(rnd.choice(names), CHANNEL, 1), calls),
+            timed("get_points_name", lambda i: get_name(CHANNEL), calls),
+        )
+
+    before, after = results.values()
+    print("speedup")
+    for name, b, a in zip(("get_points_table", "add_user_points", "get_points_name"), before, after):
+        print(f"  {name:<28} {b / a:9.1f}x")
+    loop.close()
+    main.db.close()
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    p.add_argument("--calls", type=int, default=20000)
+    p.add_argument("--users", type=int, default=1000)
+    args = p.parse_args()
+    main_bench(args.calls, args.users)
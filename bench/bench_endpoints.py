@@ -0,0 +1,176 @@
+"""
+Endpoint benchmark suite: throughput and latency percentiles per endpoint.
+
+Drives the app in process (httpx ASGI transport) against a temp database
+and a local fake Twitch IRC server, with the app's own startup/shutdown
+hooks running around it. Every scenario fires `--requests` requests with
+`--concurrency` in flight; RNG is seeded so runs are comparable. Results
+print as a table; `--json PATH` also writes them machine-readable for
+tracking regressions between versions.
+
+    python bench/bench_endpoints.py [--concurrency 50] [--requests 1000]
+        [--users 1000] [--chatters 1000] [--drivers 20] [--races 200]
+        [--only gamble,points] [--json results.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import time
+from contextlib import asynccontextmanager
+
+from _common import ROOT, TEAMS, pct, setup
+
+setup(REWARD_INTERVAL=os.getenv("REWARD_INTERVAL", "3600"))
+
+import httpx  # noqa: E402
+import main   # noqa: E402
+from fake_irc import FakeTwitchIRC  # noqa: E402
+
+CHANNEL = "bench"
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """Run the app's startup and shutdown hooks the way a server would."""
+    inbox, outbox = asyncio.Queue(), asyncio.Queue()
+    task = asyncio.create_task(app({"type": "lifespan", "asgi": {"version": "3.0"}, "state": {}},
+                                   inbox.get, outbox.put))
+    await inbox.put({"type": "lifespan.startup"})
+    msg = await outbox.get()
+    if msg["type"] != "lifespan.startup.complete":
+        raise RuntimeError(f"startup failed: {msg}")
+    try:
+        yield
+    finally:
+        await inbox.put({"type": "lifespan.shutdown"})
+        await outbox.get()
+        await task
+
+
+def scenarios(rnd: random.Random, users: list, race_ids: list) -> dict:
+    """name -> (request count cap or None, factory returning (method, path, params))."""
+    pending = iter(race_ids)
+    u = lambda: rnd.choice(users)  # noqa: E731
+    return {
+        "points":       (None, lambda: ("GET", "/points", {"user": u(), "channel": CHANNEL})),
+        "add":          (None, lambda: ("GET", "/add", {"user": u(), "amount": 5, "channel": CHANNEL})),
+        "gamble":       (None, lambda: ("GET", "/gamble", {"user": u(), "wager": rnd.randint(1, 50),
+                                                           "channel": CHANNEL})),
+        "slots":        (None, lambda: ("GET", "/slots", {"user": u(), "wager": rnd.randint(1, 50),
+                                                          "channel": CHANNEL})),
+        "blackjack":    (None, lambda: ("GET", "/blackjack", {"user": u(), "wager": rnd.randint(1, 50),
+                                                              "channel": CHANNEL})),
+        "rob":          (None, lambda: ("GET", "/rob", {"robber": u(), "victim": u(), "channel": CHANNEL})),
+        "leaderboard":  (None, lambda: ("GET", "/leaderboard", {"limit": 10, "channel": CHANNEL})),
+        "rank":         (None, lambda: ("GET", "/rank", {"user": u(), "channel": CHANNEL})),
+        "addall":       (None, lambda: ("GET", "/addall", {"amount": 1, "channel": CHANNEL})),
+        "join":         (None, lambda: ("GET", "/join", {"user": u(), "channel": CHANNEL})),
+        "drivers":      (None, lambda: ("GET", "/drivers", {})),
+        "races":        (None, lambda: ("GET", "/races", {})),
+        "standings_drivers": (None, lambda: ("GET", "/standings/drivers", {})),
+        "standings_teams":   (None, lambda: ("GET", "/standings/teams", {})),
+        "run_race":     (len(race_ids), lambda: ("POST", f"/races/{next(pending)}/run", {})),
+        "projection":   (20, lambda: ("GET", "/projection", {"sims": 10000, "seed": rnd.randrange(1 << 30)})),
+    }
+
+
+async def seed_data(client: httpx.AsyncClient, users: list, n_drivers: int, n_races: int, seed: int) -> list:
+    await main.bulk_add_points(users, CHANNEL, 10_000)
+    rnd = random.Random(seed)
+    for i in range(n_drivers):
+        (await client.post("/drivers", params={"name": f"Driver {i}", "team": TEAMS[i % len(TEAMS)],
+                                               "skill": round(rnd.random(), 3)})).raise_for_status()
+    race_ids = []
+    for i in range(n_races):
+        r = await client.post("/races", params={"name": f"Grand Prix {i}", "track": f"Track {i % 24}"})
+        r.raise_for_status()
+        race_ids.append(r.json()["id"])
+    # a raffle long enough to outlive the run, for /join
+    (await client.get("/raffle", params={"amount": 1000, "channel": CHANNEL,
+                                         "duration": 24 * 3600})).raise_for_status()
+    return race_ids
+
+
+async def run_scenario(client, factory, total: int, concurrency: int) -> dict:
+    latencies, statuses = [], {}
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one():
+        method, path, params = factory()
+        async with sem:
+            start = time.perf_counter()
+            r = await client.request(method, path, params=params)
+            latencies.append(time.perf_counter() - start)
+        statuses[r.status_code] = statuses.get(r.status_code, 0) + 1
+
+    wall = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    wall = time.perf_counter() - wall
+    return {
+        "requests": total, "seconds": wall, "rps": total / wall,
+        "p50_ms": pct(latencies, .50) * 1000, "p95_ms": pct(latencies, .95) * 1000,
+        "p99_ms": pct(latencies, .99) * 1000, "max_ms": max(latencies) * 1000,
+        "status": statuses,
+    }
+
+
+def version() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def run(args) -> dict:
+    random.seed(args.seed)
+    rnd   = random.Random(args.seed)
+    users = [f"user{i}" for i in range(args.users)]
+    irc   = await FakeTwitchIRC().start()
+    irc.set_members(CHANNEL, users[:args.chatters])
+    main.presence.host, main.presence.port = irc.host, irc.port
+
+    results = {}
+    try:
+        async with lifespan(main.app):
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+                race_ids = await seed_data(client, users, args.drivers, args.races, args.seed)
+                await main.presence.track(CHANNEL)
+                table = scenarios(rnd, users, race_ids)
+                for name in args.only or table:
+                    cap, factory = table[name]
+                    total = min(args.requests, cap) if cap is not None else args.requests
+                    results[name] = await run_scenario(client, factory, total, args.concurrency)
+                    r = results[name]
+                    print(f"{name:18s} {r['requests']:6d} req {r['rps']:9.0f} req/s   "
+                          f"p50 {r['p50_ms']:7.2f}  p95 {r['p95_ms']:7.2f}  p99 {r['p99_ms']:7.2f}  "
+                          f"max {r['max_ms']:7.2f} ms   {r['status']}")
+    finally:
+        await irc.stop()
+    return results
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    p.add_argument("--concurrency", type=int, default=50)
+    p.add_argument("--requests", type=int, default=1000, help="requests per scenario")
+    p.add_argument("--users", type=int, default=1000)
+    p.add_argument("--chatters", type=int, default=1000)
+    p.add_argument("--drivers", type=int, default=20)
+    p.add_argument("--races", type=int, default=200)
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--only", type=lambda s: [x for x in s.split(",") if x], help="comma-separated scenarios")
+    p.add_argument("--json", metavar="PATH", help="also write results as JSON")
+    args = p.parse_args()
+    results = asyncio.run(run(args))
+    if args.json:
+        meta = {"version": version(), "python": platform.python_version(),
+                "args": {k: v for k, v in vars(args).items() if k != "json"}}
+        with open(args.json, "w") as f:
+            json.dump({"meta": meta, "results": results}, f, indent=2)
+            f.write("\n")
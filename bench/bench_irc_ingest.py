@@ -0,0 +1,145 @@
+"""
+Chatter ingest: how fast a NAMES list of `--names` chatters gets absorbed.
+
+Two parts, neither touching the network:
+
+  parse      feeds a pre-built byte stream (353 lines of `--per-line` names,
+             optionally interleaved with tagged PRIVMSG noise) through an
+             asyncio.StreamReader into the old readline/str handling and into
+             ChatPresence's bytes path; reports chatters/sec and peak memory.
+  loopback   runs ChatPresence against the local fake IRC server in several
+             scripted modes (plain burst, trickled slow link, server PINGs,
+             disconnect mid-burst) and times JOIN -> synced presence.
+
+    python bench/bench_irc_ingest.py [--names 100000] [--per-line 100] [--noise 0.5]
+"""
+import argparse
+import asyncio
+import gc
+import random
+import time
+import tracemalloc
+
+from _common import setup
+
+setup()
+
+import main  # noqa: E402
+from fake_irc import FakeTwitchIRC  # noqa: E402
+
+CHANNEL = "bench"
+TAGS    = ("@badge-info=;badges=;color=#1E90FF;display-name={nick};emotes=;id={i};mod=0;"
+           "room-id=1;subscriber=0;tmi-sent-ts=0;turbo=0;user-type=")
+
+
+def build_stream(names: list, per_line: int, noise: float, seed: int) -> bytes:
+    rnd, lines = random.Random(seed), []
+    for i in range(0, len(names), per_line):
+        lines.append(f":bot.tmi.twitch.tv 353 bot = #{CHANNEL} :{' '.join(names[i:i + per_line])}")
+        while rnd.random() < noise:
+            nick = rnd.choice(names)
+            lines.append(TAGS.format(nick=nick, i=len(lines)) +
+                         f" :{nick}!{nick}@{nick}.tmi.twitch.tv PRIVMSG #{CHANNEL} :hello chat")
+    lines.append(f":bot.tmi.twitch.tv 366 bot #{CHANNEL} :End of /NAMES list")
+    return ("\r\n".join(lines) + "\r\n").encode()
+
+
+def reader_for(stream: bytes) -> asyncio.StreamReader:
+    reader = asyncio.StreamReader(limit=2**20)
+    for i in range(0, len(stream), 65536):   # arrive in socket-sized pieces
+        reader.feed_data(stream[i:i + 65536])
+    reader.feed_eof()
+    return reader
+
+
+# ——— "before": the per-line str handling fetch_chatters_irc used to do ———————
+async def legacy_ingest(stream: bytes) -> set:
+    reader, chatters = reader_for(stream), set()
+    while True:
+        line = await reader.readline()
+        if not line:
+            break
+        text = line.decode(errors="ignore").strip()
+        if text.startswith("PING"):
+            pass
+        elif " 353 " in text:
+            parts = text.split(" :", 1)
+            if len(parts) == 2:
+                for raw in parts[1].split():
+                    chatters.add(raw.lstrip("@+%~&"))
+        elif " 366 " in text:
+            break
+    return chatters
+
+
+# ——— "after": ChatPresence's read loop body ——————————————————————————
+async def presence_ingest(stream: bytes) -> set:
+    reader, lines = reader_for(stream), main.IrcLineBuffer()
+    presence = main.ChatPresence("127.0.0.1", 0, "bot", "oauth:x")
+    while True:
+        data = await reader.read(main.IRC_MAX_LINE)
+        if not data:
+            break
+        await presence._handle_all(lines.feed(data))
+    return presence.members[CHANNEL]
+
+
+def measure(label: str, fn, stream: bytes, n: int, repeat: int = 3):
+    loop = asyncio.new_event_loop()
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        got = loop.run_until_complete(fn(stream))
+        best = min(best, time.perf_counter() - start)
+    assert len(got) == n, f"{label}: {len(got)} chatters, expected {n}"
+    gc.collect()
+    tracemalloc.start()
+    loop.run_until_complete(fn(stream))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    loop.close()
+    print(f"  {label:10s} {best * 1000:8.1f} ms   {n / best / 1e6:6.2f} M chatters/s   "
+          f"peak {peak / 2**20:6.1f} MiB")
+
+
+async def loopback(names: list, per_line: int):
+    async def timed(label: str, **script):
+        irc = FakeTwitchIRC()
+        irc.names_per_line = per_line
+        for key, value in script.items():
+            setattr(irc, key, value)
+        await irc.start()
+        irc.set_members(CHANNEL, names)
+        presence = main.ChatPresence(irc.host, irc.port, "bot", "oauth:x")
+        start = time.perf_counter()
+        got = await presence.chatters(CHANNEL, timeout=60)
+        elapsed = time.perf_counter() - start
+        if irc.ping_every:
+            await asyncio.sleep(irc.ping_every * 3)
+        await presence.stop()
+        await irc.stop()
+        extra = f", {irc.pongs()} PONGs" if irc.ping_every else ""
+        print(f"  {label:24s} {elapsed * 1000:8.1f} ms to sync {len(got)} chatters{extra}")
+
+    await timed("burst")
+    await timed("trickle 1460B/0.2ms", trickle=(1460, 0.0002))
+    await timed("PING every 50ms", ping_every=0.05)
+    await timed("drop mid-burst, resync", drop_after=len(names) // per_line // 2)
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    p.add_argument("--names", type=int, default=100_000)
+    p.add_argument("--per-line", type=int, default=100)
+    p.add_argument("--noise", type=float, default=0.5, help="chance of PRIVMSG lines between 353s")
+    p.add_argument("--seed", type=int, default=1)
+    args = p.parse_args()
+
+    names  = [f"viewer{i}" for i in range(args.names)]
+    stream = build_stream(names, args.per_line, args.noise, args.seed)
+    print(f"parse: {args.names} chatters, {len(stream) / 2**20:.1f} MiB of IRC")
+    measure("readline", legacy_ingest, stream, args.names)
+    measure("bytes", presence_ingest, stream, args.names)
+    print("loopback:")
+    asyncio.run(loopback(names, args.per_line))
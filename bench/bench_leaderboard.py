@@ -0,0 +1,102 @@
+"""
+Leaderboard and rank latency at scale.
+
+Fills one channel with `--users` balances (default 1M) and times the top-N
+query and the rank lookup three ways: a plain table scan (index dropped), the
+users_by_points index, and the in-memory LeaderboardView.
+
+    python bench/bench_leaderboard.py [--users 1000000] [--limit 10] [--samples 200]
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from _common import setup
+
+setup()
+
+import main  # noqa: E402
+
+CHANNEL  = "bench"
+TOP_SQL  = "SELECT username, points FROM users WHERE channel = ? ORDER BY points DESC, username LIMIT ?"
+RANK_SQL = "SELECT COUNT(*) FROM users WHERE channel = ? AND points > ?"
+
+
+def populate(users: int, seed: int):
+    rnd = random.Random(seed)
+    start = time.perf_counter()
+    with main.db.connection() as conn:
+        conn.executemany(
+            "INSERT INTO users(channel, username, points) VALUES(?, ?, ?)",
+            ((CHANNEL, f"user{i}", int(rnd.paretovariate(1.2) * 100)) for i in range(users))
+        )
+    print(f"populated {users} users in {time.perf_counter() - start:.1f}s")
+
+
+def time_calls(fn, samples: int) -> tuple:
+    times = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    times.sort()
+    return times[len(times) // 2] * 1000, times[int(len(times) * 0.99)] * 1000
+
+
+def report(label: str, p50: float, p99: float):
+    print(f"  {label:<34} p50 {p50:9.3f} ms   p99 {p99:9.3f} ms")
+
+
+def run(users: int, limit: int, samples: int, seed: int):
+    populate(users, seed)
+    rnd   = random.Random(seed + 1)
+    names = [f"user{rnd.randrange(users)}" for _ in range(samples)]
+    points = dict(main.db.fetchall(
+        f"SELECT username, points FROM users WHERE channel = ? AND username IN ({','.join('?' * len(names))})",
+        (CHANNEL, *names)
+    ))
+    picks = iter(names * 2)
+
+    def top():
+        main.db.fetchall(TOP_SQL, (CHANNEL, limit))
+
+    def rank():
+        main.db.fetchone(RANK_SQL, (CHANNEL, points[next(picks)]))
+
+    with main.db.connection() as conn:
+        conn.execute("DROP INDEX users_by_points")
+    print("without index (full scan + sort)")
+    slow = max(3, samples // 20)
+    report(f"leaderboard top {limit}", *time_calls(top, slow))
+    report("rank (count above)", *time_calls(rank, slow))
+
+    start = time.perf_counter()
+    with main.db.connection() as conn:
+        main.init_db(conn, force=True)
+    print(f"built users_by_points in {time.perf_counter() - start:.1f}s")
+    print("with users_by_points index")
+    report(f"leaderboard top {limit}", *time_calls(top, samples))
+    report("rank (count above, random user)", *time_calls(rank, samples))
+
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(main.leaderboards.top(CHANNEL, limit))
+    leaders = [u for u, _ in loop.run_until_complete(main.leaderboards.top(CHANNEL, main.leaderboards.size))]
+    print(f"in-memory view (top {main.leaderboards.size})")
+    report(f"leaderboard top {limit}",
+           *time_calls(lambda: loop.run_until_complete(main.leaderboards.top(CHANNEL, limit)), samples))
+    report("rank (user in view)",
+           *time_calls(lambda: main.leaderboards.rank(CHANNEL, rnd.choice(leaders)), samples))
+    loop.run_until_complete(asyncio.to_thread(main.dbx.close))
+    loop.close()
+    main.db.close()
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    p.add_argument("--users", type=int, default=1_000_000)
+    p.add_argument("--limit", type=int, default=10)
+    p.add_argument("--samples", type=int, default=200)
+    p.add_argument("--seed", type=int, default=1)
+    args = p.parse_args()
+    run(args.users, args.limit, args.samples, args.seed)
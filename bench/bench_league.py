@@ -0,0 +1,115 @@
+"""
+F1 league restart cost: bulk load time and resident memory.
+
+Writes `--drivers` drivers and `--races` completed races (each with a
+`--field`-driver finishing order) to a temp database, then times
+load_league() and measures the memory the in-memory index takes. For
+reference it also measures the same drivers held as pydantic models.
+
+    python bench/bench_league.py [--drivers 100000] [--races 10000] [--field 20]
+"""
+import argparse
+import asyncio
+import gc
+import os
+import random
+import time
+import tracemalloc
+from array import array
+
+from _common import TEAMS, setup
+
+setup()
+
+import main  # noqa: E402
+
+
+def rss_mib() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def populate(n_drivers: int, n_races: int, field: int, seed: int):
+    rnd   = random.Random(seed)
+    start = time.perf_counter()
+    with main.db.connection() as conn:
+        conn.executemany(
+            "INSERT INTO f1_drivers(id, name, team, skill, points, podiums, races) VALUES(?, ?, ?, ?, ?, ?, ?)",
+            ((i, f"Driver {i}", rnd.choice(TEAMS), rnd.random(), rnd.randrange(500),
+              rnd.randrange(20), rnd.randrange(100)) for i in range(1, n_drivers + 1))
+        )
+        conn.executemany(
+            "INSERT INTO f1_races(id, name, track, laps, completed) VALUES(?, ?, ?, ?, 1)",
+            ((i, f"Grand Prix {i}", f"Track {i % 40}", 58) for i in range(1, n_races + 1))
+        )
+        conn.executemany(
+            "INSERT INTO f1_results(race_id, finish) VALUES(?, ?)",
+            ((i, array("I", rnd.sample(range(1, n_drivers + 1), field)).tobytes())
+             for i in range(1, n_races + 1))
+        )
+    print(f"wrote {n_drivers} drivers, {n_races} races x {field} finishers "
+          f"in {time.perf_counter() - start:.1f}s "
+          f"({os.path.getsize(main.DB_FILE) / 2**20:.1f} MiB on disk)")
+
+
+def measure_load():
+    loop = asyncio.new_event_loop()
+    gc.collect()
+    rss0 = rss_mib()
+    start = time.perf_counter()
+    loop.run_until_complete(main.load_league())
+    elapsed = time.perf_counter() - start
+    rss1 = rss_mib()
+    # second, traced load for the heap figure (tracing slows the load itself)
+    main.drivers.clear()
+    main.races.clear()
+    gc.collect()
+    tracemalloc.start()
+    loop.run_until_complete(main.load_league())
+    traced, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"load_league: {elapsed:.2f}s, {len(main.drivers)} drivers, {len(main.races)} races")
+    print(f"  python heap held by the league  {traced / 2**20:8.1f} MiB")
+    print(f"  process RSS growth              {rss1 - rss0:8.1f} MiB")
+    loop.run_until_complete(asyncio.to_thread(main.dbx.close))
+    loop.close()
+
+
+def measure_pydantic():
+    try:
+        from pydantic import BaseModel, Field
+    except ImportError:
+        return
+
+    class PydanticDriver(BaseModel):
+        id: int
+        name: str
+        team: str
+        skill: float = Field(ge=0.0, le=1.0)
+        points: int = 0
+        podiums: int = 0
+        races: int = 0
+
+    gc.collect()
+    tracemalloc.start()
+    start  = time.perf_counter()
+    models = [PydanticDriver(id=d.id, name=d.name, team=d.team, skill=d.skill, points=d.points,
+                             podiums=d.podiums, races=d.races) for d in main.drivers.values()]
+    elapsed = time.perf_counter() - start
+    traced, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"reference: same drivers as pydantic models  {traced / 2**20:8.1f} MiB "
+          f"(built in {elapsed:.2f}s, {len(models)} objects)")
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    p.add_argument("--drivers", type=int, default=100_000)
+    p.add_argument("--races", type=int, default=10_000)
+    p.add_argument("--field", type=int, default=20)
+    p.add_argument("--seed", type=int, default=1)
+    args = p.parse_args()
+    populate(args.drivers, args.races, args.field, args.seed)
+    measure_load()
+    measure_pydantic()
+    main.db.close()
@@ -0,0 +1,83 @@
+"""
+Cold balance loads against a balance ledger that is already full.
+
+Fills a BalanceLedger to `--capacity` users, then times `--loads` gets of
+users it doesn't hold yet. Each of those reads the row and evicts one clean
+user. "before" evicts the old way, copying every cached key per eviction;
+"after" is BalanceLedger._evict, which walks from the least-recently-used
+end and stops once it's back under capacity. `--dirty` marks that share of
+the oldest users as unflushed, so eviction has to skip past them.
+
+    python bench/bench_ledger.py [--capacity 100000] [--loads 2000] [--dirty 0.1]
+"""
+import argparse
+import asyncio
+import time
+
+from _common import pct, setup
+
+setup(BALANCE_LEDGER="0")
+
+import main  # noqa: E402
+
+CHANNEL = "bench"
+
+
+class OldEvictLedger(main.BalanceLedger):
+    """_evict as it was: a full copy of the keys on every eviction."""
+    def _evict(self, keep: set = frozenset()):
+        excess = len(self._balances) - self.max_users
+        if excess <= 0:
+            return
+        for key in list(self._balances):
+            if excess <= 0:
+                break
+            if key not in self._dirty and key not in self._flushing and key not in keep:
+                del self._balances[key]
+                excess -= 1
+        if excess > 0 and self._wake is not None:
+            self._wake.set()
+
+
+async def cold_loads(ledger: main.BalanceLedger, capacity: int, loads: int, dirty: float) -> list:
+    ledger._ensure_task()
+    for i in range(capacity):
+        ledger._balances[(CHANNEL, f"warm{i}")] = 0
+    for i in range(int(capacity * dirty)):
+        ledger._dirty[(CHANNEL, f"warm{i}")] = 0
+    times = []
+    for i in range(loads):
+        start = time.perf_counter()
+        await ledger.get(f"cold{i}", CHANNEL)
+        times.append(time.perf_counter() - start)
+    if len(ledger._balances) != capacity:
+        raise AssertionError(f"ledger holds {len(ledger._balances)} users, capacity is {capacity}")
+    ledger._dirty.clear()
+    await ledger.close()
+    return times
+
+
+async def run(args):
+    await main.dbx.write(main._flush_deltas, {(CHANNEL, f"cold{i}"): i for i in range(args.loads)})
+    print(f"{args.loads} cold loads at capacity {args.capacity}, {args.dirty:.0%} of the cache dirty")
+    results = {}
+    # a long flush interval keeps the flusher from cleaning the dirty users mid-run
+    for label, cls in (("before (copy keys)", OldEvictLedger), ("after (walk from LRU)", main.BalanceLedger)):
+        ledger = cls(max_users=args.capacity, flush_interval=3600)
+        times  = await cold_loads(ledger, args.capacity, args.loads, args.dirty)
+        results[label] = sum(times) / len(times)
+        print(f"  {label:<24} mean {results[label] * 1e6:8.1f} µs   p50 {pct(times, .5) * 1e6:8.1f} µs"
+              f"   p99 {pct(times, .99) * 1e6:8.1f} µs")
+    before, after = results.values()
+    print(f"  speedup {before / after:.1f}x")
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    p.add_argument("--capacity", type=int, default=100000)
+    p.add_argument("--loads", type=int, default=2000)
+    p.add_argument("--dirty", type=float, default=0.1, help="share of the oldest users left unflushed")
+    args = p.parse_args()
+    asyncio.run(run(args))
+    main.dbx.close()
+    main.db.close()
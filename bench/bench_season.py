@@ -0,0 +1,82 @@
+"""
+Running a whole season: one /races/{id}/run call per race vs one /races/run.
+
+Enters `--drivers` drivers, schedules `--races` races, and runs them both
+ways through the app in process (httpx ASGI transport, temp database),
+resetting the league in between. Reports wall time for each path, and
+checks that both leave the standings consistent with the stored results.
+
+    python bench/bench_season.py [--drivers 1000] [--races 500]
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from _common import TEAMS, setup
+
+setup()
+
+import httpx  # noqa: E402
+import main  # noqa: E402
+
+
+async def setup(client: httpx.AsyncClient, n_drivers: int, n_races: int, seed: int) -> list:
+    await client.delete("/reset")
+    rnd = random.Random(seed)
+    for i in range(n_drivers):
+        r = await client.post("/drivers", params={"name": f"Driver {i}", "team": rnd.choice(TEAMS),
+                                                  "skill": round(rnd.random(), 3)})
+        r.raise_for_status()
+    ids = []
+    for i in range(n_races):
+        r = await client.post("/races", params={"name": f"Grand Prix {i}", "track": f"Track {i % 24}"})
+        r.raise_for_status()
+        ids.append(r.json()["id"])
+    return ids
+
+
+def check_consistent():
+    points = dict.fromkeys(main.drivers, 0)
+    for race in main.races.values():
+        for pts, did in zip(main.F1_POINTS, race.result):
+            points[did] += pts
+    assert all(d.points == points[d.id] for d in main.drivers.values()), "points drifted from results"
+    assert all(d.races == len(main.races) for d in main.drivers.values()), "race counts drifted"
+    top = main.standings.drivers_page(0, 1)[0]
+    assert top.points == max(points.values()), "standings out of order"
+
+
+async def run(n_drivers: int, n_races: int, seed: int):
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        ids = await setup(client, n_drivers, n_races, seed)
+        random.seed(seed)
+        start = time.perf_counter()
+        for rid in ids:
+            (await client.post(f"/races/{rid}/run")).raise_for_status()
+        per_race = time.perf_counter() - start
+        check_consistent()
+
+        await setup(client, n_drivers, n_races, seed)
+        start = time.perf_counter()
+        r = await client.post("/races/run", params={"seed": seed, "limit": 0})
+        r.raise_for_status()
+        batch = time.perf_counter() - start
+        check_consistent()
+
+    print(f"{n_drivers} drivers x {n_races} races")
+    print(f"  per-race calls  {per_race:8.2f}s  ({per_race / n_races * 1000:.2f} ms/race)")
+    print(f"  one batch call  {batch:8.2f}s  ({r.text.splitlines()[0]})")
+    print(f"  speedup         {per_race / batch:8.1f}x")
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    p.add_argument("--drivers", type=int, default=1000)
+    p.add_argument("--races", type=int, default=500)
+    p.add_argument("--seed", type=int, default=1)
+    args = p.parse_args()
+    asyncio.run(run(args.drivers, args.races, args.seed))
+    main.dbx.close()
+    main.db.close()
@@ -0,0 +1,186 @@
+"""
+Cold start: process spawn and `import main` to the first response byte.
+
+Each run is a fresh interpreter. By default the child drives the app over
+raw ASGI (lifespan startup, then one GET), so the numbers cover exactly what
+a server adds on top: interpreter start, the import, startup, the first
+request. Runs go against a brand-new database file (first boot) and an
+existing one (a normal restart). IRC points at a closed local port and the
+keep-alive ping is off, so nothing leaves the machine. `--server` instead
+spawns uvicorn and polls its port, which is what a host health check sees.
+
+    python bench/bench_startup.py [--runs 5] [--path /ping] [--budget-ms 1500]
+    python bench/bench_startup.py --server [--port 8765]
+
+--budget-ms exits 1 if the median spawn-to-first-byte on an existing
+database is over budget.
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from _common import ROOT, use_root
+
+
+# ——— child: runs in the fresh interpreter being measured ———————————————
+def child(path: str):
+    spawned = float(os.environ["BENCH_SPAWNED"])
+    began   = time.time()
+    use_root()
+    t0 = time.perf_counter()
+    import main
+    imported = time.perf_counter()
+    out = asyncio.run(drive(main, path))
+    out.update(interpreter_s=began - spawned, import_s=imported - t0,
+               spawn_to_byte_s=out.pop("wall_first_byte") - spawned)
+    print(json.dumps(out))
+
+
+async def drive(main, path: str) -> dict:
+    inbox, outbox = asyncio.Queue(), asyncio.Queue()
+    start = time.perf_counter()
+    life = asyncio.create_task(main.app({"type": "lifespan", "asgi": {"version": "3.0"}, "state": {}},
+                                        inbox.get, outbox.put))
+    await inbox.put({"type": "lifespan.startup"})
+    msg = await outbox.get()
+    if msg["type"] != "lifespan.startup.complete":
+        raise RuntimeError(f"startup failed: {msg}")
+    started = time.perf_counter()
+
+    first_byte = {}
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start" and not first_byte:
+            first_byte["t"], first_byte["wall"] = time.perf_counter(), time.time()
+            first_byte["status"] = message["status"]
+
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+             "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "",
+             "query_string": b"", "headers": [(b"host", b"bench")], "client": ("127.0.0.1", 1),
+             "server": ("bench", 80), "state": {}}
+    await main.app(scope, receive, send)
+
+    # background work should follow right behind the first response
+    deadline = time.perf_counter() + 10
+    while "background" not in main.lifecycle.timings and time.perf_counter() < deadline:
+        await asyncio.sleep(0.002)
+    background = main.lifecycle.timings.get("background")
+    await inbox.put({"type": "lifespan.shutdown"})
+    await outbox.get()
+    await life
+    return {
+        "status": first_byte["status"],
+        "startup_s": started - start,
+        "request_s": first_byte["t"] - started,
+        "background_s": background,
+        "wall_first_byte": first_byte["wall"],
+    }
+
+
+def child_env(db_file: str, port: int = 9) -> dict:
+    env = dict(os.environ)
+    env.update(DB_FILE=db_file, IRC_HOST="127.0.0.1", IRC_PORT=str(port), KEEPALIVE_URL="")
+    return env
+
+
+def run_child(db_file: str, path: str) -> dict:
+    env = child_env(db_file)
+    env["BENCH_SPAWNED"] = repr(time.time())
+    r = subprocess.run([sys.executable, __file__, "--child", path], env=env,
+                       capture_output=True, text=True, timeout=120)
+    if r.returncode != 0:
+        raise RuntimeError(r.stderr.strip())
+    return json.loads(r.stdout.strip().splitlines()[-1])
+
+
+# ——— --server: uvicorn in a subprocess, polled over TCP ————————————————
+def first_byte_over_tcp(port: int, path: str, deadline: float) -> float:
+    request = f"GET {path} HTTP/1.1\r\nHost: bench\r\nConnection: close\r\n\r\n".encode()
+    while time.perf_counter() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1) as s:
+                s.sendall(request)
+                if s.recv(1):
+                    return time.perf_counter()
+        except OSError:
+            time.sleep(0.005)
+    raise TimeoutError("server never answered")
+
+
+def run_server(db_file: str, path: str, port: int) -> dict:
+    env = child_env(db_file)
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port),
+                             "--log-level", "warning"], cwd=ROOT, env=env)
+    try:
+        got = first_byte_over_tcp(port, path, start + 60)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+    return {"spawn_to_byte_s": got - start}
+
+
+COLUMNS = (("spawn_to_byte_s", "spawn->byte"), ("interpreter_s", "python"), ("import_s", "import"),
+           ("startup_s", "startup"), ("request_s", "1st request"), ("background_s", "background"))
+
+
+def report(label: str, runs: list):
+    cells = []
+    for key, _ in COLUMNS:
+        values = [r[key] for r in runs if r.get(key) is not None]
+        cells.append(f"{statistics.median(values) * 1000:12.1f}" if values else f"{'-':>12s}")
+    print(f"  {label:12s}" + "".join(cells))
+
+
+def main_cli():
+    p = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    p.add_argument("--runs", type=int, default=5)
+    p.add_argument("--path", default="/ping")
+    p.add_argument("--budget-ms", type=float, help="fail if median spawn->byte (existing db) is over this")
+    p.add_argument("--server", action="store_true", help="spawn uvicorn instead of driving ASGI in process")
+    p.add_argument("--port", type=int, default=8765)
+    p.add_argument("--child", metavar="PATH", help=argparse.SUPPRESS)
+    args = p.parse_args()
+    if args.child:
+        return child(args.child)
+
+    tmp  = tempfile.mkdtemp(prefix="shrimp-bench-")
+    warm = os.path.join(tmp, "existing.db")
+    once = (lambda db: run_server(db, args.path, args.port)) if args.server else \
+           (lambda db: run_child(db, args.path))
+    try:
+        once(warm)      # creates the schema the "existing" runs reuse
+        fresh, existing = [], []
+        for i in range(args.runs):
+            fresh.append(once(os.path.join(tmp, f"fresh{i}.db")))
+            existing.append(once(warm))
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    mode = "uvicorn" if args.server else "in-process ASGI"
+    print(f"GET {args.path}, {args.runs} runs, {mode}; median ms")
+    print(f"  {'':12s}" + "".join(f"{title:>12s}" for _, title in COLUMNS))
+    report("fresh db", fresh)
+    report("existing db", existing)
+
+    median = statistics.median(r["spawn_to_byte_s"] for r in existing) * 1000
+    if args.budget_ms is not None:
+        if median > args.budget_ms:
+            print(f"FAIL spawn->byte {median:.0f} ms over budget {args.budget_ms:.0f} ms", file=sys.stderr)
+            sys.exit(1)
+        print(f"spawn->byte {median:.0f} ms within budget {args.budget_ms:.0f} ms", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main_cli()
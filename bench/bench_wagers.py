@@ -0,0 +1,111 @@
+"""
+Double-spend check: many concurrent /gamble calls against the same balances.
+
+Each round gives `--users` users `--balance` points, then fires
+`--concurrency` simultaneous /gamble requests spread over them, each wagering
+the user's whole starting balance or "all". Afterwards every user's balance
+must be non-negative, no response may report a negative balance, and each
+balance must equal its start plus the (payout - wager) of the wagers that
+were accepted, so no two wagers spent the same points and no settlement was
+lost. Runs in process (httpx ASGI transport, temp database) and exits 1 on
+any violation.
+
+    python bench/bench_wagers.py [--concurrency 500] [--rounds 5] [--users 5]
+        [--balance 100] [--ledger]
+
+--ledger runs the same check with the write-behind balance ledger on.
+"""
+import argparse
+import asyncio
+import os
+import random
+import re
+import sys
+import time
+
+from _common import setup
+
+setup(BALANCE_LEDGER="1" if "--ledger" in sys.argv else os.getenv("BALANCE_LEDGER", "0"))
+
+import httpx  # noqa: E402
+import main   # noqa: E402
+
+PLAYED  = re.compile(r" played .+ for (-?\d+) ")
+PAYOUT  = re.compile(r"^Payout: (-?\d+) ", re.M)
+BALANCE = re.compile(r"(?:Final balance:|you only have) (-?\d+) ")
+
+
+async def one_round(client, rnd: random.Random, channel: str, users: list, balance: int,
+                    concurrency: int) -> dict:
+    await main.bulk_add_points(users, channel, balance)
+
+    async def wager(user: str):
+        amount = "all" if rnd.random() < 0.5 else str(balance)
+        r = await client.get("/gamble", params={"user": user, "wager": amount, "channel": channel})
+        return user, r.status_code, r.text
+
+    results = await asyncio.gather(*(wager(rnd.choice(users)) for _ in range(concurrency)))
+    if main.ledger is not None:
+        await main.ledger.flush()
+    final = dict(await main.dbx.fetchall("SELECT username, points FROM users WHERE channel = ?", (channel,)))
+
+    expected  = dict.fromkeys(users, balance)
+    accepted  = errors = 0
+    problems  = []
+    for user, status, text in results:
+        if status != 200:
+            errors += 1
+            continue
+        reported = BALANCE.search(text)
+        if reported and int(reported.group(1)) < 0:
+            problems.append(f"{user}: response reported balance {reported.group(1)}")
+        played, payout = PLAYED.search(text), PAYOUT.search(text)
+        if played and payout:
+            accepted += 1
+            expected[user] += int(payout.group(1)) - int(played.group(1))
+    for user in users:
+        got = final.get(user, 0)
+        if got < 0:
+            problems.append(f"{user}: final balance {got}")
+        if got != expected[user]:
+            problems.append(f"{user}: final balance {got}, accepted wagers add up to {expected[user]}")
+    if errors:
+        problems.append(f"{errors} requests failed")
+    return {"accepted": accepted, "refused": len(results) - accepted - errors, "problems": problems}
+
+
+async def run(args) -> bool:
+    rnd   = random.Random(args.seed)
+    random.seed(args.seed)
+    users = [f"user{i}" for i in range(args.users)]
+    ok    = True
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        for i in range(args.rounds):
+            start = time.perf_counter()
+            r = await one_round(client, rnd, f"bench{i}", users, args.balance, args.concurrency)
+            print(f"round {i}: {args.concurrency} wagers on {args.users} users in "
+                  f"{time.perf_counter() - start:.2f}s, {r['accepted']} accepted, {r['refused']} refused, "
+                  f"{'ok' if not r['problems'] else 'FAIL'}")
+            for problem in r["problems"][:10]:
+                print(f"  {problem}")
+            ok &= not r["problems"]
+    if main.ledger is not None:
+        await main.ledger.close()
+    return ok
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    p.add_argument("--concurrency", type=int, default=500)
+    p.add_argument("--rounds", type=int, default=5)
+    p.add_argument("--users", type=int, default=5, help="few users, so wagers collide")
+    p.add_argument("--balance", type=int, default=100)
+    p.add_argument("--ledger", action="store_true", help="run with BALANCE_LEDGER=1")
+    p.add_argument("--seed", type=int, default=1)
+    args = p.parse_args()
+    ok = asyncio.run(run(args))
+    main.dbx.close()
+    main.db.close()
+    print("no double spends" if ok else "FAIL")
+    sys.exit(0 if ok else 1)
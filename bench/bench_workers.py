@@ -0,0 +1,199 @@
+"""
+Multi-worker throughput: one request mix against uvicorn with 1..N workers.
+
+Each worker count gets a fresh database and a `uvicorn --workers N` process
+with WEB_CONCURRENCY=N (which switches the app to shared state), pointed at
+a local fake Twitch IRC whose chatters earn a reward every
+`--reward-interval` seconds. Load comes from `--clients` client processes,
+each keeping `--concurrency` keep-alive requests in flight for `--duration`
+seconds. After each run the database is checked: exactly one leader lease,
+and chatters paid once per tick rather than once per worker.
+
+    python bench/bench_workers.py [--workers 1,2,4] [--duration 10]
+        [--clients 2] [--concurrency 32] [--users 200] [--drivers 20]
+
+Scaling is bounded by the cores the machine has (the clients need some too)
+and by SQLite's single writer, which every /gamble in the mix goes through.
+"""
+import argparse
+import asyncio
+import math
+import multiprocessing
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+
+import httpx
+from _common import ROOT, TEAMS, free_port, pct, temp_db
+from fake_irc import FakeTwitchIRC
+
+CHANNEL       = "bench"
+REWARD_AMOUNT = 100
+
+
+# ——— load: runs in each client process ———————————————————————————————
+def request_for(rnd: random.Random, users: list) -> tuple:
+    r, u = rnd.random(), rnd.choice(users)
+    if r < .4:
+        return "/points", {"user": u, "channel": CHANNEL}
+    if r < .6:
+        return "/leaderboard", {"limit": 10, "channel": CHANNEL}
+    if r < .8:
+        return "/standings/drivers", {"limit": 10}
+    return "/gamble", {"user": u, "wager": rnd.randint(1, 50), "channel": CHANNEL}
+
+
+async def drive(port: int, duration: float, concurrency: int, seed: int, users: list) -> tuple:
+    rnd = random.Random(seed)
+    latencies, errors = [], 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=30) as client:
+        end = time.perf_counter() + duration
+
+        async def one_at_a_time():
+            nonlocal errors
+            while time.perf_counter() < end:
+                path, params = request_for(rnd, users)
+                start = time.perf_counter()
+                try:
+                    r = await client.get(path, params=params)
+                    errors += r.status_code >= 500
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+
+        await asyncio.gather(*(one_at_a_time() for _ in range(concurrency)))
+    return latencies, errors
+
+
+def client_main(args: tuple) -> tuple:
+    return asyncio.run(drive(*args))
+
+
+# ——— one worker count ———————————————————————————————————————————————
+def start_irc(chatters: int) -> FakeTwitchIRC:
+    irc, ready = FakeTwitchIRC(), threading.Event()
+
+    def run():
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(irc.start())
+        irc.set_members(CHANNEL, [f"viewer{i}" for i in range(chatters)])
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, name="fake-irc", daemon=True).start()
+    ready.wait()
+    return irc
+
+
+def wait_ready(port: int, proc: subprocess.Popen, timeout: float = 60):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"uvicorn exited with {proc.returncode}")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/ping", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            time.sleep(0.05)
+    raise TimeoutError("server never answered /ping")
+
+
+def seed(port: int, users: list, n_drivers: int, seed_: int):
+    rnd = random.Random(seed_)
+    with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=30) as c:
+        for i in range(n_drivers):
+            c.post("/drivers", params={"name": f"Driver {i}", "team": TEAMS[i % len(TEAMS)],
+                                       "skill": round(rnd.random(), 3)}).raise_for_status()
+        c.post("/races/run", params={"schedule": 5, "seed": seed_}).raise_for_status()
+        for u in users:
+            c.get("/add", params={"user": u, "amount": 10_000, "channel": CHANNEL}).raise_for_status()
+
+
+def check(db_file: str, chatters: int, elapsed: float, interval: float) -> dict:
+    conn = sqlite3.connect(db_file)
+    try:
+        leases = conn.execute("SELECT count(*) FROM leases WHERE name = 'leader'").fetchone()[0]
+        rows = conn.execute(
+            "SELECT points FROM users WHERE channel = ? AND username LIKE 'viewer%'", (CHANNEL,)
+        ).fetchall()
+    finally:
+        conn.close()
+    paid = max((p for (p,) in rows), default=0) // REWARD_AMOUNT
+    # one leader pays at most one tick per interval, plus the phase-offset first one
+    allowed = math.floor(elapsed / interval) + 1
+    return {"leases": leases, "ticks": paid, "allowed": allowed,
+            "ok": leases == 1 and paid <= allowed and len(rows) in (0, chatters)}
+
+
+def run_one(workers: int, irc: FakeTwitchIRC, args, pool) -> dict:
+    db_file = temp_db()
+    port = free_port()
+    env = dict(os.environ, WEB_CONCURRENCY=str(workers), DB_FILE=db_file, TWITCH_CHANNEL=CHANNEL,
+               IRC_HOST=irc.host, IRC_PORT=str(irc.port), REWARD_INTERVAL=str(args.reward_interval),
+               REWARD_AMOUNT=str(REWARD_AMOUNT), STARTUP_DEFER="0", KEEPALIVE_URL="")
+    env.pop("SHARED_STATE", None)
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--workers", str(workers),
+                             "--port", str(port), "--log-level", "warning", "--no-access-log"],
+                            cwd=ROOT, env=env)
+    try:
+        wait_ready(port, proc)
+        started = time.perf_counter()
+        users = [f"user{i}" for i in range(args.users)]
+        seed(port, users, args.drivers, args.seed)
+
+        jobs = [(port, args.duration, args.concurrency, args.seed + i, users) for i in range(args.clients)]
+        wall = time.perf_counter()
+        results = pool.map(client_main, jobs)
+        wall = time.perf_counter() - wall
+        verdict = check(db_file, args.chatters, time.perf_counter() - started, args.reward_interval)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+    latencies = [x for lat, _ in results for x in lat]
+    return {"workers": workers, "requests": len(latencies), "rps": len(latencies) / wall,
+            "p50_ms": pct(latencies, .50) * 1000, "p99_ms": pct(latencies, .99) * 1000,
+            "errors": sum(e for _, e in results), **verdict}
+
+
+def main_cli():
+    cores = os.cpu_count() or 1
+    default_workers = sorted({1, 2, 4, cores} & set(range(1, cores + 1))) or [1]
+    p = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    p.add_argument("--workers", type=lambda s: [int(x) for x in s.split(",") if x],
+                   default=default_workers, help="comma-separated worker counts")
+    p.add_argument("--duration", type=float, default=10)
+    p.add_argument("--clients", type=int, default=max(1, cores // 2), help="load-generating processes")
+    p.add_argument("--concurrency", type=int, default=32, help="requests in flight per client")
+    p.add_argument("--users", type=int, default=200)
+    p.add_argument("--drivers", type=int, default=20)
+    p.add_argument("--chatters", type=int, default=50)
+    p.add_argument("--reward-interval", type=float, default=2)
+    p.add_argument("--seed", type=int, default=1)
+    args = p.parse_args()
+
+    irc = start_irc(args.chatters)
+    print(f"{cores} cores, {args.clients} client processes x {args.concurrency} in flight, "
+          f"{args.duration:.0f}s per run")
+    print(f"{'workers':>7s} {'req/s':>9s} {'speedup':>8s} {'p50 ms':>8s} {'p99 ms':>8s} "
+          f"{'errors':>7s}  leader check")
+    base = None
+    failed = False
+    with multiprocessing.get_context("spawn").Pool(args.clients) as pool:
+        for n in args.workers:
+            r = run_one(n, irc, args, pool)
+            base = base or r["rps"]
+            failed |= not r["ok"]
+            print(f"{n:7d} {r['rps']:9.0f} {r['rps'] / base:7.2f}x {r['p50_ms']:8.2f} {r['p99_ms']:8.2f} "
+                  f"{r['errors']:7d}  {r['leases']} lease, {r['ticks']} reward ticks paid "
+                  f"(<= {r['allowed']}) {'ok' if r['ok'] else 'FAIL'}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_cli()
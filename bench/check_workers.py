@@ -0,0 +1,144 @@
+"""
+Regression checks for state that must agree across worker processes.
+
+Starts uvicorn against a fresh database and runs each scenario through it:
+once as a single process, once with `--workers 2` (WEB_CONCURRENCY=2, so
+shared state). Scenarios that need two workers pin one keep-alive client
+to each, told apart by the `leader` gauge on /metrics. Exits 1 on any
+failure.
+
+    python bench/check_workers.py [--only reset_reuses_race_id]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+from _common import ROOT, free_port, temp_db
+
+
+def wait_ready(base: str, proc: subprocess.Popen, timeout: float = 60):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"uvicorn exited with {proc.returncode}")
+        try:
+            if httpx.get(f"{base}/ping", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            time.sleep(0.05)
+    raise TimeoutError("server never answered /ping")
+
+
+def pinned_clients(base: str, timeout: float = 30) -> tuple:
+    """(leader, follower): keep-alive clients each held to one of two workers."""
+    found = {}
+    deadline = time.perf_counter() + timeout
+    while len(found) < 2 and time.perf_counter() < deadline:
+        client = httpx.Client(base_url=base, timeout=30)
+        metrics = client.get("/metrics").text
+        role = "leader 1" in metrics.splitlines()
+        if role in found:
+            client.close()
+            time.sleep(0.05)
+        else:
+            found[role] = client
+    if len(found) < 2:
+        raise TimeoutError("couldn't reach both a leader and a follower worker")
+    return found[True], found[False]
+
+
+# ——— scenarios: (base url, workers) -> list of problems ———————————————————
+def reset_reuses_race_id(base: str, workers: int) -> list:
+    """A worker that cached a race's results must not serve them for a new
+    race that reuses the id after another worker's /reset."""
+    if workers < 2:
+        a = b = httpx.Client(base_url=base, timeout=30)
+    else:
+        a, b = pinned_clients(base)
+    a.delete("/reset").raise_for_status()
+    a.post("/drivers", params={"name": "Old", "team": "X"}).raise_for_status()
+    rid = a.post("/races", params={"name": "Monaco", "track": "Monaco"}).json()["id"]
+    a.post(f"/races/{rid}/run").raise_for_status()
+
+    b.delete("/reset").raise_for_status()
+    b.post("/drivers", params={"name": "New", "team": "Y"}).raise_for_status()
+    reused = b.post("/races", params={"name": "Silverstone", "track": "Silverstone"}).json()["id"]
+    if reused != rid:
+        return [f"expected the race id {rid} to be reused, got {reused}"]
+    text = a.post(f"/races/{rid}/run").text
+    problems = []
+    if "Silverstone" not in text or "New" not in text:
+        problems.append(f"race {rid} after reset ran as: {text!r}")
+    return problems
+
+
+def rob_cooldown(base: str, workers: int) -> list:
+    """/rob moves points once, then the pair is on cooldown on every worker;
+    robbing an empty wallet doesn't start one."""
+    if workers < 2:
+        a = b = httpx.Client(base_url=base, timeout=30)
+    else:
+        a, b = pinned_clients(base)
+    a.get("/add", params={"user": "victim", "amount": 1000, "channel": "rob"}).raise_for_status()
+    problems = []
+    first = a.get("/rob", params={"robber": "robber", "victim": "victim", "channel": "rob"})
+    if first.status_code != 200 or not first.text.startswith("💰"):
+        problems.append(f"first rob: {first.status_code} {first.text!r}")
+    for client in (a, b):
+        again = client.get("/rob", params={"robber": "robber", "victim": "victim", "channel": "rob"})
+        if again.status_code != 200 or not again.text.startswith("⏳"):
+            problems.append(f"second rob wasn't on cooldown: {again.status_code} {again.text!r}")
+    points = {u: int(a.get("/points", params={"user": u, "channel": "rob"}).text.split()[3])
+              for u in ("robber", "victim")}
+    if sum(points.values()) != 1000 or points["robber"] <= 0:
+        problems.append(f"balances after the rob: {points}")
+    for client in (b, a):
+        empty = client.get("/rob", params={"robber": "victim", "victim": "nobody", "channel": "rob"})
+        if empty.status_code != 200 or "has no" not in empty.text:
+            problems.append(f"rob of an empty wallet: {empty.status_code} {empty.text!r}")
+    return problems
+
+
+SCENARIOS = {f.__name__: f for f in (reset_reuses_race_id, rob_cooldown)}
+
+
+def run_server(workers: int, names: list) -> list:
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    env  = dict(os.environ, WEB_CONCURRENCY=str(workers), DB_FILE=temp_db(), IRC_HOST="127.0.0.1",
+                IRC_PORT="9", STARTUP_DEFER="0", LEASE_TTL="3", REWARD_INTERVAL="3600", KEEPALIVE_URL="")
+    env.pop("SHARED_STATE", None)
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--workers", str(workers),
+                             "--port", str(port), "--log-level", "warning", "--no-access-log"],
+                            cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    failures = []
+    try:
+        wait_ready(base, proc)
+        for name in names:
+            try:
+                problems = SCENARIOS[name](base, workers)
+            except Exception as e:     # a crash is a failure, not the end of the run
+                problems = [f"{type(e).__name__}: {e}"]
+            print(f"  {name:28s} {'ok' if not problems else 'FAIL'}")
+            for problem in problems:
+                print(f"    {problem}")
+            failures += [f"{workers} workers, {name}: {p}" for p in problems]
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+    return failures
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    p.add_argument("--only", type=lambda s: [x for x in s.split(",") if x], help="comma-separated scenarios")
+    args = p.parse_args()
+    names = args.only or list(SCENARIOS)
+    failures = []
+    for workers in (1, 2):
+        print(f"{workers} worker{'s' if workers > 1 else ''}")
+        failures += run_server(workers, names)
+    sys.exit(1 if failures else 0)
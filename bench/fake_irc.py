@@ -0,0 +1,175 @@
+"""
+Local stand-in for irc.chat.twitch.tv.
+
+Speaks just enough of Twitch IRC for the presence tracker: accepts
+PASS/NICK/CAP, answers JOIN with a NAMES burst (353 lines + 366), echoes
+JOIN/PART membership changes to every joined client and can drop
+connections on demand. Point the app at it with IRC_HOST/IRC_PORT.
+
+It can also be scripted to misbehave the way a real server does: PING on
+a timer, trickle its output out in small delayed fragments (a slow link,
+so lines straddle reads), cut a client off partway through a NAMES burst,
+and interleave tagged PRIVMSG chatter.
+
+    python bench/fake_irc.py --port 6667 --names 500 [--ping-every 30]
+"""
+import argparse
+import asyncio
+
+HOST_PREFIX   = ":tmi.twitch.tv"
+NAMES_PER_353 = 100
+
+
+class FakeTwitchIRC:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.host    = host
+        self.port    = port
+        self.members = {}        # channel -> set of nicks
+        self.clients = {}        # writer -> set of joined channels
+        self.lines   = []        # every line received, for assertions
+        # — script —
+        self.names_per_line = NAMES_PER_353
+        self.trickle     = None  # (bytes per write, delay between writes)
+        self.drop_after  = None  # cut the next client off after this many 353 lines
+        self.ping_every  = None  # seconds between server PINGs
+        self._server = None
+        self._pinger = None
+        self._tasks  = set()
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._serve, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        if self.ping_every:
+            self._pinger = asyncio.create_task(self._ping_loop())
+        return self
+
+    async def stop(self):
+        if self._pinger is not None:
+            self._pinger.cancel()
+            await asyncio.gather(self._pinger, return_exceptions=True)
+        self.drop_clients()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    # — scripting —
+    def set_members(self, channel: str, nicks):
+        self.members[channel] = set(nicks)
+
+    async def join(self, channel: str, nick: str):
+        self.members.setdefault(channel, set()).add(nick)
+        await self._broadcast(channel, f":{nick}!{nick}@{nick}.tmi.twitch.tv JOIN #{channel}")
+
+    async def part(self, channel: str, nick: str):
+        self.members.get(channel, set()).discard(nick)
+        await self._broadcast(channel, f":{nick}!{nick}@{nick}.tmi.twitch.tv PART #{channel}")
+
+    async def ping(self):
+        for writer in list(self.clients):
+            await self._write(writer, "PING :tmi.twitch.tv")
+
+    async def privmsg(self, channel: str, nick: str, text: str):
+        """Chat line with Twitch-style tags, as ordinary channel traffic."""
+        tags = (f"@badge-info=;badges=;color=#1E90FF;display-name={nick};emotes=;"
+                f"id={len(self.lines)};mod=0;room-id=1;subscriber=0;tmi-sent-ts=0;turbo=0;user-type=")
+        await self._broadcast(channel, f"{tags} :{nick}!{nick}@{nick}.tmi.twitch.tv PRIVMSG #{channel} :{text}")
+
+    def pongs(self) -> int:
+        return sum(1 for line in self.lines if line.startswith("PONG"))
+
+    def drop_clients(self):
+        for writer in list(self.clients):
+            writer.close()
+        self.clients.clear()
+
+    # — protocol —
+    async def _serve(self, reader, writer):
+        task = asyncio.current_task()
+        self._tasks.add(task)
+        self.clients[writer] = set()
+        nick = "justinfan"
+        try:
+            while True:
+                raw = await reader.readline()
+                if not raw:
+                    break
+                line = raw.decode(errors="ignore").strip()
+                self.lines.append(line)
+                if line.startswith("NICK "):
+                    nick = line[5:]
+                    await self._write(writer, f"{HOST_PREFIX} 001 {nick} :Welcome, GLHF!")
+                elif line.startswith("JOIN #"):
+                    for chan in line[6:].split(",#"):
+                        self.clients[writer].add(chan)
+                        await self._send_names(writer, nick, chan)
+                elif line.startswith("PART #"):
+                    self.clients[writer].discard(line[6:])
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._tasks.discard(task)
+            self.clients.pop(writer, None)
+            writer.close()
+
+    async def _send_names(self, writer, nick: str, channel: str):
+        names = sorted(self.members.get(channel, ()))
+        per   = self.names_per_line
+        cut, self.drop_after = self.drop_after, None
+        lines = [f":{nick}.tmi.twitch.tv 353 {nick} = #{channel} :{' '.join(names[i:i + per])}"
+                 for i in range(0, len(names), per)]
+        if cut is not None:
+            await self._write(writer, "\r\n".join(lines[:cut]))
+            writer.close()
+            self.clients.pop(writer, None)
+            return
+        lines.append(f":{nick}.tmi.twitch.tv 366 {nick} #{channel} :End of /NAMES list")
+        await self._write(writer, "\r\n".join(lines))
+
+    async def _broadcast(self, channel: str, line: str):
+        for writer, joined in list(self.clients.items()):
+            if channel in joined:
+                await self._write(writer, line)
+
+    async def _write(self, writer, line: str):
+        data = f"{line}\r\n".encode()
+        try:
+            if self.trickle is None:
+                writer.write(data)
+                await writer.drain()
+                return
+            size, delay = self.trickle
+            for i in range(0, len(data), size):
+                writer.write(data[i:i + size])
+                await writer.drain()
+                await asyncio.sleep(delay)
+        except ConnectionError:
+            self.clients.pop(writer, None)
+
+    async def _ping_loop(self):
+        while True:
+            await asyncio.sleep(self.ping_every)
+            await self.ping()
+
+
+async def serve(host: str, port: int, channel: str, names: int, ping_every: float = None):
+    server = FakeTwitchIRC(host, port)
+    server.ping_every = ping_every
+    await server.start()
+    server.set_members(channel, (f"viewer{i}" for i in range(names)))
+    print(f"fake Twitch IRC on {host}:{server.port} with {names} chatters in #{channel}")
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=6667)
+    p.add_argument("--channel", default="shrimpur")
+    p.add_argument("--names", type=int, default=500)
+    p.add_argument("--ping-every", type=float, default=None)
+    args = p.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.channel, args.names, args.ping_every))
+    except KeyboardInterrupt:
+        pass
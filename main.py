@@ -1,38 +1,742 @@
 import os
+import json
 import sqlite3
 import random
+import secrets
 import asyncio
 import time
-from pydantic import BaseModel, Field
+import bisect
+import functools
+import heapq
+import math
+import re
+import zlib
+import queue
+import threading
+import sys
+import sysconfig
+from collections import Counter, OrderedDict, deque
+from array import array
+from contextlib import contextmanager, asynccontextmanager
+from dataclasses import dataclass
+from itertools import product
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Optional
 from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import PlainTextResponse, HTMLResponse
-from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
+from fastapi.responses import PlainTextResponse, HTMLResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 
 # ——— Configuration —————————————————————————————————————————————
-SERVICE_URL       = "https://api-jt5t.onrender.com"
+# Several worker processes (uvicorn/gunicorn --workers N) sharing one
+# database move per-process state into it. A worker can't reliably tell how
+# many siblings it has, so this is only ever set explicitly: WEB_CONCURRENCY=N
+# (which uvicorn and gunicorn also read as their default worker count) or
+# SHARED_STATE=1. Without either, the app assumes it is the only process.
+WORKERS           = int(os.getenv("WEB_CONCURRENCY", 1))
+SHARED_STATE      = os.getenv("SHARED_STATE", "1" if WORKERS > 1 else "0") == "1"
+if WORKERS > 1 and not SHARED_STATE:
+    # each worker would run its own raffles, cooldowns and reward ticks
+    raise RuntimeError(f"{WORKERS} workers need SHARED_STATE=1")
+LEASE_TTL         = float(os.getenv("LEASE_TTL", 15))   # leader lease; renewed every third of it
 DEFAULT_CHANNEL   = os.getenv("TWITCH_CHANNEL", "shrimpur")
 BOT_NICK          = os.getenv("TWITCH_BOT_NICK", "shrimpur")
 BOT_OAUTH         = os.getenv("TWITCH_OAUTH", "oauth:xaz44k12jaiufen1ngyme5bn0lyhca")
+IRC_HOST          = os.getenv("IRC_HOST", "irc.chat.twitch.tv")
+IRC_PORT          = int(os.getenv("IRC_PORT", 6667))
+IRC_JOIN_TIMEOUT  = float(os.getenv("IRC_JOIN_TIMEOUT", 10))
+IRC_JOIN_RATE     = int(os.getenv("IRC_JOIN_RATE", 20))    # JOINs per IRC_JOIN_PER seconds
+IRC_JOIN_PER      = float(os.getenv("IRC_JOIN_PER", 10))
+IRC_BACKOFF_MIN   = 1
+IRC_BACKOFF_MAX   = 60
+CHAT_RATE         = int(os.getenv("CHAT_RATE", 20))     # messages per CHAT_PER seconds
+CHAT_PER          = float(os.getenv("CHAT_PER", 30))
+CHAT_COALESCE     = int(os.getenv("CHAT_COALESCE", 3))
+CHAT_JOIN_WAIT    = float(os.getenv("CHAT_JOIN_WAIT", 2))   # seconds a message waits on its channel's JOIN
+CHAT_MAX_LEN      = 500
 REWARD_INTERVAL   = int(os.getenv("REWARD_INTERVAL", 300))
 REWARD_AMOUNT     = int(os.getenv("REWARD_AMOUNT", 100))
-DB_FILE           = "shrimp.db"
+REWARD_WORKERS    = int(os.getenv("REWARD_WORKERS", 8))
+REWARD_DISCOVERY  = int(os.getenv("REWARD_DISCOVERY", 60))
+SETTINGS_CACHE_SIZE = int(os.getenv("SETTINGS_CACHE_SIZE", 10000))
+SETTINGS_CACHE_TTL  = float(os.getenv("SETTINGS_CACHE_TTL", 5 if SHARED_STATE else 0))
+BALANCE_LEDGER    = os.getenv("BALANCE_LEDGER", "0") == "1"
+LEDGER_MAX_USERS  = int(os.getenv("LEDGER_MAX_USERS", 100000))
+LEDGER_MAX_DIRTY  = int(os.getenv("LEDGER_MAX_DIRTY", 20000))
+LEDGER_FLUSH_INTERVAL = float(os.getenv("LEDGER_FLUSH_INTERVAL", 1.0))
+LEDGER_DURABILITY = os.getenv("LEDGER_DURABILITY", "buffered")   # or "flush"
+LEADERBOARD_SIZE  = int(os.getenv("LEADERBOARD_SIZE", 100))
+DB_FILE           = os.getenv("DB_FILE", "shrimp.db")
+DB_POOL_SIZE      = int(os.getenv("DB_POOL_SIZE", 4))
+DB_WRITE_BATCH    = int(os.getenv("DB_WRITE_BATCH", 512))
+BULK_CHUNK_SIZE   = int(os.getenv("BULK_CHUNK_SIZE", 5000))
+
+# background work (IRC, reward ticks, keep-alive) starts after the first
+# response, or after this many seconds if no request arrives
+STARTUP_DEFER     = float(os.getenv("STARTUP_DEFER", 5))
+KEEPALIVE_URL     = os.getenv("KEEPALIVE_URL", "https://api-jt5t.onrender.com/ping")   # "" = no self-ping
+KEEPALIVE_INTERVAL = float(os.getenv("KEEPALIVE_INTERVAL", 120))
 
 # how long before you can rob the same victim again (in seconds)
 ROB_COOLDOWN      = 300  
+ROB_SNAPSHOT      = os.getenv("ROB_SNAPSHOT", "1") == "1"
+ROB_PRUNE_EVERY   = 30
+
+RAFFLE_DURATION   = int(os.getenv("RAFFLE_DURATION", 30))
+RAFFLE_MAX_ENTRANTS = int(os.getenv("RAFFLE_MAX_ENTRANTS", 100000))
+RAFFLE_WINNERS    = 3
+RAFFLE_POLL       = 1.0    # how often the leader looks for ended raffles (shared state)
+
+GAMES_FILE        = os.getenv("GAMES_FILE")   # JSON payout tables registered on top of the built-ins
+
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", 1024))
+
+PROJECTION_SIMS   = int(os.getenv("PROJECTION_SIMS", 10000))
+PROJECTION_MAX_SIMS = int(os.getenv("PROJECTION_MAX_SIMS", 200000))
+
+ADMIN_TOKEN       = os.getenv("ADMIN_TOKEN")     # unset disables the /admin endpoints
+AUDIT_MAX_ROUNDS  = int(os.getenv("AUDIT_MAX_ROUNDS", 20_000_000))
 
 # ——— FastAPI setup ——————————————————————————————————————————————
-app = FastAPI()
-templates = Jinja2Templates(directory="templates")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # `lifecycle` is defined at the bottom of the module, once everything
+    # it starts and stops exists
+    await lifecycle.startup()
+    try:
+        yield
+    finally:
+        await lifecycle.shutdown()
+
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"]
 )
 
+def require_admin(token: Optional[str]):
+    if not ADMIN_TOKEN or not token or not secrets.compare_digest(token, ADMIN_TOKEN):
+        raise HTTPException(403, "Forbidden")
+
+# ——— Metrics ——————————————————————————————————————————————————————
+# A small in-process registry rendered in the Prometheus text format at
+# /metrics. Updates are a dict lookup and an add on the event loop thread;
+# nothing here locks or allocates per observation beyond the first one
+# for a given label set.
+LATENCY_BUCKETS = (.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+COUNT_BUCKETS   = (0, 1, 10, 100, 1000, 10000, 100000)
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), collect=None):
+        self.name    = name
+        self.help    = help
+        self.labels  = labels
+        self.values: Dict[tuple, object] = {}
+        self.collect = collect      # optional () -> {labels: value}, read at scrape time
+        METRICS.append(self)
+
+    def _label_str(self, values: tuple, extra: str = "") -> str:
+        pairs = [f'{k}="{_escape_label(v)}"' for k, v in zip(self.labels, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def samples(self) -> List[str]:
+        if self.collect is not None:
+            self.values = dict(self.collect())
+        return [f"{self.name}{self._label_str(k)} {v}" for k, v in self.values.items()]
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + self.samples()
+
+class CounterMetric(Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+class GaugeMetric(Metric):
+    kind = "gauge"
+
+    def set(self, value: float, *labels):
+        self.values[labels] = value
+
+class HistogramMetric(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = buckets
+
+    def observe(self, value: float, *labels):
+        state = self.values.get(labels)
+        if state is None:
+            state = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        state[0][bisect.bisect_left(self.buckets, value)] += 1
+        state[1] += value
+        state[2] += 1
+
+    def samples(self) -> List[str]:
+        out = []
+        for labels, (counts, total, n) in self.values.items():
+            running = 0
+            for le, c in zip(self.buckets + ("+Inf",), counts):
+                running += c
+                bucket = self._label_str(labels, 'le="%s"' % le)
+                out.append(f"{self.name}_bucket{bucket} {running}")
+            out.append(f"{self.name}_sum{self._label_str(labels)} {total}")
+            out.append(f"{self.name}_count{self._label_str(labels)} {n}")
+        return out
+
+def _escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def render_metrics() -> str:
+    return "\n".join(line for m in METRICS for line in m.render()) + "\n"
+
+METRICS: List[Metric] = []
+HTTP_REQUESTS = CounterMetric("http_requests_total", "Requests served.", ("route", "method", "status"))
+HTTP_LATENCY  = HistogramMetric("http_request_duration_seconds", "Request latency.", ("route",))
+DB_CALLS      = HistogramMetric("db_helper_duration_seconds", "Time spent in database helpers.", ("helper",))
+IRC_CONNECTS  = CounterMetric("irc_connects_total", "IRC connection attempts.", ("outcome",))
+IRC_CONNECT   = HistogramMetric("irc_connect_duration_seconds", "TCP connect to login sent.")
+IRC_NAMES     = HistogramMetric("irc_names_duration_seconds", "JOIN to end of the NAMES list.")
+REWARD_TICKS  = HistogramMetric("reward_tick_duration_seconds", "Reward tick duration.", ("channel",))
+GAME_ROUNDS   = CounterMetric("game_rounds_total", "Game rounds played, by result.", ("game", "result"))
+GAME_WAGERED  = CounterMetric("game_wagered_total", "Points wagered per game.", ("game",))
+GAME_PAID     = CounterMetric("game_paid_total", "Points paid out per game.", ("game",))
+RAFFLE_SIZE   = HistogramMetric("raffle_entrants", "Entrants per finished raffle.", buckets=COUNT_BUCKETS)
+
+def db_timed(fn):
+    """Record an async helper's call count and time under its own name."""
+    name = fn.__name__
+
+    @functools.wraps(fn)
+    async def timed(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await fn(*args, **kwargs)
+        finally:
+            DB_CALLS.observe(time.perf_counter() - start, name)
+    return timed
+
+def record_game(game: str, wagered: int, paid: int):
+    result = "win" if paid > wagered else ("push" if paid == wagered else "lose")
+    GAME_ROUNDS.inc(game, result)
+    GAME_WAGERED.inc(game, amount=wagered)
+    GAME_PAID.inc(game, amount=paid)
+
+class MetricsMiddleware:
+    """Pure ASGI wrapper: counts and times every HTTP request by route template."""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        start  = time.perf_counter()
+        status = 500
+
+        async def send_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            end   = time.perf_counter()
+            route = getattr(scope.get("route"), "path", "unmatched")
+            HTTP_REQUESTS.inc(route, scope["method"], status)
+            HTTP_LATENCY.observe(end - start, route)
+            if profiler.enabled:
+                profiler.request_done(route, start, end)
+            if lifecycle.pending:
+                lifecycle.request_served()
+
+app.add_middleware(MetricsMiddleware)
+
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+# ——— Profiler ——————————————————————————————————————————————————————
+# Admin-only, off by default. While on, a daemon thread samples the event
+# loop thread's Python stack every few ms (sys._current_frames), keeps a
+# short ring of timestamped samples for slow-request traces, and watches a
+# heartbeat the loop bumps: if the heartbeat goes stale the loop is blocked
+# (a synchronous sqlite3 call in a handler, a CPU-bound loop) and the
+# offending stack is recorded.
+PROFILE_MAX_DEPTH = 48
+LIBRARY_PATHS     = tuple({sysconfig.get_paths()[k] for k in ("stdlib", "platstdlib", "purelib", "platlib")})
+
+class LoopProfiler:
+    def __init__(self):
+        self.enabled   = False
+        self.interval  = 0.005
+        self.slow      = 0.25
+        self.block     = 0.1
+        self._thread   = None
+        self._beat_task = None
+        self._loop_tid = None
+        self._beat     = 0.0
+        self.reset()
+
+    def reset(self):
+        self.samples   = 0
+        self.idle      = 0
+        self.stacks: Counter = Counter()           # busy stack -> samples
+        self.recent: deque = deque(maxlen=20000)   # (time, stack) for slow-request traces
+        self.blocks: Dict[tuple, list] = {}        # call site -> [count, max seconds, stack]
+        self.slow_requests: deque = deque(maxlen=50)
+        self.started   = time.time()
+        self._blocked  = None                      # [stack, worst lag] while the loop is stuck
+
+    def start(self, interval: float, slow: float, block: float):
+        self.interval, self.slow, self.block = interval, slow, block
+        if self.enabled:
+            return
+        self.reset()
+        self.enabled   = True
+        self._loop_tid = threading.get_ident()
+        self._beat     = time.perf_counter()
+        self._beat_task = asyncio.create_task(self._heartbeat())
+        self._thread   = threading.Thread(target=self._sample_loop, name="loop-profiler", daemon=True)
+        self._thread.start()
+
+    async def stop(self):
+        if not self.enabled:
+            return
+        self.enabled = False
+        self._beat_task.cancel()
+        await asyncio.gather(self._beat_task, return_exceptions=True)
+        await asyncio.to_thread(self._thread.join)
+
+    async def _heartbeat(self):
+        while True:
+            self._beat = time.perf_counter()
+            await asyncio.sleep(self.interval)
+
+    def _stack(self) -> Optional[tuple]:
+        frame = sys._current_frames().get(self._loop_tid)
+        stack = []
+        while frame is not None and len(stack) < PROFILE_MAX_DEPTH:
+            code = frame.f_code
+            stack.append((code.co_filename, code.co_qualname, frame.f_lineno))
+            frame = frame.f_back
+        return tuple(reversed(stack)) if stack else None
+
+    def _sample_loop(self):
+        while self.enabled:
+            time.sleep(self.interval)
+            stack = self._stack()
+            if stack is None:
+                continue
+            now = time.perf_counter()
+            self.samples += 1
+            if stack[-1][0].endswith("selectors.py"):   # parked in the selector: idle
+                self.idle += 1
+            else:
+                self.stacks[stack] += 1
+                self.recent.append((now, stack))
+            lag = now - self._beat - self.interval
+            if lag > self.block:
+                if self._blocked is None:
+                    self._blocked = [stack, lag]
+                self._blocked[1] = lag
+            elif self._blocked is not None:
+                stack, worst = self._blocked
+                self._blocked = None
+                entry = self.blocks.setdefault(call_site(stack), [0, 0.0, stack])
+                entry[0] += 1
+                entry[1] = max(entry[1], worst)
+
+    def request_done(self, route: str, start: float, end: float):
+        """Keep a trace of a request that took longer than the slow threshold."""
+        if end - start < self.slow:
+            return
+        window = Counter(stack for t, stack in list(self.recent) if start <= t <= end)
+        self.slow_requests.append((route, end - start, time.time(), window.most_common(5)))
+
+    def functions(self) -> tuple:
+        """(inclusive, self) busy samples per app function; "self" is time where
+        it was the innermost app frame, library calls it made included."""
+        inclusive, own = Counter(), Counter()
+        for stack, n in list(self.stacks.items()):
+            for fn in {frame[:2] for frame in stack if is_app_frame(frame)}:
+                inclusive[fn] += n
+            own[call_site(stack)[:2]] += n
+        return inclusive, own
+
+def is_app_frame(frame: tuple) -> bool:
+    """Handlers and helpers: not the stdlib or site-packages, nor the
+    metrics/profiler plumbing every request passes through."""
+    return not frame[0].startswith(LIBRARY_PATHS) and not frame[1].startswith(("MetricsMiddleware.", "LoopProfiler."))
+
+def call_site(stack: tuple) -> tuple:
+    """Innermost app frame: the line that made the library call we're in."""
+    for frame in reversed(stack):
+        if is_app_frame(frame):
+            return frame
+    return stack[-1]
+
+def _fmt_frame(frame: tuple) -> str:
+    return f"{frame[1]} ({os.path.basename(frame[0])}:{frame[2]})"
+
+def profile_report(limit: int) -> str:
+    p = profiler
+    busy  = p.samples - p.idle
+    state = "on" if p.enabled else "off"
+    lines = [f"Profiler {state}: {p.samples} samples every {p.interval * 1000:.0f}ms over "
+             f"{time.time() - p.started:.0f}s, loop busy {busy / max(p.samples, 1):.1%}"]
+    inclusive, own = p.functions()
+    lines.append("Top functions (inclusive / self, % of busy samples):")
+    for (f, name), n in inclusive.most_common(limit):
+        lines.append(f"  {n / max(busy, 1):6.1%} {own[(f, name)] / max(busy, 1):6.1%}  {name} ({os.path.basename(f)})")
+    if p.blocks:
+        lines.append(f"Loop blocked > {p.block * 1000:.0f}ms:")
+        for site, (count, worst, stack) in sorted(list(p.blocks.items()), key=lambda kv: -kv[1][1])[:limit]:
+            callers = [fr for fr in stack if is_app_frame(fr)][-4:-1]
+            lines.append(f"  {count}x, worst {worst * 1000:.0f}ms at {_fmt_frame(site)}"
+                         + "".join(f" <- {_fmt_frame(fr)}" for fr in reversed(callers)))
+    if p.slow_requests:
+        lines.append(f"Slow requests > {p.slow * 1000:.0f}ms:")
+        for route, took, when, top in list(p.slow_requests)[-limit:]:
+            lines.append(f"  {route} {took * 1000:.0f}ms at {time.strftime('%H:%M:%S', time.localtime(when))}")
+            for stack, n in top:
+                site = call_site(stack)
+                where = "" if site is stack[-1] else f" in {_fmt_frame(stack[-1])}"
+                lines.append(f"    {n:4d} x {_fmt_frame(site)}{where}")
+    return "\n".join(lines)
+
+profiler = LoopProfiler()
+
+@app.get("/admin/profile/start")
+async def profile_start(token: Optional[str] = None, interval_ms: float = 5, slow_ms: float = 250,
+                        block_ms: float = 100):
+    require_admin(token)
+    if not (1 <= interval_ms <= 1000) or slow_ms <= 0 or block_ms <= 0:
+        raise HTTPException(400, "interval_ms must be 1-1000; slow_ms and block_ms positive")
+    profiler.start(interval_ms / 1000, slow_ms / 1000, block_ms / 1000)
+    return PlainTextResponse(f"Profiler on: sampling every {interval_ms:g}ms, "
+                             f"slow requests > {slow_ms:g}ms, loop blocks > {block_ms:g}ms.")
+
+@app.get("/admin/profile/stop")
+async def profile_stop(token: Optional[str] = None, limit: int = 15):
+    require_admin(token)
+    await profiler.stop()
+    return PlainTextResponse(profile_report(limit))
+
+@app.get("/admin/profile")
+async def profile_show(token: Optional[str] = None, limit: int = 15):
+    require_admin(token)
+    return PlainTextResponse(profile_report(limit))
+
+# ——— Response cache ————————————————————————————————————————————————
+# Overlays and Nightbot poll the same few text endpoints over and over.
+# Each cached response is tied to the version of the data it was built from
+# (a channel's balances/settings, or the F1 league); writes bump the version.
+# The ETag is derived from that version, so a poll whose If-None-Match is
+# still current gets a 304 without the handler running at all, and any other
+# poll of unchanged data gets the stored bytes.
+class ResponseCache:
+    def __init__(self, maxsize: int = RESPONSE_CACHE_SIZE):
+        self.maxsize  = maxsize
+        self.versions: Dict[str, int] = {}
+        self.entries: OrderedDict = OrderedDict()   # (path, query) -> (version, body, media_type)
+        self.boot     = os.urandom(4).hex()         # versions restart at 0 with the process
+
+    def bump(self, scope: str):
+        self.versions[scope] = self.versions.get(scope, 0) + 1
+
+    def cacheable(self, scope: str) -> bool:
+        # with shared state only the league is re-synced from the database
+        # before each read; a channel's balances can change in another worker
+        return not SHARED_STATE or scope == LEAGUE_SCOPE
+
+    async def serve(self, request: Request, scope: str, build) -> Response:
+        """Answer from the cache if `scope` hasn't changed, else `await build()` and keep it."""
+        if not self.cacheable(scope):
+            return await build()
+        version = self.versions.get(scope, 0)
+        key     = (request.url.path, tuple(sorted(request.query_params.multi_items())))
+        etag    = f'"{self.boot}-{version}-{zlib.crc32(repr(key).encode()):08x}"'
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            RESPONSE_CACHE.inc("not_modified")
+            return Response(status_code=304, headers=headers)
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] == version:
+            self.entries.move_to_end(key)
+            RESPONSE_CACHE.inc("hit")
+            return Response(entry[1], media_type=entry[2], headers=headers)
+        RESPONSE_CACHE.inc("miss")
+        response = await build()
+        if response.status_code == 200:
+            # stored under the version read before building: a write that lands
+            # meanwhile bumps past it, so the entry can only be refreshed, never stale
+            self.entries[key] = (version, response.body, response.media_type)
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        response.headers.update(headers)
+        return response
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    tags = [t.strip() for t in header.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+def channel_scope(channel: str) -> str:
+    return f"channel:{channel}"
+
+RESPONSE_CACHE = CounterMetric("response_cache_total", "Cached text endpoint lookups.", ("result",))
+responses = ResponseCache()
+
+# ——— Database access layer ——————————————————————————————————————
+# Every helper below goes through one shared pool of long-lived connections
+# instead of paying sqlite3.connect()/close() (and the schema parse that comes
+# with it) on each call.
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",        # readers never block the writer
+    "PRAGMA synchronous=NORMAL",      # fsync on checkpoint, not every commit
+    "PRAGMA cache_size=-16000",       # ~16 MiB page cache per connection
+    "PRAGMA mmap_size=268435456",     # 256 MiB memory-mapped reads
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+)
+
+class ConnectionPool:
+    """
+    Thread-safe pool of persistent SQLite connections.
+
+    Connections are opened lazily (up to `size`), tuned once with
+    SQLITE_PRAGMAS and then reused. sqlite3 keeps a per-connection cache of
+    compiled statements, so the same SQL text is prepared once per connection
+    and re-bound on every later call. `setup(conn)` runs on the first
+    connection the process opens, before any caller can borrow one.
+    """
+    def __init__(self, path: str, size: int = DB_POOL_SIZE, setup=None):
+        self.path    = path
+        self.size    = max(1, size)
+        self.setup   = setup
+        self._ready  = setup is None
+        self._idle   = queue.LifoQueue()
+        self._opened = 0
+        self._lock   = threading.Lock()
+
+    def _open(self) -> sqlite3.Connection:
+        # called with self._lock held, so setup runs exactly once
+        conn = sqlite3.connect(self.path, check_same_thread=False, cached_statements=256)
+        try:
+            for pragma in SQLITE_PRAGMAS:
+                conn.execute(pragma)
+            if not self._ready:
+                self.setup(conn)
+                self._ready = True
+        except Exception:
+            conn.close()
+            raise
+        return conn
+
+    def _acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._opened < self.size:
+                self._opened += 1
+                try:
+                    return self._open()
+                except Exception:
+                    self._opened -= 1
+                    raise
+        return self._idle.get()
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection; commits on success, rolls back on error."""
+        conn = self._acquire()
+        try:
+            yield conn
+            if conn.in_transaction:
+                conn.commit()
+        except Exception:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        finally:
+            self._idle.put(conn)
+
+    def fetchone(self, sql: str, params: tuple = ()):
+        with self.connection() as conn:
+            return conn.execute(sql, params).fetchone()
+
+    def fetchall(self, sql: str, params: tuple = ()) -> list:
+        with self.connection() as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def execute(self, sql: str, params: tuple = ()) -> int:
+        """Run one statement in its own transaction; returns rowcount."""
+        with self.connection() as conn:
+            return conn.execute(sql, params).rowcount
+
+    def close(self):
+        with self._lock:
+            while True:
+                try:
+                    self._idle.get_nowait().close()
+                except queue.Empty:
+                    break
+            self._opened = 0
+
+db = ConnectionPool(DB_FILE, setup=lambda conn: init_db(conn))
+
+# ——— Async database executor ————————————————————————————————————
+# sqlite3 calls block, so handlers never run them on the event loop. Reads go
+# to a small thread pool; every mutation is queued to a single writer thread
+# that drains whatever is pending and applies it as one transaction (group
+# commit), resolving each caller's future once the batch is durable.
+class DatabaseExecutor:
+    def __init__(self, pool: ConnectionPool, readers: int = DB_POOL_SIZE - 1,
+                 batch_max: int = DB_WRITE_BATCH):
+        self.pool      = pool
+        self.batch_max = max(1, batch_max)
+        self._readers  = ThreadPoolExecutor(max_workers=max(1, readers), thread_name_prefix="db-read")
+        self._writes   = queue.SimpleQueue()
+        self._writer   = None
+        self._lock     = threading.Lock()
+
+    # — reads —
+    async def read(self, fn, *args):
+        """Run fn(conn, *args) on a reader thread."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._readers, self._run_read, fn, args)
+
+    def _run_read(self, fn, args):
+        with self.pool.connection() as conn:
+            return fn(conn, *args)
+
+    async def fetchone(self, sql: str, params: tuple = ()):
+        return await self.read(lambda conn: conn.execute(sql, params).fetchone())
+
+    async def fetchall(self, sql: str, params: tuple = ()) -> list:
+        return await self.read(lambda conn: conn.execute(sql, params).fetchall())
+
+    # — writes —
+    async def write(self, fn, *args):
+        """Queue fn(conn, *args) for the writer thread and await its result."""
+        self._ensure_writer()
+        loop = asyncio.get_running_loop()
+        fut  = loop.create_future()
+        self._writes.put((fn, args, fut, loop))
+        return await fut
+
+    async def execute(self, sql: str, params: tuple = ()) -> int:
+        """Queue a single statement; returns its rowcount."""
+        return await self.write(lambda conn: conn.execute(sql, params).rowcount)
+
+    async def execute_returning(self, sql: str, params: tuple = ()):
+        """Queue a single statement and return its first row (for RETURNING)."""
+        return await self.write(lambda conn: conn.execute(sql, params).fetchone())
+
+    def _ensure_writer(self):
+        if self._writer is not None:
+            return
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="db-writer", daemon=True)
+                self._writer.start()
+
+    def _write_loop(self):
+        while True:
+            job = self._writes.get()
+            if job is None:
+                return
+            batch = [job]
+            while len(batch) < self.batch_max:
+                try:
+                    job = self._writes.get_nowait()
+                except queue.Empty:
+                    break
+                if job is None:
+                    self._writes.put(None)
+                    break
+                batch.append(job)
+            self._apply(batch)
+
+    def _apply(self, batch: list):
+        results = []
+        try:
+            with self.pool.connection() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                for fn, args, _, _ in batch:
+                    # a savepoint per job, so one failing mutation doesn't
+                    # take the rest of the group down with it
+                    conn.execute("SAVEPOINT job")
+                    try:
+                        results.append((True, fn(conn, *args)))
+                        conn.execute("RELEASE job")
+                    except Exception as e:
+                        conn.execute("ROLLBACK TO job")
+                        conn.execute("RELEASE job")
+                        results.append((False, e))
+        except Exception as e:
+            results = [(False, e)] * len(batch)
+        for (_, _, fut, loop), (ok, value) in zip(batch, results):
+            loop.call_soon_threadsafe(_resolve_future, fut, ok, value)
+
+    def close(self):
+        with self._lock:
+            writer, self._writer = self._writer, None
+        if writer is not None:
+            self._writes.put(None)
+            writer.join()
+        self._readers.shutdown(wait=True)
+
+def _resolve_future(fut: asyncio.Future, ok: bool, value):
+    if fut.cancelled():
+        return
+    if ok:
+        fut.set_result(value)
+    else:
+        fut.set_exception(value)
+
+dbx = DatabaseExecutor(db)
+
 # ——— Database initialization —————————————————————————————————————
-def init_db():
-    conn = sqlite3.connect(DB_FILE)
+# Runs on the pool's first connection rather than at import. PRAGMA
+# user_version records which schema the file already has, so a warm start
+# costs one pragma read; bump SCHEMA_VERSION with every change to
+# _create_schema (whose statements must stay safe to re-run on older files).
+SCHEMA_VERSION = 2
+
+def init_db(conn: sqlite3.Connection, force: bool = False):
+    """Create or upgrade the schema on `conn` (idempotent), then make sure
+    the default channel has a settings row."""
+    if force or conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+        # IMMEDIATE takes the write lock up front: if several processes boot
+        # at once, one migrates and the others find it done on the re-check
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if force or conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+                _create_schema(conn)
+                conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    if conn.execute("SELECT 1 FROM settings WHERE channel = ?", (DEFAULT_CHANNEL,)).fetchone() is None:
+        conn.execute("""
+          INSERT OR IGNORE INTO settings(channel, points_name, reward_amount)
+          VALUES(?, ?, ?)
+        """, (DEFAULT_CHANNEL, "points", REWARD_AMOUNT))
+        conn.commit()
+
+def _create_schema(conn: sqlite3.Connection):
     # users table
     conn.execute("""
       CREATE TABLE IF NOT EXISTS users (
@@ -47,9 +751,13 @@ def init_db():
       CREATE TABLE IF NOT EXISTS settings (
         channel        TEXT PRIMARY KEY,
         points_name    TEXT NOT NULL,
-        reward_amount  INTEGER NOT NULL DEFAULT {REWARD_AMOUNT}
+        reward_amount  INTEGER NOT NULL DEFAULT {REWARD_AMOUNT},
+        reward_interval INTEGER NOT NULL DEFAULT {REWARD_INTERVAL}
       )
     """)
+    cols = {row[1] for row in conn.execute("PRAGMA table_info(settings)")}
+    if "reward_interval" not in cols:
+        conn.execute(f"ALTER TABLE settings ADD COLUMN reward_interval INTEGER NOT NULL DEFAULT {REWARD_INTERVAL}")
     # rob cooldowns
     conn.execute("""
       CREATE TABLE IF NOT EXISTS rob_cooldowns (
@@ -60,222 +768,1668 @@ def init_db():
         PRIMARY KEY(channel, robber, victim)
       )
     """)
-    # seed default channel settings
+    # F1 league
+    conn.execute("""
+      CREATE TABLE IF NOT EXISTS f1_drivers (
+        id          INTEGER PRIMARY KEY,
+        name        TEXT NOT NULL,
+        team        TEXT NOT NULL,
+        skill       REAL NOT NULL,
+        points      INTEGER NOT NULL DEFAULT 0,
+        podiums     INTEGER NOT NULL DEFAULT 0,
+        races       INTEGER NOT NULL DEFAULT 0
+      )
+    """)
     conn.execute("""
-      INSERT OR IGNORE INTO settings(channel, points_name, reward_amount)
+      CREATE TABLE IF NOT EXISTS f1_races (
+        id          INTEGER PRIMARY KEY,
+        name        TEXT NOT NULL,
+        track       TEXT NOT NULL,
+        laps        INTEGER NOT NULL,
+        completed   INTEGER NOT NULL DEFAULT 0
+      )
+    """)
+    # finishing order per race, packed as uint32 driver ids (winner first)
+    conn.execute("""
+      CREATE TABLE IF NOT EXISTS f1_results (
+        race_id     INTEGER PRIMARY KEY,
+        finish      BLOB NOT NULL
+      )
+    """)
+    # leaderboard / rank lookups walk this instead of sorting the channel
+    conn.execute("""
+      CREATE INDEX IF NOT EXISTS users_by_points
+      ON users(channel, points DESC, username)
+    """)
+    # bumped in the same transaction as every write to a scope's data, so a
+    # worker can tell whether its in-memory copy is still current
+    conn.execute("""
+      CREATE TABLE IF NOT EXISTS state_versions (
+        scope       TEXT PRIMARY KEY,
+        version     INTEGER NOT NULL
+      )
+    """)
+    # leader election: one row per lease, owned while unexpired
+    conn.execute("""
+      CREATE TABLE IF NOT EXISTS leases (
+        name        TEXT PRIMARY KEY,
+        holder      TEXT NOT NULL,
+        expires     REAL NOT NULL
+      )
+    """)
+    # running raffles, when workers share state
+    conn.execute("""
+      CREATE TABLE IF NOT EXISTS raffles (
+        channel      TEXT PRIMARY KEY,
+        amount       INTEGER NOT NULL,
+        ends         REAL NOT NULL,
+        max_entrants INTEGER NOT NULL,
+        entrants     INTEGER NOT NULL DEFAULT 0
+      )
+    """)
+    conn.execute("""
+      CREATE TABLE IF NOT EXISTS raffle_entrants (
+        channel     TEXT NOT NULL,
+        user_key    TEXT NOT NULL,
+        username    TEXT NOT NULL,
+        PRIMARY KEY(channel, user_key)
+      )
+    """)
+
+# ——— Settings cache ——————————————————————————————————————————————
+class SettingsCache:
+    """
+    Per-channel settings rows kept in memory, LRU-bounded to `maxsize`
+    entries and optionally expired after `ttl` seconds (0 = never). Writers
+    call invalidate(); a read that raced with one is not cached, because
+    put() drops values fetched under an older generation.
+    """
+    def __init__(self, maxsize: int = SETTINGS_CACHE_SIZE, ttl: float = SETTINGS_CACHE_TTL):
+        self.maxsize    = max(1, maxsize)
+        self.ttl        = ttl
+        self.generation = 0
+        self.hits       = 0
+        self.misses     = 0
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()   # channel -> (expires, value)
+
+    def get(self, channel: str):
+        entry = self._data.get(channel)
+        if entry is None or (self.ttl and entry[0] < time.monotonic()):
+            self.misses += 1
+            return None
+        self._data.move_to_end(channel)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, channel: str, value: tuple, generation: int):
+        if generation != self.generation:
+            return
+        expires = time.monotonic() + self.ttl if self.ttl else 0.0
+        self._data[channel] = (expires, value)
+        self._data.move_to_end(channel)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, channel: str):
+        self.generation += 1
+        self._data.pop(channel, None)
+
+    def clear(self):
+        self.generation += 1
+        self._data.clear()
+
+settings_cache = SettingsCache()
+CounterMetric("settings_cache_total", "Channel settings lookups.", ("result",),
+              collect=lambda: {("hit",): settings_cache.hits, ("miss",): settings_cache.misses})
+
+# ——— Balance ledger (write-behind) ——————————————————————————————————
+def _flush_deltas(conn: sqlite3.Connection, deltas: dict):
+    conn.executemany("""
+      INSERT INTO users(channel, username, points)
       VALUES(?, ?, ?)
-    """, (DEFAULT_CHANNEL, "points", REWARD_AMOUNT))
-    conn.commit()
-    conn.close()
+      ON CONFLICT(channel, username) DO UPDATE
+        SET points = points + excluded.points
+    """, [(chan, user, delta) for (chan, user), delta in deltas.items()])
+
+class BalanceLedger:
+    """
+    Optional in-memory balance store keyed by (channel, username).
+
+    A user's balance is loaded from `users` once, then served and mutated in
+    memory. Deltas accumulate per user and are flushed as one batched
+    transaction at least every `flush_interval` seconds (sooner once
+    `max_dirty` users are pending). With durability "flush", mutations wait
+    for the flush that persists them; with "buffered" they return at once
+    and up to `flush_interval` seconds of changes are at risk on a crash.
+    Clean users are evicted least-recently-used beyond `max_users`.
+
+    Bulk credits that write `users` directly (bulk_add_points) go through
+    external_write(), which holds off balance loads for that channel so a
+    load can't cache a row from before the bulk commit.
+    """
+    def __init__(self, max_users: int = LEDGER_MAX_USERS,
+                 flush_interval: float = LEDGER_FLUSH_INTERVAL,
+                 durability: str = LEDGER_DURABILITY,
+                 max_dirty: int = LEDGER_MAX_DIRTY):
+        if durability not in ("buffered", "flush"):
+            raise ValueError(f"unknown ledger durability {durability!r}")
+        self.max_users      = max(1, max_users)
+        self.flush_interval = flush_interval
+        self.durability     = durability
+        self.max_dirty      = max(1, max_dirty)
+        self._balances: "OrderedDict[tuple, int]" = OrderedDict()
+        self._dirty: Dict[tuple, int] = {}
+        self._flushing: set = set()
+        self._external: Dict[str, int] = {}
+        self._epoch: Dict[str, int] = {}
+        self._idle      = None     # asyncio.Condition, created on first use
+        self._wake      = None
+        self._flushed   = None     # future resolved by the next flush
+        self._flush_lock = None
+        self._task      = None
+
+    def _ensure_task(self):
+        if self._task is None:
+            self._idle       = asyncio.Condition()
+            self._wake       = asyncio.Event()
+            self._flush_lock = asyncio.Lock()
+            self._flushed    = asyncio.get_running_loop().create_future()
+            self._task       = asyncio.create_task(self._flush_loop())
+
+    # — reads —
+    async def get(self, user: str, channel: str) -> int:
+        key = (channel, user)
+        if key not in self._balances:
+            await self._load(key, {key})
+        self._balances.move_to_end(key)
+        return self._balances[key]
+
+    async def load(self, channel: str, *users: str):
+        """Bring all of `users` into memory together (none evicted on return)."""
+        keep = {(channel, u) for u in users}
+        while True:
+            missing = [key for key in keep if key not in self._balances]
+            if not missing:
+                return
+            for key in missing:
+                await self._load(key, keep)
+
+    async def _load(self, key: tuple, keep: set):
+        """Load `key`; eviction spares `keep`, the keys the caller is about to use."""
+        self._ensure_task()
+        channel, user = key
+        while key not in self._balances:
+            if self._external.get(channel):
+                async with self._idle:
+                    await self._idle.wait_for(lambda: not self._external.get(channel))
+                continue
+            epoch = self._epoch.get(channel, 0)
+            row = await dbx.fetchone("SELECT points FROM users WHERE channel = ? AND username = ?", key)
+            if key in self._balances:
+                return
+            if self._external.get(channel) or self._epoch.get(channel, 0) != epoch:
+                continue
+            self._balances[key] = row[0] if row else 0
+            self._evict(keep)
+
+    # — writes —
+    async def add(self, user: str, channel: str, amount: int) -> int:
+        """Apply a delta; returns the new balance."""
+        await self.get(user, channel)
+        return await self.durable(self.apply(user, channel, amount))
+
+    def apply(self, user: str, channel: str, amount: int) -> int:
+        """Apply a delta to a user that is already loaded (no await, so atomic on the loop)."""
+        key = (channel, user)
+        self._balances[key] += amount
+        self._balances.move_to_end(key)
+        self._dirty[key] = self._dirty.get(key, 0) + amount
+        if len(self._dirty) >= self.max_dirty:
+            self._wake.set()
+        return self._balances[key]
+
+    async def durable(self, value=None):
+        """Return `value` once pending changes are as durable as the ledger promises."""
+        if self.durability == "flush":
+            self._wake.set()
+            await asyncio.shield(self._flushed)
+        return value
+
+    def credit_cached(self, channel: str, users: list, amount: int) -> list:
+        """Credit users that are in memory; returns the ones that are not."""
+        rest = []
+        for user in users:
+            if (channel, user) in self._balances:
+                self.apply(user, channel, amount)
+            else:
+                rest.append(user)
+        return rest
+
+    @asynccontextmanager
+    async def external_write(self, channel: str):
+        self._ensure_task()
+        self._external[channel] = self._external.get(channel, 0) + 1
+        try:
+            yield
+        finally:
+            self._external[channel] -= 1
+            if not self._external[channel]:
+                del self._external[channel]
+            self._epoch[channel] = self._epoch.get(channel, 0) + 1
+            async with self._idle:
+                self._idle.notify_all()
+
+    # — flushing —
+    async def flush(self):
+        async with self._flush_lock:
+            batch, self._dirty = self._dirty, {}
+            done, self._flushed = self._flushed, asyncio.get_running_loop().create_future()
+            if batch:
+                self._flushing = set(batch)
+                try:
+                    await dbx.write(_flush_deltas, batch)
+                except Exception as e:
+                    for key, delta in batch.items():
+                        self._dirty[key] = self._dirty.get(key, 0) + delta
+                    done.set_exception(e)
+                    done.exception()    # consumed here; waiters still see it
+                    raise
+                finally:
+                    self._flushing = set()
+            done.set_result(len(batch))
+            self._evict()
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                print("Ledger flush error:", e)
+                await asyncio.sleep(self.flush_interval)
+
+    def _evict(self, keep: set = frozenset()):
+        # Only clean keys outside `keep` go. If that isn't enough, the ledger
+        # stays over max_users until a flush makes dirty keys evictable, so
+        # wake the flusher rather than drop a key a caller still needs.
+        # The walk starts at the least-recently-used end and stops once
+        # enough victims are found, so it doesn't touch the whole cache.
+        excess = len(self._balances) - self.max_users
+        if excess <= 0:
+            return
+        victims = []
+        keys = iter(self._balances)
+        while len(victims) < excess:
+            key = next(keys, None)
+            if key is None:
+                break
+            if key not in self._dirty and key not in self._flushing and key not in keep:
+                victims.append(key)
+        for key in victims:
+            del self._balances[key]
+        if len(victims) < excess and self._wake is not None:
+            self._wake.set()
+
+    async def close(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        await self.flush()
+
+if BALANCE_LEDGER and SHARED_STATE:
+    # the ledger is the only copy of recent balances until it flushes, and
+    # another worker would read around it
+    raise RuntimeError("BALANCE_LEDGER can't be used with SHARED_STATE (several workers)")
+ledger = BalanceLedger() if BALANCE_LEDGER else None
+
+# ——— Leaderboard view ————————————————————————————————————————————
+class LeaderboardView:
+    """
+    Top-`size` balances per channel, kept sorted in memory as
+    (-points, username). A channel's view is seeded from the users_by_points
+    index on first read, then updated from every balance change whose new
+    value we know. Changes it can't follow exactly (bulk credits, or a member
+    falling out of a full view) drop the view so the next read reseeds it.
+    With `shared` set, other workers change balances this view never sees,
+    so every read goes to the index instead.
+    """
+    def __init__(self, size: int = LEADERBOARD_SIZE, shared: bool = SHARED_STATE):
+        self.size   = max(1, size)
+        self.shared = shared
+        self._views: Dict[str, list] = {}
+        self._members: Dict[str, Dict[str, int]] = {}
+        self._complete: Dict[str, bool] = {}    # view holds every user in the channel
+        self._gen: Dict[str, int] = {}
+
+    async def top(self, channel: str, limit: int) -> list:
+        """[(username, points)] for the `limit` richest users in `channel`; all of them if `limit` < 0."""
+        # a negative limit is SQLite's "no limit", as /leaderboard always allowed
+        if limit < 0 or limit > self.size or self.shared:
+            if ledger is not None:
+                await ledger.flush()
+            return await dbx.fetchall(
+                "SELECT username, points FROM users WHERE channel = ? ORDER BY points DESC, username LIMIT ?",
+                (channel, limit)
+            )
+        view = self._views.get(channel)
+        if view is None:
+            view = await self._load(channel)
+        return [(user, -neg) for neg, user in view[:limit]]
+
+    def rank(self, channel: str, user: str) -> Optional[tuple]:
+        """(1-based rank, points) if `user` is in the channel's view, else None."""
+        points = self._members.get(channel, {}).get(user)
+        if points is None:
+            return None
+        return bisect.bisect_left(self._views[channel], (-points, "")) + 1, points
+
+    async def _load(self, channel: str) -> list:
+        if ledger is not None:
+            await ledger.flush()    # seed from disk only once it has caught up
+        gen  = self._gen.get(channel, 0)
+        rows = await dbx.fetchall(
+            "SELECT username, points FROM users WHERE channel = ? ORDER BY points DESC, username LIMIT ?",
+            (channel, self.size)
+        )
+        view = [(-points, user) for user, points in rows]
+        if self._gen.get(channel, 0) == gen:
+            self._views[channel]    = view
+            self._members[channel]  = {user: points for user, points in rows}
+            self._complete[channel] = len(rows) < self.size
+        return view
+
+    def observe(self, channel: str, user: str, points: int):
+        """Record `user`'s new balance in `channel`."""
+        self._gen[channel] = self._gen.get(channel, 0) + 1
+        view = self._views.get(channel)
+        if view is None:
+            return
+        members = self._members[channel]
+        old = members.pop(user, None)
+        if old is not None:
+            del view[bisect.bisect_left(view, (-old, user))]
+        entry = (-points, user)
+        if self._complete[channel] or (view and entry < view[-1]):
+            bisect.insort(view, entry)
+            members[user] = points
+            if len(view) > self.size:
+                _, dropped = view.pop()
+                del members[dropped]
+                self._complete[channel] = False
+        elif old is not None:
+            # a member fell below the cut; whoever replaces it is on disk
+            self.drop(channel)
+
+    def drop(self, channel: str):
+        self._gen[channel] = self._gen.get(channel, 0) + 1
+        self._views.pop(channel, None)
+        self._members.pop(channel, None)
+        self._complete.pop(channel, None)
+
+leaderboards = LeaderboardView()
+
+# ——— Rob cooldowns ———————————————————————————————————————————————
+class CooldownStore:
+    """
+    Expiring (channel, robber, victim) -> expiry map for /rob.
+
+    Checks are a dict lookup. A min-heap of (expires, key) lets prune() drop
+    expired entries oldest-first without scanning, so memory stays bounded
+    by the last `ttl` seconds of activity. The rob_cooldowns table is only a
+    snapshot of live entries, written on shutdown and read back on startup.
+    """
+    def __init__(self, ttl: int = ROB_COOLDOWN):
+        self.ttl = ttl
+        self._expires: Dict[tuple, float] = {}
+        self._heap: list = []
+        self._task = None
+
+    def remaining(self, key: tuple, now: Optional[float] = None) -> int:
+        """Seconds left on `key`'s cooldown (0 if none)."""
+        expires = self._expires.get(key)
+        if expires is None:
+            return 0
+        left = expires - (time.time() if now is None else now)
+        return math.ceil(left) if left > 0 else 0
+
+    def stamp(self, key: tuple, now: Optional[float] = None):
+        expires = (time.time() if now is None else now) + self.ttl
+        self._expires[key] = expires
+        heapq.heappush(self._heap, (expires, key))
+
+    def clear(self, key: tuple):
+        self._expires.pop(key, None)
+
+    def prune(self, now: Optional[float] = None) -> int:
+        now, dropped = time.time() if now is None else now, 0
+        while self._heap and self._heap[0][0] <= now:
+            expires, key = heapq.heappop(self._heap)
+            if self._expires.get(key) == expires:
+                del self._expires[key]
+                dropped += 1
+        return dropped
+
+    def __len__(self) -> int:
+        return len(self._expires)
+
+    async def _prune_loop(self):
+        while True:
+            await asyncio.sleep(ROB_PRUNE_EVERY)
+            self.prune()
+
+    async def restore(self):
+        now  = int(time.time())
+        rows = await dbx.fetchall(
+            "SELECT channel, robber, victim, last_rob FROM rob_cooldowns WHERE last_rob > ?",
+            (now - self.ttl,)
+        )
+        for channel, robber, victim, last in rows:
+            self.stamp((channel, robber, victim), last)
+
+    async def snapshot(self):
+        self.prune()
+        rows = [(*key, int(expires - self.ttl)) for key, expires in self._expires.items()]
+
+        def write(conn: sqlite3.Connection):
+            conn.execute("DELETE FROM rob_cooldowns")
+            conn.executemany(
+                "INSERT INTO rob_cooldowns(channel, robber, victim, last_rob) VALUES(?, ?, ?, ?)", rows
+            )
+        await dbx.write(write)
+
+    async def start(self):
+        if ROB_SNAPSHOT:
+            await self.restore()
+        self._task = asyncio.create_task(self._prune_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if ROB_SNAPSHOT:
+            await self.snapshot()
+
+class SharedCooldowns:
+    """
+    The cooldown store when workers share state. rob_cooldowns is then the
+    live table rather than a snapshot: /rob checks and stamps it inside its
+    own writer transaction (remaining/stamp take that connection), so two
+    workers can't both rob the same pair. Expired rows are pruned in SQL.
+    """
+    def __init__(self, ttl: int = ROB_COOLDOWN):
+        self.ttl   = ttl
+        self._task = None
+
+    def remaining(self, conn: sqlite3.Connection, key: tuple, now: float) -> int:
+        row = conn.execute(
+            "SELECT last_rob FROM rob_cooldowns WHERE channel = ? AND robber = ? AND victim = ?", key
+        ).fetchone()
+        left = row[0] + self.ttl - now if row else 0
+        return math.ceil(left) if left > 0 else 0
+
+    def stamp(self, conn: sqlite3.Connection, key: tuple, now: float):
+        conn.execute("""
+          INSERT INTO rob_cooldowns(channel, robber, victim, last_rob) VALUES(?, ?, ?, ?)
+          ON CONFLICT(channel, robber, victim) DO UPDATE SET last_rob = excluded.last_rob
+        """, (*key, now))
+
+    async def prune(self) -> int:
+        return await dbx.execute("DELETE FROM rob_cooldowns WHERE last_rob <= ?", (time.time() - self.ttl,))
+
+    async def _prune_loop(self):
+        while True:
+            await asyncio.sleep(ROB_PRUNE_EVERY)
+            try:
+                await self.prune()
+            except Exception as e:
+                print("Cooldown prune error:", e)
 
-init_db()
+    async def start(self):
+        self._task = asyncio.create_task(self._prune_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+cooldowns = SharedCooldowns() if SHARED_STATE else CooldownStore()
 
 # ——— Helpers —————————————————————————————————————————————————————
-def get_points_table(user: str, channel: str) -> int:
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("SELECT points FROM users WHERE channel = ? AND username = ?", (channel, user))
-    row = c.fetchone()
-    conn.close()
+@db_timed
+async def get_points_table(user: str, channel: str) -> int:
+    if ledger is not None:
+        return await ledger.get(user, channel)
+    row = await dbx.fetchone("SELECT points FROM users WHERE channel = ? AND username = ?", (channel, user))
     return row[0] if row else 0
 
-async def add_user_points(user: str, channel: str, amount: int):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("""
-      INSERT INTO users(channel, username, points)
-      VALUES(?, ?, ?)
-      ON CONFLICT(channel, username) DO UPDATE
-        SET points = points + ?
-    """, (channel, user, amount, amount))
-    conn.commit()
-    conn.close()
-
-def get_points_name(channel: str) -> str:
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("SELECT points_name FROM settings WHERE channel = ?", (channel,))
-    row = c.fetchone()
-    conn.close()
-    return row[0] if row else "points"
+@db_timed
+async def add_user_points(user: str, channel: str, amount: int) -> int:
+    """Apply a delta; returns the user's new balance."""
+    if ledger is not None:
+        points = await ledger.add(user, channel, amount)
+    else:
+        points = (await dbx.execute_returning("""
+          INSERT INTO users(channel, username, points)
+          VALUES(?, ?, ?)
+          ON CONFLICT(channel, username) DO UPDATE
+            SET points = points + ?
+          RETURNING points
+        """, (channel, user, amount, amount)))[0]
+    balance_changed(channel, user, points)
+    return points
+
+def balance_changed(channel: str, user: str, points: int):
+    """Hook for every mutation whose resulting balance is known."""
+    leaderboards.observe(channel, user, points)
+    responses.bump(channel_scope(channel))
+
+def balances_changed(channel: str):
+    """Hook for mutations that touched many balances at once."""
+    leaderboards.drop(channel)
+    responses.bump(channel_scope(channel))
+
+def _bulk_credit(conn: sqlite3.Connection, channel: str, users: list, amount: int) -> (int, int):
+    # bump existing rows first, then create whoever is left; the two rowcounts
+    # split the chunk into updated vs. newly inserted users
+    updated = conn.executemany(
+        "UPDATE users SET points = points + ? WHERE channel = ? AND username = ?",
+        [(amount, channel, u) for u in users]
+    ).rowcount
+    inserted = conn.executemany(
+        "INSERT OR IGNORE INTO users(channel, username, points) VALUES(?, ?, ?)",
+        [(channel, u, amount) for u in users]
+    ).rowcount
+    return inserted, updated
+
+@db_timed
+async def bulk_add_points(users, channel: str, amount: int,
+                          chunk_size: Optional[int] = BULK_CHUNK_SIZE) -> (int, int):
+    """
+    Credit `amount` to every user in `users` with executemany upserts.
+    Each chunk of `chunk_size` users (or the whole set, if None) is one
+    writer job, so it applies or rolls back as a unit; the group-committing
+    writer usually commits all the chunks together, in one transaction with
+    whatever else was queued. Returns (inserted, updated) row counts.
+    """
+    users = list(dict.fromkeys(users))
+    if ledger is None:
+        counts = await _bulk_write(users, channel, amount, chunk_size)
+        balances_changed(channel)
+        return counts
+    # users the ledger already holds are credited in memory; the rest go
+    # straight to disk while the ledger holds off loading this channel
+    async with ledger.external_write(channel):
+        rest = ledger.credit_cached(channel, users, amount)
+        inserted, updated = await _bulk_write(rest, channel, amount, chunk_size)
+    balances_changed(channel)
+    await ledger.durable()
+    return inserted, updated + len(users) - len(rest)
+
+async def _bulk_write(users: list, channel: str, amount: int, chunk_size: Optional[int]) -> (int, int):
+    if not users:
+        return 0, 0
+    step   = chunk_size or len(users)
+    chunks = [users[i:i + step] for i in range(0, len(users), step)]
+    counts = await asyncio.gather(*(dbx.write(_bulk_credit, channel, c, amount) for c in chunks))
+    return sum(i for i, _ in counts), sum(u for _, u in counts)
+
+async def get_channel_settings(channel: str) -> tuple:
+    """(points_name, reward_amount, reward_interval) for `channel`, served from settings_cache."""
+    cached = settings_cache.get(channel)
+    if cached is not None:
+        return cached
+    gen   = settings_cache.generation
+    value = await _load_channel_settings(channel)
+    settings_cache.put(channel, value, gen)
+    return value
+
+@db_timed
+async def _load_channel_settings(channel: str) -> tuple:
+    # timed on its own so cache hits don't count as database time
+    row = await dbx.fetchone(
+        "SELECT points_name, reward_amount, reward_interval FROM settings WHERE channel = ?", (channel,)
+    )
+    return tuple(row) if row else ("points", REWARD_AMOUNT, REWARD_INTERVAL)
+
+async def get_points_name(channel: str) -> str:
+    return (await get_channel_settings(channel))[0]
 
+@db_timed
 async def set_points_name(channel: str, name: str):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("""
+    await dbx.execute("""
       INSERT INTO settings(channel, points_name, reward_amount)
       VALUES(?, ?, ?)
       ON CONFLICT(channel) DO UPDATE
         SET points_name = excluded.points_name
     """, (channel, name, REWARD_AMOUNT))
-    conn.commit()
-    conn.close()
+    settings_cache.invalidate(channel)
+    responses.bump(channel_scope(channel))
 
-def get_reward_amount(channel: str) -> int:
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("SELECT reward_amount FROM settings WHERE channel = ?", (channel,))
-    row = c.fetchone()
-    conn.close()
-    return row[0] if row else REWARD_AMOUNT
+async def get_reward_amount(channel: str) -> int:
+    return (await get_channel_settings(channel))[1]
 
+@db_timed
 async def set_reward_amount(channel: str, amount: int):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("""
+    await dbx.execute("""
       UPDATE settings
       SET reward_amount = ?
       WHERE channel = ?
     """, (amount, channel))
-    conn.commit()
-    conn.close()
-
-def can_rob(channel: str, robber: str, victim: str) -> (bool, int):
-    """Returns (True, 0) if allowed, or (False, secs_remaining)."""
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("""
-      SELECT last_rob FROM rob_cooldowns
-      WHERE channel=? AND robber=? AND victim=?
-    """, (channel, robber, victim))
-    row = c.fetchone()
-    now = int(time.time())
-    if row:
-        last = row[0]
-        if now - last < ROB_COOLDOWN:
-            return False, ROB_COOLDOWN - (now - last)
-    return True, 0
-
-async def update_rob_timestamp(channel: str, robber: str, victim: str):
-    now = int(time.time())
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("""
-      INSERT INTO rob_cooldowns(channel, robber, victim, last_rob)
+    settings_cache.invalidate(channel)
+    responses.bump(channel_scope(channel))
+
+async def get_reward_interval(channel: str) -> int:
+    return (await get_channel_settings(channel))[2]
+
+@db_timed
+async def set_reward_interval(channel: str, seconds: int):
+    await dbx.execute("""
+      INSERT INTO settings(channel, points_name, reward_amount, reward_interval)
       VALUES(?, ?, ?, ?)
-      ON CONFLICT(channel, robber, victim) DO UPDATE
-        SET last_rob = excluded.last_rob
-    """, (channel, robber, victim, now))
-    conn.commit()
-    conn.close()
+      ON CONFLICT(channel) DO UPDATE
+        SET reward_interval = excluded.reward_interval
+    """, (channel, "points", REWARD_AMOUNT, seconds))
+    settings_cache.invalidate(channel)
+    responses.bump(channel_scope(channel))
+
+# ——— Settlement ——————————————————————————————————————————————————
+# Each game command and /rob is settled as one unit: the balance check, the
+# conditional debit and the payout happen in a single writer transaction (or,
+# with the ledger on, a single uninterrupted step on the event loop), so two
+# concurrent commands can't both spend the same points.
+def _settle_wager(conn: sqlite3.Connection, channel: str, user: str, wager: str, play) -> tuple:
+    row = conn.execute("SELECT points FROM users WHERE channel = ? AND username = ?", (channel, user)).fetchone()
+    current = row[0] if row else 0
+    verdict = _check_wager(current, wager)
+    if verdict is not None:
+        return verdict
+    amount = parse_wager(wager, current)
+    payout, outcome = play(amount)
+    row = conn.execute("""
+      UPDATE users SET points = points - ? + ?
+      WHERE channel = ? AND username = ? AND points >= ?
+      RETURNING points
+    """, (amount, payout, channel, user, amount)).fetchone()
+    if row is None:
+        return "short", current, amount, 0, None
+    return "ok", row[0], amount, payout, outcome
+
+def _check_wager(current: int, wager: str) -> Optional[tuple]:
+    if current <= 0:
+        return "broke", current, 0, 0, None
+    amount = parse_wager(wager, current)
+    if amount <= 0:
+        raise HTTPException(400, "Wager must be positive")
+    if amount > current:
+        return "short", current, amount, 0, None
+    return None
+
+@db_timed
+async def settle_wager(user: str, channel: str, wager: str, play) -> tuple:
+    """
+    Debit a wager and credit its payout atomically.
+
+    `play(amount)` runs once the wager is known to be affordable and returns
+    (payout, outcome). Returns (status, balance, amount, payout, outcome)
+    where status is "ok", "broke" (no points) or "short" (wager > balance);
+    `balance` is the balance after settlement, or the current one if refused.
+    """
+    if ledger is None:
+        result = await dbx.write(_settle_wager, channel, user, wager, play)
+    else:
+        current = await ledger.get(user, channel)
+        result  = _check_wager(current, wager)
+        if result is None:
+            amount = parse_wager(wager, current)
+            payout, outcome = play(amount)
+            balance = ledger.apply(user, channel, payout - amount)
+            result  = await ledger.durable(("ok", balance, amount, payout, outcome))
+    if result[0] == "ok":
+        balance_changed(channel, user, result[1])
+    return result
+
+def wager_refusal(status: str, user: str, balance: int, pname: str) -> Optional[PlainTextResponse]:
+    if status == "broke":
+        return PlainTextResponse(f"❌ {user}, you have no {pname}!")
+    if status == "short":
+        return PlainTextResponse(f"❌ {user}, you only have {balance} {pname}!")
+    return None
+
+def _rob_transfer(conn: sqlite3.Connection, channel: str, robber: str, victim: str, pick) -> tuple:
+    row = conn.execute("SELECT points FROM users WHERE channel = ? AND username = ?", (channel, victim)).fetchone()
+    vic_pts = row[0] if row else 0
+    if vic_pts <= 0:
+        return "empty", 0
+    amount = pick(vic_pts)
+    vic_after = conn.execute("""
+      UPDATE users SET points = points - ?
+      WHERE channel = ? AND username = ? AND points >= ?
+      RETURNING points
+    """, (amount, channel, victim, amount)).fetchone()[0]
+    rob_after = conn.execute("""
+      INSERT INTO users(channel, username, points)
+      VALUES(?, ?, ?)
+      ON CONFLICT(channel, username) DO UPDATE
+        SET points = points + excluded.points
+      RETURNING points
+    """, (channel, robber, amount)).fetchone()[0]
+    return "ok", amount, rob_after, vic_after
+
+def _rob_transfer_shared(conn: sqlite3.Connection, channel: str, robber: str, victim: str,
+                         pick, now: float) -> tuple:
+    key  = (channel, robber, victim)
+    wait = cooldowns.remaining(conn, key, now)
+    if wait:
+        return "cooldown", wait
+    result = _rob_transfer(conn, channel, robber, victim, pick)
+    if result[0] == "ok":
+        cooldowns.stamp(conn, key, now)
+    return result
+
+@db_timed
+async def rob_transfer(channel: str, robber: str, victim: str, pick) -> tuple:
+    """
+    Check the cooldown, move `pick(victim_balance)` points from victim to
+    robber and start the cooldown, all as one unit. Returns ("ok", amount),
+    ("cooldown", secs_remaining) or ("empty", 0).
+    """
+    if SHARED_STATE:
+        # cooldown check, transfer and stamp in one writer transaction: the
+        # database lock is what keeps two workers off the same pair
+        result = await dbx.write(_rob_transfer_shared, channel, robber, victim, pick, time.time())
+    else:
+        key  = (channel, robber, victim)
+        wait = cooldowns.remaining(key)
+        if wait:
+            return "cooldown", wait
+        # claim the cooldown before awaiting anything, so a second /rob of the
+        # same pair racing this one is turned away; give it back if nothing moved
+        cooldowns.stamp(key)
+        try:
+            if ledger is None:
+                result = await dbx.write(_rob_transfer, channel, robber, victim, pick)
+            else:
+                await ledger.load(channel, robber, victim)
+                vic_pts = await ledger.get(victim, channel)
+                if vic_pts <= 0:
+                    result = "empty", 0
+                else:
+                    amount    = pick(vic_pts)
+                    vic_after = ledger.apply(victim, channel, -amount)
+                    rob_after = ledger.apply(robber, channel, amount)
+                    result = await ledger.durable(("ok", amount, rob_after, vic_after))
+        except BaseException:
+            cooldowns.clear(key)
+            raise
+        if result[0] != "ok":
+            cooldowns.clear(key)
+    if result[0] != "ok":
+        return result
+    _, amount, rob_after, vic_after = result
+    balance_changed(channel, robber, rob_after)
+    balance_changed(channel, victim, vic_after)
+    return "ok", amount
+
+# ——— IRC presence tracker ————————————————————————————————————————
+# Inbound IRC is handled as bytes: the reader pulls whole socket buffers and
+# splits them into lines in one go, and a NAMES chunk is decoded once and
+# split in C instead of nick by nick.
+IRC_MAX_LINE   = 64 * 1024
+NICK_MODES     = b"@+%~&"
+TAG_ESCAPES    = {"\\:": ";", "\\s": " ", "\\\\": "\\", "\\r": "\r", "\\n": "\n"}
+
+class IrcLineBuffer:
+    """Reassembles a byte stream into complete IRC lines."""
+    __slots__ = ("_partial",)
+
+    def __init__(self):
+        self._partial = b""
+
+    def feed(self, data: bytes) -> List[bytes]:
+        lines = (self._partial + data).split(b"\n") if self._partial else data.split(b"\n")
+        self._partial = lines.pop()
+        if len(self._partial) > IRC_MAX_LINE:
+            self._partial = b""           # no line is this long; drop the junk
+        return lines
+
+def parse_irc(line: bytes) -> tuple:
+    """
+    Split one raw line into (tags, prefix, command, params, trailing), all
+    bytes. tags and prefix are b"" when absent, trailing is None.
+    """
+    line = line.rstrip(b"\r\n")
+    tags = prefix = b""
+    if line[:1] == b"@":
+        tags, _, line = line[1:].partition(b" ")
+    if line[:1] == b":":
+        prefix, _, line = line[1:].partition(b" ")
+    line, colon, trailing = line.partition(b" :")
+    params  = line.split()
+    command = params.pop(0) if params else b""
+    return tags, prefix, command, params, trailing if colon else None
+
+def parse_tags(tags: bytes) -> Dict[str, str]:
+    """IRCv3 message tags as a dict, with escaped values restored."""
+    out = {}
+    for item in tags.decode(errors="ignore").split(";"):
+        key, _, value = item.partition("=")
+        if "\\" in value:
+            value = re.sub(r"\\.", lambda m: TAG_ESCAPES.get(m.group(0), m.group(0)[1:]), value)
+        out[key] = value
+    return out
+
+class TokenBucket:
+    """`rate` tokens per `per` seconds, bursting up to `rate`."""
+    def __init__(self, rate: int, per: float):
+        self.capacity = rate
+        self.tokens   = float(rate)
+        self.fill     = rate / per
+        self.stamp    = time.monotonic()
+
+    async def take(self):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.fill)
+            self.stamp  = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.fill)
+
+class ChatPresence:
+    """
+    Long-lived IRC client that stays joined to every tracked channel and keeps
+    an in-memory "who is here" set per channel, seeded from the NAMES burst
+    (353/366) and kept current from JOIN/PART. Drops are retried with
+    exponential backoff; the last known sets keep serving in the meantime.
+    JOINs go out through a queue paced to Twitch's per-account join limit,
+    so tracking hundreds of channels at once doesn't get the bot throttled.
+    """
+    def __init__(self, host: str, port: int, nick: str, oauth: str,
+                 join_rate: int = IRC_JOIN_RATE, join_per: float = IRC_JOIN_PER):
+        self.host    = host
+        self.port    = port
+        self.nick    = nick
+        self.oauth   = oauth
+        self.join_bucket = TokenBucket(join_rate, join_per)
+        self._to_join: deque = deque()             # channels waiting for a JOIN slot
+        self._join_wanted = asyncio.Event()
+        self.members: Dict[str, set] = {}
+        self._names: Dict[str, set] = {}           # NAMES bursts in progress
+        self._names_events: Dict[str, Dict[str, bool]] = {}   # JOIN/PART seen during one
+        self._synced: Dict[str, asyncio.Event] = {}
+        self._joined: Dict[str, float] = {}        # JOIN sent, for NAMES timing
+        self._join_sent: Dict[str, asyncio.Event] = {}   # JOIN out on this connection
+        self._writer = None
+        self._task   = None
+        self.connected = asyncio.Event()
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def track(self, channel: str):
+        """Start following `channel` (idempotent); its JOIN waits its turn in the queue."""
+        chan = channel.lower()
+        if chan not in self._synced:
+            self._synced[chan] = asyncio.Event()
+            self._join_sent[chan] = asyncio.Event()
+            self.members.setdefault(chan, set())
+            self._to_join.append(chan)
+            self._join_wanted.set()
+        self.start()
+
+    async def chatters(self, channel: str, timeout: float = IRC_JOIN_TIMEOUT) -> set:
+        """Current presence for `channel`; waits for the first NAMES list only once."""
+        await self.track(channel)
+        chan   = channel.lower()
+        synced = self._synced[chan]
+        if not synced.is_set():
+            try:
+                await asyncio.wait_for(synced.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return set(self.members[chan])
+
+    async def joined(self, channel: str, timeout: float = IRC_JOIN_TIMEOUT) -> bool:
+        """Track `channel` and wait for its JOIN to go out on the current
+        connection, so a PRIVMSG sent next follows it; False on timeout."""
+        await self.track(channel)
+        sent = self._join_sent[channel.lower()]
+        if not sent.is_set():
+            try:
+                await asyncio.wait_for(sent.wait(), timeout)
+            except asyncio.TimeoutError:
+                return False
+        return True
+
+    async def privmsg(self, channel: str, text: str) -> bool:
+        """Send a chat message; False if there is no live connection."""
+        if self._writer is None:
+            return False
+        await self._send(f"PRIVMSG #{channel.lower()} :{text}")
+        return True
+
+    async def _join_loop(self):
+        """Send queued JOINs, one per token; runs for the life of a connection."""
+        while True:
+            while not self._to_join:
+                self._join_wanted.clear()
+                await self._join_wanted.wait()
+            await self.join_bucket.take()
+            if not self._to_join:
+                continue
+            chan = self._to_join.popleft()
+            self._joined[chan] = time.perf_counter()
+            self._names_events[chan] = {}
+            await self._send(f"JOIN #{chan}")
+            self._join_sent[chan].set()
+
+    async def _send(self, line: str):
+        if self._writer is None:
+            return
+        self._writer.write(f"{line}\r\n".encode())
+        await self._writer.drain()
+
+    async def _run(self):
+        backoff = IRC_BACKOFF_MIN
+        while True:
+            writer = joiner = None
+            start  = time.perf_counter()
+            try:
+                reader, writer = await asyncio.open_connection(self.host, self.port)
+                self._writer = writer
+                await self._send(f"PASS {self.oauth}")
+                await self._send(f"NICK {self.nick}")
+                await self._send("CAP REQ :twitch.tv/membership")
+                # a new connection has joined nothing: queue every tracked channel
+                self._to_join = deque(self._synced)
+                for sent in self._join_sent.values():
+                    sent.clear()
+                self._join_wanted.set()
+                joiner = asyncio.create_task(self._join_loop())
+                self.connected.set()
+                IRC_CONNECTS.inc("ok")
+                IRC_CONNECT.observe(time.perf_counter() - start)
+                lines = IrcLineBuffer()
+                while True:
+                    data = await reader.read(IRC_MAX_LINE)
+                    if not data:
+                        break
+                    backoff = IRC_BACKOFF_MIN
+                    if not await self._handle_all(lines.feed(data)):
+                        break
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                IRC_CONNECTS.inc("error")
+                print("IRC connection error:", e)
+            finally:
+                self.connected.clear()
+                self._writer = None
+                self._names.clear()
+                self._names_events.clear()
+                if joiner is not None:
+                    joiner.cancel()
+                if writer is not None:
+                    writer.close()
+            await asyncio.sleep(backoff * random.uniform(0.5, 1.0))
+            backoff = min(backoff * 2, IRC_BACKOFF_MAX)
+
+    async def _handle_all(self, lines: List[bytes]) -> bool:
+        for line in lines:
+            if not await self._handle(line):
+                return False
+        return True
+
+    async def _handle(self, line: bytes) -> bool:
+        """Apply one raw IRC line; returns False when the server asks us to reconnect."""
+        _, prefix, command, params, trailing = parse_irc(line)
+        if command == b"353" and params and trailing is not None:
+            # ":tmi.twitch.tv 353 <nick> = #chan :a b c"
+            chan = params[-1].lstrip(b"#").decode(errors="ignore")
+            self._names.setdefault(chan, set()).update(
+                trailing.translate(None, NICK_MODES).decode(errors="ignore").split()
+            )
+        elif command == b"366" and len(params) >= 2:
+            chan = params[1].lstrip(b"#").decode(errors="ignore")
+            members = self._names.pop(chan, set())
+            # JOIN/PART that arrived while the list was open are newer than it
+            for user, present in self._names_events.pop(chan, {}).items():
+                if present:
+                    members.add(user)
+                else:
+                    members.discard(user)
+            self.members[chan] = members
+            joined = self._joined.pop(chan, None)
+            if joined is not None:
+                IRC_NAMES.observe(time.perf_counter() - joined)
+            if chan in self._synced:
+                self._synced[chan].set()
+        elif command in (b"JOIN", b"PART") and params:
+            chan = params[0].lstrip(b"#").decode(errors="ignore")
+            user = prefix.split(b"!", 1)[0].decode(errors="ignore")
+            if command == b"JOIN":
+                self.members.setdefault(chan, set()).add(user)
+            else:
+                self.members.get(chan, set()).discard(user)
+            events = self._names_events.get(chan)
+            if events is not None:
+                events[user] = command == b"JOIN"
+        elif command == b"PING":
+            await self._send("PONG :" + (trailing or b" ".join(params)).decode(errors="ignore"))
+        elif command == b"RECONNECT":
+            return False
+        return True
+
+presence = ChatPresence(IRC_HOST, IRC_PORT, BOT_NICK, BOT_OAUTH)
+GaugeMetric("irc_channel_members", "Chatters currently present.", ("channel",),
+            collect=lambda: {(chan,): len(m) for chan, m in presence.members.items()})
 
-# ——— IRC chatter fetcher —————————————————————————————————————
 async def fetch_chatters_irc(channel: str) -> set:
-    reader, writer = await asyncio.open_connection('irc.chat.twitch.tv', 6667)
-    writer.write(f"PASS {BOT_OAUTH}\r\n".encode())
-    writer.write(f"NICK {BOT_NICK}\r\n".encode())
-    writer.write("CAP REQ :twitch.tv/membership\r\n".encode())
-    writer.write(f"JOIN #{channel}\r\n".encode())
-    await writer.drain()
-
-    chatters = set()
-    while True:
-        line = await reader.readline()
-        if not line:
-            break
-        text = line.decode(errors='ignore').strip()
-        if text.startswith("PING"):
-            writer.write("PONG :tmi.twitch.tv\r\n".encode())
-            await writer.drain()
-        elif " 353 " in text:
-            parts = text.split(" :", 1)
-            if len(parts) == 2:
-                for raw in parts[1].split():
-                    chatters.add(raw.lstrip("@+%~&"))
-        elif " 366 " in text:
-            break
-
-    writer.close()
-    await writer.wait_closed()
-    return chatters
+    return await presence.chatters(channel)
+
+# ——— Outbound chat ———————————————————————————————————————————————
+class ChatSender:
+    """
+    Outbound PRIVMSG queue over the presence tracker's connection.
+
+    Each channel has its own FIFO, so messages to one channel go out in
+    order. Channels with a backlog are served round-robin under one token
+    bucket sized to Twitch's chat limit. Once a channel has `coalesce_after`
+    or more messages waiting, they are joined with " | " into as few 500-char
+    messages as possible. A channel's messages wait until its JOIN has gone
+    out on the current connection; if that takes longer than `join_wait`
+    seconds (the JOIN queue is long) the message goes back to the end of the
+    rotation. Messages that can't be sent because the connection is down wait
+    for the reconnect.
+    """
+    def __init__(self, irc: ChatPresence, rate: int = CHAT_RATE, per: float = CHAT_PER,
+                 coalesce_after: int = CHAT_COALESCE, join_wait: float = CHAT_JOIN_WAIT):
+        self.irc            = irc
+        self.bucket         = TokenBucket(rate, per)
+        self.coalesce_after = max(2, coalesce_after)
+        self.join_wait      = join_wait
+        self.sent           = 0
+        self._queues: Dict[str, deque] = {}
+        self._ready: deque = deque()      # channels with a backlog, served in turn
+        self._pending = asyncio.Event()
+        self._task    = None
+
+    def send(self, channel: str, text: str):
+        chan  = channel.lower()
+        queue = self._queues.setdefault(chan, deque())
+        if not queue:
+            self._ready.append(chan)
+        queue.append(text)
+        self._pending.set()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def backlog(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    def _next(self) -> tuple:
+        chan  = self._ready.popleft()
+        queue = self._queues[chan]
+        text  = queue.popleft()
+        if len(queue) + 1 >= self.coalesce_after:
+            while queue and len(text) + 3 + len(queue[0]) <= CHAT_MAX_LEN:
+                text += " | " + queue.popleft()
+        if queue:
+            self._ready.append(chan)
+        else:
+            del self._queues[chan]
+        if not self._ready:
+            self._pending.clear()
+        return chan, text
+
+    def _requeue(self, chan: str, text: str, front: bool = True):
+        """Put `text` back at the head of its channel's queue; the channel is
+        served next unless `front` is False."""
+        queue = self._queues.setdefault(chan, deque())
+        if not queue:
+            if front:
+                self._ready.appendleft(chan)
+            else:
+                self._ready.append(chan)
+        queue.appendleft(text)
+        self._pending.set()
+
+    async def _run(self):
+        while True:
+            await self._pending.wait()
+            await self.bucket.take()
+            self.irc.start()
+            await self.irc.connected.wait()
+            if not self._ready:
+                continue
+            chan, text = self._next()
+            try:
+                if not await self.irc.joined(chan, self.join_wait):
+                    self._requeue(chan, text, front=False)
+                    continue
+                ok = await self.irc.privmsg(chan, text)
+            except Exception as e:
+                print("Chat send error:", e)
+                ok = False
+            if ok:
+                self.sent += 1
+            else:
+                self._requeue(chan, text)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+chat = ChatSender(presence)
+GaugeMetric("chat_backlog", "Outbound chat messages waiting on the rate limit.",
+            collect=lambda: {(): chat.backlog()})
 
 # ——— Background rewards ——————————————————————————————————————
-@app.on_event("startup")
-async def start_reward_loop():
-    async def loop_rewards():
+async def reward_channel(chan: str) -> int:
+    """Pay one tick's reward to everyone present in `chan`; returns the head count."""
+    name     = await get_points_name(chan)
+    reward   = await get_reward_amount(chan)
+    chatters = await fetch_chatters_irc(chan)
+    inserted, updated = await bulk_add_points(chatters, chan, reward)
+    print(f"Rewarded {len(chatters)} users {reward} {name} each in {chan} "
+          f"({inserted} new, {updated} existing).")
+    return len(chatters)
+
+class RewardScheduler:
+    """
+    Runs reward ticks for every channel in `settings`, each on its own
+    `reward_interval`. Channels are re-discovered periodically, at most
+    `concurrency` ticks run at once, and each channel's first tick is offset
+    by a stable fraction of its interval so ticks don't all land together.
+    `stats` keeps per-channel tick duration, lag and overrun counts.
+    """
+    def __init__(self, concurrency: int = REWARD_WORKERS,
+                 discover_every: float = REWARD_DISCOVERY):
+        self.concurrency    = max(1, concurrency)
+        self.discover_every = discover_every
+        self.intervals: Dict[str, int] = {}
+        self.stats: Dict[str, dict] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._sem  = None
+        self._main = None
+
+    def start(self):
+        if self._main is None:
+            self._sem  = asyncio.Semaphore(self.concurrency)
+            self._main = asyncio.create_task(self._discover_loop())
+
+    async def stop(self):
+        tasks = list(self._tasks.values()) + ([self._main] if self._main else [])
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
+        self._main = None
+
+    async def discover(self):
+        rows  = await dbx.fetchall("SELECT channel, reward_interval FROM settings")
+        found = {chan: max(1, interval) for chan, interval in rows}
+        for chan in set(self._tasks) - set(found):
+            self._tasks.pop(chan).cancel()
+        for chan, interval in found.items():
+            self.intervals[chan] = interval
+            if chan not in self._tasks:
+                await presence.track(chan)
+                self.stats[chan] = {"ticks": 0, "chatters": 0, "duration": 0.0,
+                                    "lag": 0.0, "max_lag": 0.0, "overruns": 0, "errors": 0}
+                self._tasks[chan] = asyncio.create_task(self._channel_loop(chan))
+
+    async def _discover_loop(self):
         while True:
             try:
-                chan     = DEFAULT_CHANNEL
-                name     = get_points_name(chan)
-                reward   = get_reward_amount(chan)
-                chatters = await fetch_chatters_irc(chan)
-                for u in chatters:
-                    await add_user_points(u, chan, reward)
-                print(f"Rewarded {len(chatters)} users {reward} {name} each in {chan}.")
+                await self.discover()
             except Exception as e:
-                print("Reward loop error:", e)
-            await asyncio.sleep(REWARD_INTERVAL)
-    asyncio.create_task(loop_rewards())
+                print("Reward discovery error:", e)
+            await asyncio.sleep(self.discover_every)
+
+    async def _channel_loop(self, chan: str):
+        loop  = asyncio.get_running_loop()
+        phase = (zlib.crc32(chan.encode()) % 1000) / 1000
+        due   = loop.time() + phase * self.intervals[chan]
+        stats = self.stats[chan]
+        while True:
+            await asyncio.sleep(max(0.0, due - loop.time()))
+            async with self._sem:
+                start = loop.time()
+                try:
+                    stats["chatters"] = await reward_channel(chan)
+                except Exception as e:
+                    stats["errors"] += 1
+                    print(f"Reward loop error in {chan}:", e)
+                end = loop.time()
+            interval = self.intervals.get(chan, REWARD_INTERVAL)
+            REWARD_TICKS.observe(end - start, chan)
+            stats["ticks"]   += 1
+            stats["duration"] = end - start
+            stats["lag"]      = start - due
+            stats["max_lag"]  = max(stats["max_lag"], stats["lag"])
+            due += interval
+            if end > due:
+                # the tick (plus its wait for a slot) ate the whole interval;
+                # count it and skip ahead instead of firing a burst of catch-ups
+                stats["overruns"] += 1
+                due = end
+            stats["next_due"] = due
+
+rewards = RewardScheduler()
+
+def _reward_stat(key: str):
+    return lambda: {(chan,): st[key] for chan, st in rewards.stats.items()}
+
+GaugeMetric("reward_tick_chatters", "Chatters paid on the last tick.", ("channel",),
+            collect=_reward_stat("chatters"))
+GaugeMetric("reward_tick_lag_seconds", "How late the last tick started.", ("channel",),
+            collect=_reward_stat("lag"))
+CounterMetric("reward_tick_overruns_total", "Ticks that ran past their interval.", ("channel",),
+              collect=_reward_stat("overruns"))
+CounterMetric("reward_tick_errors_total", "Ticks that failed.", ("channel",),
+              collect=_reward_stat("errors"))
+
+# ——— Leader lease ——————————————————————————————————————————————————
+# Reward ticks (and, with shared state, raffle draws) must happen once, not
+# once per worker. Every worker runs the lease loop; whoever holds the
+# unexpired row in `leases` does that work. The holder renews it every
+# ttl/3, so if its worker dies another one takes over within `ttl` seconds.
+class Lease:
+    def __init__(self, name: str, on_acquire, on_release, ttl: float = LEASE_TTL):
+        self.name       = name
+        self.ttl        = ttl
+        self.holder     = f"{os.getpid()}-{secrets.token_hex(4)}"
+        self.held       = False
+        self.on_acquire = on_acquire
+        self.on_release = on_release
+        self._task      = None
+
+    def _claim(self, conn: sqlite3.Connection, now: float) -> bool:
+        return conn.execute("""
+          INSERT INTO leases(name, holder, expires) VALUES(?, ?, ?)
+          ON CONFLICT(name) DO UPDATE SET holder = excluded.holder, expires = excluded.expires
+          WHERE leases.holder = excluded.holder OR leases.expires < ?
+        """, (self.name, self.holder, now + self.ttl, now)).rowcount == 1
+
+    async def _set(self, held: bool):
+        if held == self.held:
+            return
+        self.held = held
+        try:
+            await (self.on_acquire() if held else self.on_release())
+        except Exception as e:
+            print(f"Lease {self.name} handover error:", e)
+
+    async def _run(self):
+        while True:
+            try:
+                held = await dbx.write(self._claim, time.time())
+            except Exception as e:
+                print(f"Lease {self.name} error:", e)
+                held = False
+            await self._set(held)
+            await asyncio.sleep(self.ttl / 3)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop competing; if we led, stop the work and free the row for the next worker."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.held:
+            await self._set(False)
+            await dbx.execute("DELETE FROM leases WHERE name = ? AND holder = ?", (self.name, self.holder))
+
+async def start_leading():
+    await presence.track(DEFAULT_CHANNEL)
+    rewards.start()
+    raffles.start_timers()
+
+async def stop_leading():
+    await rewards.stop()
+    await raffles.stop_timers()
+
+leader = Lease("leader", start_leading, stop_leading)
+GaugeMetric("leader", "1 while this worker holds the leader lease.", collect=lambda: {(): int(leader.held)})
 
 # ——— Keep-alive ping ——————————————————————————————————————————
-@app.on_event("startup")
-async def schedule_ping():
-    async def pinger():
-        import httpx
-        async with httpx.AsyncClient(timeout=5) as client:
-            while True:
-                try:
-                    await client.get(f"{SERVICE_URL}/ping")
-                except:
-                    pass
-                await asyncio.sleep(120)
-    asyncio.create_task(pinger())
+# The free-tier host sleeps when idle; fetching our own public URL keeps it
+# awake. Started with the rest of the deferred background work, so it never
+# delays the first response. KEEPALIVE_URL="" turns it off (the benchmarks
+# do, so they never reach out to the internet).
+async def keepalive(url: str, interval: float):
+    import httpx
+    async with httpx.AsyncClient(timeout=5) as client:
+        while True:
+            try:
+                await client.get(url)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:     # whatever goes wrong, try again next interval
+                print("Keep-alive ping error:", e)
+            await asyncio.sleep(interval)
 
 # ——— Serve index.html ——————————————————————————————————————————
+@functools.lru_cache(maxsize=None)
+def get_templates():
+    # jinja2 is a noticeable slice of import time and only "/" uses it
+    from fastapi.templating import Jinja2Templates
+    return Jinja2Templates(directory="templates")
+
 @app.get("/", response_class=HTMLResponse)
 async def read_index(request: Request):
-    return templates.TemplateResponse("index.html", {"request": request})
+    return get_templates().TemplateResponse(request, "index.html")
 
 # --- Data Models ---
-class Driver(BaseModel):
+# Plain slotted dataclasses rather than pydantic models: a large league keeps
+# one of these per driver and race in memory for its whole life.
+@dataclass(slots=True)
+class Driver:
     id: int
     name: str
     team: str
-    skill: float = Field(ge=0.0, le=1.0, description="Driver skill coefficient 0-1")
+    skill: float    # driver skill coefficient 0-1
     points: int = 0
     podiums: int = 0
     races: int = 0
 
-class Race(BaseModel):
+@dataclass(slots=True)
+class Race:
     id: int
     name: str
     track: str
     laps: int
     completed: bool = False
-    result: Optional[Dict[int, int]] = None  # driver_id -> position
+    result: Optional[array] = None  # finishing order: driver ids, winner first
 
 # --- In-memory stores ---
+LEAGUE_SCOPE = "league"     # response-cache scope: bump on any driver/race change
+
+# write-through index over the f1_* tables; ids are allocated by SQLite
 drivers: Dict[int, Driver] = {}
 races: Dict[int, Race] = {}
-next_driver_id = 1
-next_race_id = 1
 
 # F1 points for top 10
 F1_POINTS = [25, 18, 15, 12, 10, 8, 6, 4, 2, 1]
 
+# --- Standings ---
+class Standings:
+    """
+    Driver and team standings kept sorted as results come in, so reads are
+    a slice instead of a sort.
+
+    Drivers are ordered by (points, podiums) descending, ties by id; teams
+    by total points, ties by the order the team first appeared. Both match
+    what a stable sort over `drivers` would give.
+    """
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.driver_keys: list = []                # sorted (-points, -podiums, id)
+        self.team_keys: list = []                  # sorted (-total, seq, team)
+        self.team_totals: Dict[str, int] = {}
+        self._team_seq: Dict[str, int] = {}
+        self.race_text: Dict[int, str] = {}        # formatted results per completed race
+
+    def rebuild(self, keep_text: bool = True):
+        """
+        Re-sort everything from `drivers`. Cached race text survives by
+        default (a re-sort changes no race's results); pass keep_text=False
+        when `drivers`/`races` were replaced, since race ids can be reused.
+        """
+        race_text = self.race_text
+        self.clear()
+        if keep_text:
+            self.race_text = race_text
+        for d in drivers.values():
+            self.add_driver(d)
+
+    def add_driver(self, d: Driver):
+        bisect.insort(self.driver_keys, (-d.points, -d.podiums, d.id))
+        if d.team not in self.team_totals:
+            self._team_seq[d.team] = len(self._team_seq)
+            self.team_totals[d.team] = 0
+            bisect.insort(self.team_keys, (0, self._team_seq[d.team], d.team))
+        self._move_team(d.team, d.points)
+
+    def score(self, d: Driver, points: int, podiums: int):
+        """Add a result to `d`, keeping both orderings current."""
+        keys = self.driver_keys
+        del keys[bisect.bisect_left(keys, (-d.points, -d.podiums, d.id))]
+        d.points  += points
+        d.podiums += podiums
+        bisect.insort(keys, (-d.points, -d.podiums, d.id))
+        self._move_team(d.team, points)
+
+    def _move_team(self, team: str, delta: int):
+        if not delta:
+            return
+        seq, total = self._team_seq[team], self.team_totals[team]
+        del self.team_keys[bisect.bisect_left(self.team_keys, (-total, seq, team))]
+        self.team_totals[team] = total + delta
+        bisect.insort(self.team_keys, (-(total + delta), seq, team))
+
+    def teams(self) -> List[str]:
+        """Teams in first-appearance order, the tie-break order for team standings."""
+        return list(self._team_seq)
+
+    def drivers_page(self, offset: int = 0, limit: Optional[int] = None) -> List[Driver]:
+        end = None if limit is None else offset + limit
+        return [drivers[did] for _, _, did in self.driver_keys[offset:end]]
+
+    def teams_page(self, offset: int = 0, limit: Optional[int] = None) -> list:
+        end = None if limit is None else offset + limit
+        return [(team, -neg) for neg, _, team in self.team_keys[offset:end]]
+
+standings = Standings()
+
+# --- Persistence ---
+# Every league write also bumps the "league" row of state_versions in its
+# own transaction; see LeagueSync for how workers use it.
+def _bump_version(conn: sqlite3.Connection, scope: str) -> int:
+    return conn.execute("""
+      INSERT INTO state_versions(scope, version) VALUES(?, 1)
+      ON CONFLICT(scope) DO UPDATE SET version = version + 1
+      RETURNING version
+    """, (scope,)).fetchone()[0]
+
+def _read_version(conn: sqlite3.Connection, scope: str) -> int:
+    row = conn.execute("SELECT version FROM state_versions WHERE scope = ?", (scope,)).fetchone()
+    return row[0] if row else 0
+
+def _load_league(conn: sqlite3.Connection) -> tuple:
+    # read first: if a write lands mid-load the data is newer than the
+    # version, which only costs an extra reload later, never a stale league
+    version = _read_version(conn, LEAGUE_SCOPE)
+    teams = {}
+    loaded_drivers = {
+        row[0]: Driver(row[0], row[1], teams.setdefault(row[2], row[2]), *row[3:])
+        for row in conn.execute("SELECT id, name, team, skill, points, podiums, races FROM f1_drivers")
+    }
+    finish = dict(conn.execute("SELECT race_id, finish FROM f1_results"))
+    loaded_races = {}
+    for rid, name, track, laps, completed in conn.execute(
+        "SELECT id, name, track, laps, completed FROM f1_races"
+    ):
+        blob = finish.get(rid)
+        loaded_races[rid] = Race(rid, name, track, laps, bool(completed),
+                                 array("I", blob) if blob is not None else None)
+    return version, loaded_drivers, loaded_races
+
+async def load_league():
+    """Replace the in-memory league with what's on disk (bulk load at startup)."""
+    version, loaded_drivers, loaded_races = await dbx.read(_load_league)
+    drivers.clear()
+    drivers.update(loaded_drivers)
+    races.clear()
+    races.update(loaded_races)
+    standings.rebuild(keep_text=False)
+    league.loaded(version)
+    responses.bump(LEAGUE_SCOPE)
+
+class LeagueSync:
+    """
+    Tracks which league version this worker's `drivers`/`races` reflect.
+    With SHARED_STATE, sync() runs before every league read or write and
+    reloads if another worker has moved the version on. Our own writes
+    report the version they produced: if it directly follows the one we
+    hold (and no reload raced the write) memory already matches it;
+    otherwise the next sync reloads. A single process never has another
+    writer to catch up with, so there sync() only reloads after one of our
+    own saves failed (stale()) and left memory ahead of disk.
+    """
+    def __init__(self):
+        self.version = 0
+        self.loads   = 0
+        self._lock   = asyncio.Lock()
+
+    def loaded(self, version: int):
+        self.version = version
+        self.loads  += 1
+
+    def wrote(self, version: int, loads: int) -> bool:
+        """Record our write's version; False if a reload raced it, in which
+        case the caller must not apply the write to memory itself."""
+        if loads != self.loads:
+            self.version = -1
+            return False
+        self.version = version if version == self.version + 1 else -1
+        return True
+
+    def stale(self):
+        self.version = -1
+
+    async def sync(self):
+        if not SHARED_STATE and self.version != -1:
+            return
+        if await dbx.read(_read_version, LEAGUE_SCOPE) == self.version:
+            return
+        async with self._lock:
+            # another request may have reloaded while we waited
+            if await dbx.read(_read_version, LEAGUE_SCOPE) != self.version:
+                await load_league()
+
+league = LeagueSync()
+
+async def save_league(fn, *args):
+    """
+    Persist a race run that has already been applied to memory. If the
+    write fails or is refused (another worker ran the race first), or a
+    reload raced it, memory is marked stale so the next sync reloads it
+    from disk, with or without SHARED_STATE.
+    """
+    loads = league.loads
+    try:
+        version = await dbx.write(fn, *args)
+    except BaseException:
+        league.stale()
+        raise
+    league.wrote(version, loads)
+
+def _insert_driver(conn: sqlite3.Connection, name: str, team: str, skill: float) -> tuple:
+    did = conn.execute(
+        "INSERT INTO f1_drivers(name, team, skill) VALUES(?, ?, ?) RETURNING id", (name, team, skill)
+    ).fetchone()[0]
+    return did, _bump_version(conn, LEAGUE_SCOPE)
+
+def _save_race_result(conn: sqlite3.Connection, race_id: int, finish: array, top: list, max_id: int) -> int:
+    # conditional, so a race another worker already ran can't be scored twice
+    if conn.execute("UPDATE f1_races SET completed = 1 WHERE id = ? AND completed = 0", (race_id,)).rowcount != 1:
+        raise HTTPException(400, "Race already completed")
+    conn.execute("INSERT OR REPLACE INTO f1_results(race_id, finish) VALUES(?, ?)",
+                 (race_id, finish.tobytes()))
+    # everyone on the grid started; ids only grow, so the grid is id <= max_id
+    conn.execute("UPDATE f1_drivers SET races = races + 1 WHERE id <= ?", (max_id,))
+    conn.executemany(
+        "UPDATE f1_drivers SET points = points + ?, podiums = podiums + ? WHERE id = ?", top
+    )
+    return _bump_version(conn, LEAGUE_SCOPE)
+
+def _schedule_races(conn: sqlite3.Connection, rows: list) -> tuple:
+    ids = [
+        conn.execute("INSERT INTO f1_races(name, track, laps) VALUES(?, ?, ?) RETURNING id", row).fetchone()[0]
+        for row in rows
+    ]
+    return ids, _bump_version(conn, LEAGUE_SCOPE)
+
+def _save_race_results(conn: sqlite3.Connection, results: list, deltas: list, max_id: int):
+    """Batch form of _save_race_result: results are (race_id, finish), deltas are
+    (points, podiums, driver_id) summed over all of them."""
+    cur = conn.executemany("UPDATE f1_races SET completed = 1 WHERE id = ? AND completed = 0",
+                           [(rid,) for rid, _ in results])
+    if cur.rowcount != len(results):
+        raise HTTPException(400, "Race already completed")
+    conn.executemany("INSERT OR REPLACE INTO f1_results(race_id, finish) VALUES(?, ?)",
+                     [(rid, finish.tobytes()) for rid, finish in results])
+    conn.execute("UPDATE f1_drivers SET races = races + ? WHERE id <= ?", (len(results), max_id))
+    conn.executemany(
+        "UPDATE f1_drivers SET points = points + ?, podiums = podiums + ? WHERE id = ?", deltas
+    )
+    return _bump_version(conn, LEAGUE_SCOPE)
+
+def _reset_league(conn: sqlite3.Connection) -> int:
+    conn.execute("DELETE FROM f1_results")
+    conn.execute("DELETE FROM f1_races")
+    conn.execute("DELETE FROM f1_drivers")
+    return _bump_version(conn, LEAGUE_SCOPE)
+
 # --- Helper: format race results ---
 def format_race_results(race: Race) -> str:
+    cached = standings.race_text.get(race.id)
+    if cached is not None:
+        return cached
     lines = []
-    positions = race.result or {}
-    # invert positions dict to list sorted by position
-    sorted_drivers = sorted(positions.items(), key=lambda x: x[1])
-    for pos, (did, _) in enumerate(sorted_drivers, start=1):
+    for pos, did in enumerate(race.result or (), start=1):
         drv = drivers[did]
         pts = F1_POINTS[pos-1] if pos <= 10 else 0
         lines.append(f"{pos}. {drv.name} ({drv.team}) - +{pts} pts")
-    return f"Results for race '{race.name}':\n" + "\n".join(lines)
+    text = f"Results for race '{race.name}':\n" + "\n".join(lines)
+    if race.completed:
+        standings.race_text[race.id] = text
+    return text
 
 # --- API Endpoints ---
 
 # Driver endpoints
 @app.post("/drivers")
 async def create_driver(name: str, team: str, skill: float = 0.5):
-    global next_driver_id
     if not name or not team or not (0.0 <= skill <= 1.0):
         raise HTTPException(status_code=400, detail="Usage: provide valid name, team, and skill 0-1")
-    d = Driver(id=next_driver_id, name=name, team=team, skill=skill)
-    drivers[next_driver_id] = d
-    next_driver_id += 1
+    await league.sync()
+    loads = league.loads
+    did, version = await dbx.write(_insert_driver, name, team, skill)
+    d = Driver(id=did, name=name, team=team, skill=skill)
+    if league.wrote(version, loads):
+        drivers[d.id] = d
+        standings.add_driver(d)
+    responses.bump(LEAGUE_SCOPE)
     return d
 
 @app.get("/drivers/create")
@@ -286,14 +2440,19 @@ async def create_driver_get(name: Optional[str] = None, team: Optional[str] = No
     return PlainTextResponse(f"Driver created: ID {d.id} - {d.name} ({d.team}), Skill {d.skill}")
 
 @app.get("/drivers")
-async def list_drivers():
-    if not drivers:
-        return PlainTextResponse("No drivers registered.")
-    lines = [f"{d.id}: {d.name} ({d.team}) - {d.points} pts" for d in drivers.values()]
-    return PlainTextResponse("Drivers:\n" + "\n".join(lines))
+async def list_drivers(request: Request):
+    await league.sync()
+
+    async def build():
+        if not drivers:
+            return PlainTextResponse("No drivers registered.")
+        lines = [f"{d.id}: {d.name} ({d.team}) - {d.points} pts" for d in drivers.values()]
+        return PlainTextResponse("Drivers:\n" + "\n".join(lines))
+    return await responses.serve(request, LEAGUE_SCOPE, build)
 
 @app.get("/drivers/{driver_id}")
 async def get_driver(driver_id: int):
+    await league.sync()
     d = drivers.get(driver_id)
     if not d:
         return PlainTextResponse("Driver not found.")
@@ -304,12 +2463,15 @@ async def get_driver(driver_id: int):
 # Race endpoints
 @app.post("/races")
 async def schedule_race(name: str, track: str, laps: int = 58):
-    global next_race_id
     if not name or not track:
         raise HTTPException(status_code=400, detail="Usage: provide valid race name and track")
-    r = Race(id=next_race_id, name=name, track=track, laps=laps)
-    races[next_race_id] = r
-    next_race_id += 1
+    await league.sync()
+    loads = league.loads
+    ids, version = await dbx.write(_schedule_races, [(name, track, laps)])
+    r = Race(id=ids[0], name=name, track=track, laps=laps)
+    if league.wrote(version, loads):
+        races[r.id] = r
+    responses.bump(LEAGUE_SCOPE)
     return r
 
 @app.get("/races/create")
@@ -319,15 +2481,118 @@ async def schedule_race_get(name: Optional[str] = None, track: Optional[str] = N
     r = await schedule_race(name=name, track=track, laps=laps)
     return PlainTextResponse(f"Race scheduled: ID {r.id} - {r.name} at {r.track}, {r.laps} laps")
 
+# Batch runs; registered ahead of /races/{race_id} so "run" isn't read as an id
+async def run_races(race_ids: Optional[List[int]] = None, schedule: int = 0,
+                    track: str = "TBD", laps: int = 58, seed: Optional[int] = None) -> tuple:
+    """
+    Schedule `schedule` new races, then run them together with `race_ids`
+    (every pending race if None) in one vectorized pass. Returns the races
+    run and the time spent simulating.
+    """
+    import numpy as np
+    if schedule < 0 or schedule > 10000:
+        raise HTTPException(400, "schedule must be between 0 and 10000")
+    await league.sync()
+    if race_ids is not None:
+        missing = [rid for rid in race_ids if rid not in races]
+        if missing:
+            raise HTTPException(404, f"Race not found: {missing[0]}")
+        if any(races[rid].completed for rid in race_ids):
+            raise HTTPException(400, "Race already completed")
+    fresh = []
+    if schedule:
+        base = len(races)
+        rows = [(f"Race {base + i}", track, laps) for i in range(1, schedule + 1)]
+        loads = league.loads
+        ids, version = await dbx.write(_schedule_races, rows)
+        fresh = [Race(id=rid, name=name, track=track, laps=laps) for rid, (name, _, _) in zip(ids, rows)]
+        if league.wrote(version, loads):
+            races.update((r.id, r) for r in fresh)
+        responses.bump(LEAGUE_SCOPE)
+    if race_ids is None:
+        batch = [r for r in races.values() if not r.completed]
+    else:
+        # anything a concurrent run finished while we were scheduling is skipped
+        batch = [races[rid] for rid in dict.fromkeys(race_ids) if not races[rid].completed] + fresh
+    if not batch or not drivers:
+        return [], 0.0
+
+    t0 = time.perf_counter()
+    grid = np.fromiter(drivers, dtype=np.uint32, count=len(drivers))
+    skills = np.fromiter((d.skill for d in drivers.values()), dtype=np.float64, count=len(drivers))
+    rng = np.random.default_rng(seed)
+    k = min(len(F1_POINTS), len(grid))
+    results, pts, pods = [], np.zeros(len(grid), np.int64), np.zeros(len(grid), np.int64)
+    chunk = max(1, 4_000_000 // len(grid))
+    for start in range(0, len(batch), chunk):
+        order = _finishing_order(rng, skills, min(chunk, len(batch) - start))
+        pts  += np.bincount(order[:, :k].ravel(), weights=np.tile(F1_POINTS[:k], len(order)),
+                            minlength=len(grid)).astype(np.int64)
+        pods += np.bincount(order[:, :min(3, k)].ravel(), minlength=len(grid))
+        for r, finish in zip(batch[start:start + chunk], grid[order]):
+            r.result = array("I", finish.tobytes())
+            r.completed = True
+            results.append((r.id, r.result))
+    elapsed = time.perf_counter() - t0
+
+    # apply in aggregate: one standings move per scoring driver, or a re-sort if most moved
+    scored = np.flatnonzero(pts | pods)
+    deltas = [(int(pts[i]), int(pods[i]), int(grid[i])) for i in scored]
+    for d in drivers.values():
+        d.races += len(batch)
+    if len(deltas) * 8 > len(grid):
+        for p, q, did in deltas:
+            d = drivers[did]
+            d.points  += p
+            d.podiums += q
+        standings.rebuild()
+    else:
+        for p, q, did in deltas:
+            standings.score(drivers[did], p, q)
+    responses.bump(LEAGUE_SCOPE)
+    await save_league(_save_race_results, results, deltas, max(drivers))
+    return batch, elapsed
+
+@app.post("/races/run")
+async def run_races_post(ids: Optional[str] = None, schedule: int = 0, track: str = "TBD",
+                         laps: int = 58, seed: Optional[int] = None, limit: int = 10):
+    try:
+        race_ids = [int(x) for x in ids.split(",") if x.strip()] if ids else None
+    except ValueError:
+        raise HTTPException(400, "ids must be comma-separated race ids")
+    batch, elapsed = await run_races(race_ids, schedule, track, laps, seed)
+    if not batch:
+        return PlainTextResponse("No races to run." if drivers else "No drivers entered.")
+    lines = [f"Ran {len(batch)} races in {elapsed * 1000:.0f}ms"]
+    for r in batch[:limit]:
+        podium = " / ".join(drivers[did].name for did in r.result[:3])
+        lines.append(f"{r.id}. {r.name}: {podium}")
+    if len(batch) > limit:
+        lines.append(f"... and {len(batch) - limit} more")
+    leader = standings.drivers_page(0, 1)[0]
+    lines.append(f"Leader: {leader.name} - {leader.points} pts")
+    return PlainTextResponse("\n".join(lines))
+
+@app.get("/races/run")
+async def run_races_get(ids: Optional[str] = None, schedule: int = 0, track: str = "TBD",
+                        laps: int = 58, seed: Optional[int] = None, limit: int = 10):
+    # alias GET to POST for Nightbot
+    return await run_races_post(ids, schedule, track, laps, seed, limit)
+
 @app.get("/races")
-async def list_races():
-    if not races:
-        return PlainTextResponse("No races scheduled.")
-    lines = [f"{r.id}: {r.name} at {r.track}, {r.laps} laps" + (" (Done)" if r.completed else "") for r in races.values()]
-    return PlainTextResponse("Races:\n" + "\n".join(lines))
+async def list_races(request: Request):
+    await league.sync()
+
+    async def build():
+        if not races:
+            return PlainTextResponse("No races scheduled.")
+        lines = [f"{r.id}: {r.name} at {r.track}, {r.laps} laps" + (" (Done)" if r.completed else "") for r in races.values()]
+        return PlainTextResponse("Races:\n" + "\n".join(lines))
+    return await responses.serve(request, LEAGUE_SCOPE, build)
 
 @app.get("/races/{race_id}")
 async def get_race(race_id: int):
+    await league.sync()
     r = races.get(race_id)
     if not r:
         return PlainTextResponse("Race not found.")
@@ -336,6 +2601,7 @@ async def get_race(race_id: int):
 
 @app.post("/races/{race_id}/run")
 async def run_race(race_id: int):
+    await league.sync()
     r = races.get(race_id)
     if not r:
         raise HTTPException(status_code=404, detail="Race not found")
@@ -344,16 +2610,17 @@ async def run_race(race_id: int):
     # simulate performance
     perf = [(d.id, random.gauss(d.skill, 0.1)) for d in drivers.values()]
     perf.sort(key=lambda x: x[1], reverse=True)
-    r.result = {did: pos for pos, (did, _) in enumerate(perf, start=1)}
-    # update stats
-    for pos, (did, _) in enumerate(perf, start=1):
-        d = drivers[did]
+    r.result = array("I", (did for did, _ in perf))
+    # update stats; only the points finishers move in the standings
+    top = []
+    for d in drivers.values():
         d.races += 1
-        if pos <= 10:
-            d.points += F1_POINTS[pos-1]
-        if pos <= 3:
-            d.podiums += 1
+    for pos, (did, _) in enumerate(perf[:len(F1_POINTS)], start=1):
+        top.append((F1_POINTS[pos-1], 1 if pos <= 3 else 0, did))
+        standings.score(drivers[did], *top[-1][:2])
     r.completed = True
+    responses.bump(LEAGUE_SCOPE)
+    await save_league(_save_race_result, r.id, r.result, top, max(drivers, default=0))
     return PlainTextResponse(format_race_results(r))
 
 @app.get("/races/{race_id}/run")
@@ -363,31 +2630,147 @@ async def run_race_get(race_id: int):
 
 # Standings
 @app.get("/standings/drivers")
-async def driver_standings():
-    if not drivers:
-        return PlainTextResponse("No drivers to rank.")
-    sd = sorted(drivers.values(), key=lambda d: (d.points, d.podiums), reverse=True)
-    lines = [f"{i+1}. {d.name} - {d.points} pts ({d.podiums} podiums)" for i, d in enumerate(sd)]
-    return PlainTextResponse("Driver Standings:\n" + "\n".join(lines))
+async def driver_standings(request: Request, limit: Optional[int] = None, offset: int = 0):
+    await league.sync()
+
+    async def build():
+        if not drivers:
+            return PlainTextResponse("No drivers to rank.")
+        start = max(0, offset)
+        sd = standings.drivers_page(start, limit)
+        lines = [f"{i}. {d.name} - {d.points} pts ({d.podiums} podiums)" for i, d in enumerate(sd, start=start + 1)]
+        return PlainTextResponse("Driver Standings:\n" + "\n".join(lines))
+    return await responses.serve(request, LEAGUE_SCOPE, build)
 
 @app.get("/standings/teams")
-async def team_standings():
+async def team_standings(request: Request, limit: Optional[int] = None, offset: int = 0):
+    await league.sync()
+
+    async def build():
+        if not drivers:
+            return PlainTextResponse("No team data.")
+        start = max(0, offset)
+        sd = standings.teams_page(start, limit)
+        lines = [f"{i}. {team} - {pts} pts" for i, (team, pts) in enumerate(sd, start=start + 1)]
+        return PlainTextResponse("Team Standings:\n" + "\n".join(lines))
+    return await responses.serve(request, LEAGUE_SCOPE, build)
+
+# --- Projection ---
+RACE_NOISE = 0.1    # stddev of a driver's race-day performance around their skill
+
+def _finishing_order(rng, skills, count: int, k: Optional[int] = None):
+    """
+    Sample `count` races for the grid `skills` in one go, returning a
+    (count, k) array of grid indices in finishing order (all of them if
+    `k` is None). Same model as a single /run: gauss(skill, RACE_NOISE).
+    """
+    import numpy as np
+    n = len(skills)
+    # sorting on -perf: float32 noise is plenty for ordering and halves the work
+    perf = rng.standard_normal((count, n), dtype=np.float32)
+    perf *= -RACE_NOISE
+    perf -= np.asarray(skills, dtype=np.float32)
+    if k is None or n <= 4 * k:
+        order = np.argsort(perf, axis=1)
+        return order if k is None else order[:, :k]
+    part = np.argpartition(perf, k - 1, axis=1)[:, :k]
+    order = np.argsort(np.take_along_axis(perf, part, axis=1), axis=1)
+    return np.take_along_axis(part, order, axis=1)
+
+def _project_season(skills, points, podiums, team_of, n_teams: int,
+                    n_races: int, sims: int, seed: Optional[int]) -> dict:
+    """
+    Monte Carlo over the rest of the season. Grid arrays are in driver-id
+    order and teams in first-appearance order, so argmax ties resolve the
+    way the standings do. Returns per-driver and per-team probabilities of
+    winning the title and of finishing it in the top three.
+    """
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    n = len(skills)
+    k = min(len(F1_POINTS), n)
+    award = np.array(F1_POINTS[:k], dtype=np.int64)
+    on_podium = (np.arange(k) < 3).astype(np.int64)
+    team_matrix = np.zeros((n, n_teams), dtype=np.int64)
+    team_matrix[np.arange(n), team_of] = 1
+
+    wins, top3 = np.zeros(n, dtype=np.int64), np.zeros(n, dtype=np.int64)
+    team_wins, team_top3 = np.zeros(n_teams, dtype=np.int64), np.zeros(n_teams, dtype=np.int64)
+    # bound each chunk's (sims, drivers) working set to a few million cells
+    chunk = max(1, min(sims, 4_000_000 // max(n, 1)))
+    for start in range(0, sims, chunk):
+        m = min(chunk, sims - start)
+        pts = np.tile(points, (m, 1))
+        pods = np.tile(podiums, (m, 1))
+        flat_pts, flat_pods = pts.reshape(-1), pods.reshape(-1)
+        row_base = (np.arange(m) * n)[:, None]
+        for _ in range(n_races):
+            cells = _finishing_order(rng, skills, m, k) + row_base
+            flat_pts[cells] += award
+            flat_pods[cells] += on_podium
+        # drivers rank by (points, podiums); podiums < races + 1 keeps the key exact
+        key = pts * (int(pods.max(initial=0)) + 1) + pods
+        order = np.argsort(-key, axis=1, kind="stable")
+        wins += np.bincount(order[:, 0], minlength=n)
+        top3 += np.bincount(order[:, :3].ravel(), minlength=n)
+        team_pts = pts @ team_matrix
+        team_order = np.argsort(-team_pts, axis=1, kind="stable")
+        team_wins += np.bincount(team_order[:, 0], minlength=n_teams)
+        team_top3 += np.bincount(team_order[:, :3].ravel(), minlength=n_teams)
+    return {
+        "win": wins / sims, "podium": top3 / sims,
+        "team_win": team_wins / sims, "team_podium": team_top3 / sims,
+    }
+
+@app.get("/projection")
+async def projection(sims: int = PROJECTION_SIMS, seed: Optional[int] = None, limit: int = 10):
+    """Title odds from `sims` simulated runs of the races still to come."""
+    await league.sync()
     if not drivers:
-        return PlainTextResponse("No team data.")
-    totals: Dict[str, int] = {}
-    for d in drivers.values():
-        totals[d.team] = totals.get(d.team, 0) + d.points
-    sd = sorted(totals.items(), key=lambda x: x[1], reverse=True)
-    lines = [f"{i+1}. {team} - {pts} pts" for i, (team, pts) in enumerate(sd)]
-    return PlainTextResponse("Team Standings:\n" + "\n".join(lines))
+        return PlainTextResponse("No drivers to project.")
+    if not (1 <= sims <= PROJECTION_MAX_SIMS):
+        raise HTTPException(400, f"sims must be between 1 and {PROJECTION_MAX_SIMS}")
+    # snapshot on the loop; the simulation runs off it in a worker thread
+    grid = sorted(drivers.values(), key=lambda d: d.id)
+    teams = standings.teams()
+    team_index = {t: i for i, t in enumerate(teams)}
+    remaining = sum(1 for r in races.values() if not r.completed)
+    skills = [d.skill for d in grid]
+    points = [d.points for d in grid]
+    podiums = [d.podiums for d in grid]
+    team_of = [team_index[d.team] for d in grid]
+
+    def simulate():
+        import numpy as np
+        t0 = time.perf_counter()
+        odds = _project_season(np.array(skills), np.array(points, dtype=np.int64),
+                               np.array(podiums, dtype=np.int64), np.array(team_of),
+                               len(teams), remaining, sims, seed)
+        return odds, time.perf_counter() - t0
+
+    odds, elapsed = await asyncio.to_thread(simulate)
+    by_win = sorted(range(len(grid)), key=lambda i: (-odds["win"][i], -odds["podium"][i]))
+    team_by_win = sorted(range(len(teams)), key=lambda i: (-odds["team_win"][i], -odds["team_podium"][i]))
+    lines = [f"Title odds: {sims} sims of {remaining} remaining races in {elapsed * 1000:.0f}ms"]
+    lines += [
+        f"{n}. {grid[i].name} - {odds['win'][i]:.1%} title, {odds['podium'][i]:.1%} top 3"
+        for n, i in enumerate(by_win[:limit], start=1)
+    ]
+    lines.append("Teams:")
+    lines += [
+        f"{n}. {teams[i]} - {odds['team_win'][i]:.1%} title, {odds['team_podium'][i]:.1%} top 3"
+        for n, i in enumerate(team_by_win[:limit], start=1)
+    ]
+    return PlainTextResponse("\n".join(lines))
 
 @app.delete("/reset")
 async def reset_league():
+    version = await dbx.write(_reset_league)
     drivers.clear()
     races.clear()
-    global next_driver_id, next_race_id
-    next_driver_id = 1
-    next_race_id = 1
+    standings.clear()
+    league.loaded(version)      # memory now is exactly that version: empty
+    responses.bump(LEAGUE_SCOPE)
     return PlainTextResponse("All data reset. League cleared.")
 
 
@@ -399,6 +2782,33 @@ async def setreward(channel: str, amount: int):
     await set_reward_amount(channel, amount)
     return PlainTextResponse(f"✅ Reward per interval in '{channel}' set to {amount} points.")
 
+# ——— /setinterval —————————————————————————————————————————————
+@app.get("/setinterval")
+async def setinterval(channel: str, seconds: int):
+    if seconds < 10:
+        raise HTTPException(400, "Interval must be at least 10 seconds")
+    await set_reward_interval(channel, seconds)
+    rewards.intervals[channel] = seconds
+    return PlainTextResponse(f"✅ Rewards in '{channel}' now pay out every {seconds}s.")
+
+# ——— /rewards/status ——————————————————————————————————————————
+@app.get("/rewards/status")
+async def rewards_status():
+    if not leader.held:
+        row = await dbx.fetchone("SELECT holder FROM leases WHERE name = ?", (leader.name,))
+        if row is not None:
+            return PlainTextResponse(f"Reward ticks run in another worker ({row[0]}).")
+    if not rewards.stats:
+        return PlainTextResponse("No reward ticks scheduled.")
+    lines = [
+        f"{chan}: every {rewards.intervals.get(chan, REWARD_INTERVAL)}s, {st['ticks']} ticks, "
+        f"last {st['chatters']} chatters in {st['duration'] * 1000:.0f}ms, "
+        f"lag {st['lag'] * 1000:.0f}ms (max {st['max_lag'] * 1000:.0f}ms), "
+        f"{st['overruns']} overruns, {st['errors']} errors"
+        for chan, st in sorted(rewards.stats.items())
+    ]
+    return PlainTextResponse("Reward ticks:\n" + "\n".join(lines))
+
 # ——— /setpoints ———————————————————————————————————————————————
 @app.get("/setpoints")
 async def setpoints(channel: str, name: str):
@@ -417,21 +2827,21 @@ async def rob(robber: str, victim: str, channel: str = DEFAULT_CHANNEL):
     # cleanup usernames
     r = robber.lstrip("@").strip()
     v = victim.lstrip("@").strip()
-    name = get_points_name(channel)
+    name = await get_points_name(channel)
 
     if r.lower() == v.lower():
         raise HTTPException(400, "❌ You can't rob yourself!")
 
-    allowed, wait = can_rob(channel, r, v)
-    if not allowed:
-        return PlainTextResponse(f"⏳ You must wait {wait}s before robbing {v} again.")
+    def steal_amount(vic_pts: int) -> int:
+        # decide amount to steal (10–50% of their balance)
+        return random.randint(max(1, vic_pts // 10), max(1, vic_pts // 2))
 
-    vic_pts = get_points_table(v, channel)
-    if vic_pts <= 0:
+    status, value = await rob_transfer(channel, r, v, steal_amount)
+    if status == "cooldown":
+        return PlainTextResponse(f"⏳ You must wait {value}s before robbing {v} again.")
+    if status == "empty":
         return PlainTextResponse(f"❌ {v} has no {name} to steal.")
-
-    # decide amount to steal (10–50% of their balance)
-    amount = random.randint(max(1, vic_pts // 10), max(1, vic_pts // 2))
+    amount = value
 
     # define fun scenarios
     scenarios = [
@@ -448,18 +2858,13 @@ async def rob(robber: str, victim: str, channel: str = DEFAULT_CHANNEL):
     ]
     message = random.choice(scenarios)
 
-    # apply the robbery
-    await add_user_points(r, channel, amount)
-    await add_user_points(v, channel, -amount)
-    await update_rob_timestamp(channel, r, v)
-
     return PlainTextResponse(f"💰 {message}")
 
 # ——— /points ————————————————————————————————————————————————
 @app.get("/points")
 async def points(user: str, channel: str = DEFAULT_CHANNEL):
-    pts  = get_points_table(user, channel)
-    name = get_points_name(channel)
+    pts  = await get_points_table(user, channel)
+    name = await get_points_name(channel)
     return PlainTextResponse(f"{user}, you have {pts} {name} in '{channel}'.")
 
 # ——— /add ————————————————————————————————————————————————
@@ -469,8 +2874,8 @@ async def add_points(user: str, amount: int, channel: str = DEFAULT_CHANNEL):
     if amount <= 0:
         raise HTTPException(400, "Amount must be positive")
     await add_user_points(clean_user, channel, amount)
-    pts  = get_points_table(clean_user, channel)
-    name = get_points_name(channel)
+    pts  = await get_points_table(clean_user, channel)
+    name = await get_points_name(channel)
     return PlainTextResponse(f"✅ {clean_user} now has {pts} {name}.")
 
 # ——— /addall —————————————————————————————————————————————
@@ -481,240 +2886,443 @@ async def addall(amount: int, channel: str = DEFAULT_CHANNEL):
     chatters = await fetch_chatters_irc(channel)
     if channel not in chatters:
         chatters.add(channel)
-    for u in chatters:
-        await add_user_points(u, channel, amount)
-    name  = get_points_name(channel)
+    await bulk_add_points(chatters, channel, amount)
+    name  = await get_points_name(channel)
     count = len(chatters)
     return PlainTextResponse(f"✅ Awarded {amount} {name} to {count} chatters in '{channel}'.")
 
 @app.get("/leaderboard")
-async def leaderboard(limit: int = 10, channel: str = DEFAULT_CHANNEL):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute(
-        "SELECT username, points FROM users WHERE channel = ? ORDER BY points DESC LIMIT ?",
-        (channel, limit)
-    )
-    rows = c.fetchall()
-    conn.close()
+async def leaderboard(request: Request, limit: int = 10, channel: str = DEFAULT_CHANNEL):
+    async def build():
+        rows = await leaderboards.top(channel, limit)
+
+        if not rows:
+            return PlainTextResponse(f"No points yet in '{channel}'.")
+
+        # simple "user - points" pairs, separated by " | "
+        entries = [f"{u} - {p}" for u, p in rows]
+        line = " | ".join(entries)
+
+        return PlainTextResponse("🏆 Leaderboard 🏆 " + line)
 
-    if not rows:
-        return PlainTextResponse(f"No points yet in '{channel}'.")
+    return await responses.serve(request, channel_scope(channel), build)
 
-    # simple "user - points" pairs, separated by " | "
-    entries = [f"{u} - {p}" for u, p in rows]
-    line = " | ".join(entries)
 
-    return PlainTextResponse("🏆 Leaderboard 🏆 " + line)
+@app.get("/rank")
+async def rank(user: str, channel: str = DEFAULT_CHANNEL):
+    clean_user = user.lstrip("@").strip()
+    name = await get_points_name(channel)
+    await leaderboards.top(channel, 1)      # make sure the channel's view is seeded
+    found = leaderboards.rank(channel, clean_user)
+    if found is None:
+        pts = await get_points_table(clean_user, channel)
+        if pts <= 0:
+            return PlainTextResponse(f"{clean_user} has no {name} in '{channel}' yet.")
+        # counting the entries above the user in users_by_points stays in the index
+        if ledger is not None:
+            await ledger.flush()
+        above = await dbx.fetchone(
+            "SELECT COUNT(*) FROM users WHERE channel = ? AND points > ?", (channel, pts)
+        )
+        found = above[0] + 1, pts
+    position, pts = found
+    return PlainTextResponse(f"🏅 {clean_user} is #{position} in '{channel}' with {pts} {name}.")
 
 
 # ——— /gamble ———————————————————————————————————————————————————
-def parse_wager(wager_str: str, current: int) -> int:
+def parse_wager(wager_str: str, current: int, error: str = "Invalid wager") -> int:
     if wager_str.lower() == "all":
         return current
     try:
         return int(wager_str)
     except:
-        raise HTTPException(400, "Invalid wager")
+        raise HTTPException(400, error)
+
+# ——— Game tables ——————————————————————————————————————————————————
+# Every game is a payout table: outcomes with a probability (any positive
+# weight; tables are normalised), a multiplier and a message template. Tables
+# compile once into alias tables, so picking a game and its outcome costs a
+# single random() draw however many outcomes there are.
+class AliasTable:
+    """Vose's alias method: O(n) to build, O(1) to sample from one uniform draw."""
+    __slots__ = ("prob", "alias")
+
+    def __init__(self, weights: List[float]):
+        n     = len(weights)
+        total = math.fsum(weights)
+        if not n or total <= 0 or any(w < 0 for w in weights):
+            raise ValueError("alias table needs non-negative weights with a positive sum")
+        scaled = [w * n / total for w in weights]
+        prob   = [1.0] * n
+        alias  = list(range(n))
+        small  = [i for i, p in enumerate(scaled) if p < 1.0]
+        large  = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            prob[s], alias[s] = scaled[s], l
+            scaled[l] += scaled[s] - 1.0
+            (small if scaled[l] < 1.0 else large).append(l)
+        # whatever is left is 1.0 up to rounding and keeps its own column
+        self.prob, self.alias = prob, alias
+
+    def sample(self, r: float) -> int:
+        """Map a uniform r in [0, 1) to an index: the integer part picks a
+        column, the fraction decides between it and its alias."""
+        u = r * len(self.prob)
+        i = min(int(u), len(self.prob) - 1)
+        return i if u - i < self.prob[i] else self.alias[i]
+
+@dataclass(slots=True)
+class GameTable:
+    name: str
+    weight: float             # share of /gamble picks; 0 keeps a game out of the mix
+    multipliers: List[float]
+    messages: List[str]
+    probs: List[float]        # normalised
+    alias: AliasTable
+
+    def play(self) -> tuple:
+        i = self.alias.sample(random.random())
+        return self.multipliers[i], self.messages[i]
+
+    def rtp(self) -> float:
+        return math.fsum(p * m for p, m in zip(self.probs, self.multipliers))
 
-def play_dice(amount: int):
+def compile_game(name: str, outcomes: List[dict], weight: float = 0) -> GameTable:
     """
-    Dice (6-sided):
-      • Roll a single d6.
-      • Payouts:
-          – Roll =   6 → ×5 (≈16.7% chance)  
-          – Roll = 4-5 → ×2 (≈33.3% chance)  
-          – Roll ≤3  → lose (≈50% chance)
+    Build a GameTable from declarative outcomes:
+    {"p": weight, "multiplier": x, "message": template, "vars": {...}}.
+    Templates are formatted with their vars here, once.
     """
-    roll = random.randint(1, 6)
-    if roll == 6:
-        return 5, f"🎲 You rolled a 6! Fortune smiles. Payout ×5."
-    if roll >= 4:
-        return 2, f"🎲 You rolled a {roll}. You double up! ×2 reward."
-    return 0, f"🎲 You rolled a {roll}… nothing this time. You lose."
+    if weight < 0:
+        raise ValueError(f"game {name!r}: weight must be non-negative")
+    try:
+        ps       = [float(o["p"]) for o in outcomes]
+        muls     = [o["multiplier"] for o in outcomes]
+        messages = [o.get("message", "").format(**o.get("vars", {})) for o in outcomes]
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"game {name!r}: bad outcome ({e!r})") from None
+    if any(m < 0 for m in muls):
+        raise ValueError(f"game {name!r}: multipliers must be non-negative")
+    total = math.fsum(ps)
+    return GameTable(name, weight, muls, messages, [p / total for p in ps], AliasTable(ps))
+
+class GameRegistry:
+    """Games by name, plus one alias table over every (game, outcome) pair in
+    the /gamble mix so a round is a single draw."""
+    def __init__(self):
+        self.games: Dict[str, GameTable] = {}
+        self._mix: Optional[tuple] = None
+
+    def register(self, name: str, outcomes: List[dict], weight: float = 0) -> GameTable:
+        self.games[name] = game = compile_game(name, outcomes, weight)
+        self._mix = None
+        return game
+
+    def get(self, name: str) -> GameTable:
+        return self.games[name]
+
+    def mixed(self) -> List[GameTable]:
+        return [g for g in self.games.values() if g.weight > 0]
+
+    def _compile_mix(self) -> tuple:
+        entries, weights = [], []
+        mix   = self.mixed()
+        total = math.fsum(g.weight for g in mix)
+        for g in mix:
+            for i, p in enumerate(g.probs):
+                entries.append((g, i))
+                weights.append(g.weight / total * p)
+        self._mix = (entries, AliasTable(weights))
+        return self._mix
+
+    def mix(self) -> tuple:
+        """The compiled /gamble mix: ((game, outcome index) entries, AliasTable)."""
+        return self._mix or self._compile_mix()
+
+    def pick(self) -> tuple:
+        """One /gamble round: (game, multiplier, message)."""
+        entries, table = self.mix()
+        g, i = entries[table.sample(random.random())]
+        return g, g.multipliers[i], g.messages[i]
+
+    def load(self, path: str):
+        """Register games from a JSON list of {"name", "weight", "outcomes"}."""
+        with open(path, encoding="utf-8") as f:
+            specs = json.load(f)
+        for spec in specs:
+            self.register(spec["name"], spec["outcomes"], spec.get("weight", 0))
+
+def _outcome(p: float, multiplier: float, message: str, **fields) -> dict:
+    return {"p": p, "multiplier": multiplier, "message": message, "vars": fields}
+
+def _dice_table() -> List[dict]:
+    """Dice (d6): 6 → ×5, 4-5 → ×2, ≤3 → lose."""
+    return [
+        _outcome(1/6, 5, "🎲 You rolled a 6! Fortune smiles. Payout ×5.") if roll == 6 else
+        _outcome(1/6, 2, "🎲 You rolled a {roll}. You double up! ×2 reward.", roll=roll) if roll >= 4 else
+        _outcome(1/6, 0, "🎲 You rolled a {roll}… nothing this time. You lose.", roll=roll)
+        for roll in range(1, 7)
+    ]
 
-def play_slot(amount: int):
+def _slot_table() -> List[dict]:
     """
-    3-Reel Classic Slot:
-      • Symbols: 🍒 ×3, 🍋, 🔔, ⭐, BAR  
-      • Hit any “BAR” = instant loss.  
-      • 2×🍒 = ×3, 3×🍒 = ×10, mixed (no BAR) = push ×1  
+    3-reel classic slot over 🍒 ×3, 🍋, 🔔, ⭐, BAR: any BAR loses,
+    3×🍒 → ×10, 2×🍒 → ×3, anything else pushes. One outcome per spin.
     """
     symbols = ["🍒", "🍒", "🍒", "🍋", "🔔", "⭐", "BAR"]
-    spin = [random.choice(symbols) for _ in range(3)]
-    display = " ".join(spin)
-    if "BAR" in spin:
-        return 0, f"🎰 {display} → BAR appears. House takes it all."
-    cherries = spin.count("🍒")
-    if cherries == 3:
-        return 10, f"🎰 {display} → TRIPLE CHERRIES! JACKPOT ×10!"
-    if cherries == 2:
-        return 3, f"🎰 {display} → Double cherries! Nice ×3."
-    return 1, f"🎰 {display} → Mixed symbols. You push (×1)."
-
-def play_texas(amount: int):
-    """
-    Simplified Texas Hold’em Draw:
-      • 15% → straight/flush → ×5  
-      • 20% → any pair → ×2  
-      • 65% → nothing → lose  
-    """
-    r = random.random()
-    if r < 0.15:
-        return 5, "🃏 Flop gives you a straight or flush! Huge ×5 win!"
-    if r < 0.35:
-        return 2, "🃏 You paired up on the flop! Double ×2 payout."
-    return 0, "🃏 Your flop misses. House wins."
-
-def play_roulette(amount: int):
-    """
-    European Roulette (single zero):
-      • Numbers 0–36; zero = house wins color bets  
-      • Color win ≈48.6% → ×2; straight ≈2.7% → ×36  
-    """
-    pocket = random.randint(0, 36)
-    if pocket == 0:
-        return 0, "🎡 Ball lands on 0. House sweeps your bet."
-    if random.random() < 1/37:
-        return 36, f"🎡 Unbelievable! Exact hit {pocket} → ×36 jackpot!"
-    color = "red" if pocket % 2 else "black"
-    if random.random() < 18/37:
-        return 2, f"🎡 Ball on {pocket} {color}. You win color bet ×2!"
-    return 0, f"🎡 Ball on {pocket} {color}. You lose."
-
-def play_blackjack(amount: int):
-    """
-    Mini‐Blackjack:
-      • 5% natural pays ×2.5; 25% beat dealer pays ×2; else lose  
-    """
-    r = random.random()
-    if r < 0.05:
-        return 2.5, "🂡 Blackjack! You get paid 3:2 (×2.5)."
-    if r < 0.30:
-        return 2, "🂱 You beat the dealer’s 20. Double up!"
-    return 0, "🂲 Dealer’s hand wins. You lose."
-
-def play_baccarat(amount: int):
-    """
-    Banker Bet Baccarat:
-      • Tie ≈9.6% → push (×1)  
-      • Banker win ≈45.8% → ×1.95 (5% commission)  
-      • Else lose  
-    """
-    r = random.random()
-    if r < 0.096:
-        return 1, "🎴 It’s a tie. Push — your wager is returned."
-    if r < 0.554:
-        return 1.95, "🎴 Banker hand wins. You net ×1.95."
-    return 0, "🎴 Player hand wins. You lose."
-
-def play_craps(amount: int):
-    """
-    Pass Line Bet:
-      • 7 or 11 (≈22.2%) → ×2.5; 2,3,12 (≈11.1%) → lose; else push ×1  
-    """
-    total = random.randint(1,6) + random.randint(1,6)
-    if total in (7, 11):
-        return 2.5, f"🎲 You rolled {total} on come‐out. Win ×2.5!"
-    if total in (2, 3, 12):
-        return 0, f"🎲 Craps! You rolled {total}. House wins."
-    return 1, f"🎲 Rolled {total}. Point established — push."
-
-def play_keno(amount: int):
-    """
-    Keno (pick 3):
-      • Hit 3 → ×40; Hit 2 → ×5; Hit 1 → push; Hit 0 → lose  
-    """
-    hits = sum(random.random() < 3/80 for _ in range(3))
-    if hits == 3:
-        return 40, "🔢 All 3 numbers! Rare ×40 Keno jackpot!"
-    if hits == 2:
-        return 5, "🔢 2 hits! You win ×5."
-    if hits == 1:
-        return 1, "🔢 Single hit. You push (×1)."
-    return 0, "🔢 No hits. You lose."
-
-def play_video_poker(amount: int):
-    """
-    Video Poker (Jacks or Better):
-      • Royal Flush → ×800; Straight Flush → ×50; Four Kind → ×25; etc.  
-    """
-    r = random.random()
-    if r < 0.00003:
-        return 800, "🎮 Royal Flush! Mythic ×800 payout!"
-    if r < 0.00013:
-        return 50, "🎮 Straight Flush! ×50 win!"
-    if r < 0.00033:
-        return 25, "🎮 Four of a Kind! ×25 payout!"
-    if r < 0.00133:
-        return 9, "🎮 Full House! ×9 reward!"
-    if r < 0.00333:
-        return 6, "🎮 Flush! ×6 payout!"
-    if r < 0.00733:
-        return 4, "🎮 Straight! ×4 payout!"
-    if r < 0.03033:
-        return 3, "🎮 Three of a Kind! ×3 win!"
-    if r < 0.07833:
-        return 2, "🎮 Two Pair! ×2 payoff!"
-    if r < 0.14833:
-        return 1, "🎮 Pair of Jacks or better. Push (×1)."
-    return 0, "🎮 No winning combination. You lose."
-
-def play_hi_lo(amount: int):
-    """
-    High-Low Card:
-      • Draw 1–13: >7 wins ×2; else lose  
-    """
-    card = random.randint(1, 13)
-    if card > 7:
-        return 2, f"🃏 You drew {card} (>7). You double up!"
-    return 0, f"🃏 You drew {card}. Too low. You lose."
-
-# ───────────────────────────────────────────────────────────────────────────────
-# Assemble and weight the games
-GAMES = [
-    (play_dice,        10, "Dice"),
-    (play_slot,        10, "Slot Machine"),
-    (play_texas,       10, "Texas Hold'em"),
-    (play_roulette,    15, "Roulette"),
-    (play_blackjack,   15, "Blackjack"),
-    (play_baccarat,    10, "Baccarat"),
-    (play_craps,       10, "Craps"),
-    (play_keno,         5, "Keno"),
-    (play_video_poker, 10, "Video Poker"),
-    (play_hi_lo,        5, "High-Low Card"),
-]
-
-@app.get("/gamble")
-async def gamble(user: str, wager: str, channel: str = DEFAULT_CHANNEL):
-    # 1) Balance check
-    current = get_points_table(user, channel)
-    if current <= 0:
-        return PlainTextResponse(f"❌ {user}, you have no {get_points_name(channel)}!")
-    # 2) Parse & validate wager
-    amount = parse_wager(wager, current)
-    if amount <= 0:
-        raise HTTPException(400, "Wager must be positive")
-    if amount > current:
-        return PlainTextResponse(f"❌ {user}, you only have {current} {get_points_name(channel)}!")
-    await add_user_points(user, channel, -amount)
+    spins   = Counter(" ".join(s) for s in product(symbols, repeat=3))
+    table   = []
+    for display, n in spins.items():
+        p = n / len(symbols) ** 3
+        cherries = display.split().count("🍒")
+        if "BAR" in display:
+            table.append(_outcome(p, 0, "🎰 {display} → BAR appears. House takes it all.", display=display))
+        elif cherries == 3:
+            table.append(_outcome(p, 10, "🎰 {display} → TRIPLE CHERRIES! JACKPOT ×10!", display=display))
+        elif cherries == 2:
+            table.append(_outcome(p, 3, "🎰 {display} → Double cherries! Nice ×3.", display=display))
+        else:
+            table.append(_outcome(p, 1, "🎰 {display} → Mixed symbols. You push (×1).", display=display))
+    return table
+
+def _roulette_table() -> List[dict]:
+    """
+    European roulette as played here: 0 loses; otherwise a 1/37 straight
+    hit pays ×36, else the colour bet wins ×2 with chance 18/37.
+    """
+    table = [_outcome(1/37, 0, "🎡 Ball lands on 0. House sweeps your bet.")]
+    for pocket in range(1, 37):
+        color = "red" if pocket % 2 else "black"
+        table += [
+            _outcome(1/37 * 1/37, 36, "🎡 Unbelievable! Exact hit {pocket} → ×36 jackpot!", pocket=pocket),
+            _outcome(1/37 * 36/37 * 18/37, 2, "🎡 Ball on {pocket} {color}. You win color bet ×2!",
+                     pocket=pocket, color=color),
+            _outcome(1/37 * 36/37 * 19/37, 0, "🎡 Ball on {pocket} {color}. You lose.",
+                     pocket=pocket, color=color),
+        ]
+    return table
+
+def _craps_table() -> List[dict]:
+    """Pass line come-out: 7/11 → ×2.5, 2/3/12 → lose, else push."""
+    table = []
+    for total in range(2, 13):
+        p = (6 - abs(total - 7)) / 36
+        if total in (7, 11):
+            table.append(_outcome(p, 2.5, "🎲 You rolled {total} on come‐out. Win ×2.5!", total=total))
+        elif total in (2, 3, 12):
+            table.append(_outcome(p, 0, "🎲 Craps! You rolled {total}. House wins.", total=total))
+        else:
+            table.append(_outcome(p, 1, "🎲 Rolled {total}. Point established — push.", total=total))
+    return table
+
+def _keno_table() -> List[dict]:
+    """Keno, pick 3, each hitting with 3/80: 3 → ×40, 2 → ×5, 1 → push, 0 → lose."""
+    hit = 3 / 80
+    p   = [math.comb(3, k) * hit ** k * (1 - hit) ** (3 - k) for k in range(4)]
+    return [
+        _outcome(p[3], 40, "🔢 All 3 numbers! Rare ×40 Keno jackpot!"),
+        _outcome(p[2], 5, "🔢 2 hits! You win ×5."),
+        _outcome(p[1], 1, "🔢 Single hit. You push (×1)."),
+        _outcome(p[0], 0, "🔢 No hits. You lose."),
+    ]
 
-    # 3) Choose game
-    funcs, weights, names = zip(*GAMES)
-    idx = random.choices(range(len(GAMES)), weights=weights, k=1)[0]
-    game_fn, game_name = funcs[idx], names[idx]
+def _hi_lo_table() -> List[dict]:
+    """High-low: draw 1-13, over 7 doubles."""
+    return [
+        _outcome(1/13, 2, "🃏 You drew {card} (>7). You double up!", card=card) if card > 7 else
+        _outcome(1/13, 0, "🃏 You drew {card}. Too low. You lose.", card=card)
+        for card in range(1, 14)
+    ]
 
-    # 4) Play
-    mul, detail = game_fn(amount)
-    payout = int(amount * mul)
+# name → (weight in the /gamble mix, outcomes)
+BUILTIN_GAMES = {
+    "Dice":         (10, _dice_table()),
+    "Slot Machine": (10, _slot_table()),
+    "Texas Hold'em": (10, [
+        _outcome(0.15, 5, "🃏 Flop gives you a straight or flush! Huge ×5 win!"),
+        _outcome(0.20, 2, "🃏 You paired up on the flop! Double ×2 payout."),
+        _outcome(0.65, 0, "🃏 Your flop misses. House wins."),
+    ]),
+    "Roulette":     (15, _roulette_table()),
+    "Blackjack":    (15, [
+        _outcome(0.05, 2.5, "🂡 Blackjack! You get paid 3:2 (×2.5)."),
+        _outcome(0.25, 2, "🂱 You beat the dealer’s 20. Double up!"),
+        _outcome(0.70, 0, "🂲 Dealer’s hand wins. You lose."),
+    ]),
+    "Baccarat":     (10, [
+        _outcome(0.096, 1, "🎴 It’s a tie. Push — your wager is returned."),
+        _outcome(0.458, 1.95, "🎴 Banker hand wins. You net ×1.95."),
+        _outcome(0.446, 0, "🎴 Player hand wins. You lose."),
+    ]),
+    "Craps":        (10, _craps_table()),
+    "Keno":         (5, _keno_table()),
+    "Video Poker":  (10, [
+        _outcome(0.00003, 800, "🎮 Royal Flush! Mythic ×800 payout!"),
+        _outcome(0.00010, 50, "🎮 Straight Flush! ×50 win!"),
+        _outcome(0.00020, 25, "🎮 Four of a Kind! ×25 payout!"),
+        _outcome(0.00100, 9, "🎮 Full House! ×9 reward!"),
+        _outcome(0.00200, 6, "🎮 Flush! ×6 payout!"),
+        _outcome(0.00400, 4, "🎮 Straight! ×4 payout!"),
+        _outcome(0.02300, 3, "🎮 Three of a Kind! ×3 win!"),
+        _outcome(0.04800, 2, "🎮 Two Pair! ×2 payoff!"),
+        _outcome(0.07000, 1, "🎮 Pair of Jacks or better. Push (×1)."),
+        _outcome(0.85167, 0, "🎮 No winning combination. You lose."),
+    ]),
+    "High-Low Card": (5, _hi_lo_table()),
+    # /slots' own multiplier wheel; outside the /gamble mix
+    "Slots":        (0, [_outcome(w, m, "") for m, w in zip([0, 1, 2, 5, 10, 20], [50, 20, 15, 10, 4, 1])]),
+}
+
+games = GameRegistry()
+for _name, (_weight, _outcomes) in BUILTIN_GAMES.items():
+    games.register(_name, _outcomes, _weight)
+if GAMES_FILE:
+    games.load(GAMES_FILE)
+
+# ——— Game audit ————————————————————————————————————————————————————
+# Return-to-player checks for the payout tables: the exact figure straight
+# from a table, and a NumPy Monte Carlo through the same alias sampling the
+# games use. Payouts truncate like settle_wager does (int(wager * mul)), so
+# small wagers are audited at the RTP players actually get.
+def table_arrays(table, multipliers: List[float], wager: int):
+    """Alias columns plus per-outcome return (payout / wager) as NumPy arrays."""
+    import numpy as np
+    returns = np.array([int(wager * m) for m in multipliers], dtype=np.float64) / wager
+    return np.array(table.prob), np.array(table.alias), returns
+
+def sample_returns(rng, prob, alias, returns, n: int):
+    """n independent rounds: one uniform each, resolved through the alias table."""
+    import numpy as np
+    u   = rng.random(n) * len(prob)
+    col = np.minimum(u.astype(np.int64), len(prob) - 1)
+    idx = np.where(u - col < prob[col], col, alias[col])
+    return returns[idx]
+
+def audit_table(table, multipliers: List[float], probs: List[float], rounds: int,
+                wager: int = 100, seed=None) -> dict:
+    """
+    Exact and simulated RTP, per-round variance and a 95% CI for the simulated
+    RTP. `seed` is anything np.random.default_rng takes (an int, a SeedSequence).
+    """
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    prob, alias, returns = table_arrays(table, multipliers, wager)
+    exact    = math.fsum(p * r for p, r in zip(probs, returns))
+    variance = math.fsum(p * (r - exact) ** 2 for p, r in zip(probs, returns))
+    total = total_sq = 0.0
+    for start in range(0, rounds, 1_000_000):
+        r = sample_returns(rng, prob, alias, returns, min(1_000_000, rounds - start))
+        total    += float(r.sum())
+        total_sq += float(np.dot(r, r))
+    rtp = total / rounds
+    var = max(total_sq / rounds - rtp * rtp, 0.0)
+    half = 1.96 * math.sqrt(var / rounds)
+    return {
+        "rounds": rounds, "wager": wager,
+        "exact_rtp": exact, "exact_variance": variance,
+        "rtp": rtp, "variance": var, "ci95": [rtp - half, rtp + half],
+        "house_edge": 1 - exact,
+    }
+
+def audit_games(rounds: int, wager: int = 100, seed: Optional[int] = None) -> Dict[str, dict]:
+    """Audit every registered game, plus the /gamble mix as a whole."""
+    import numpy as np
+    # one independent child stream per table, so their estimates aren't
+    # correlated, all still reproducible from `seed`
+    streams = iter(np.random.SeedSequence(seed).spawn(len(games.games) + 1))
+    report = {
+        name: audit_table(g.alias, g.multipliers, g.probs, rounds, wager, next(streams))
+        for name, g in games.games.items()
+    }
+    entries, table = games.mix()
+    weights = [g.weight for g in games.mixed()]
+    total   = math.fsum(weights)
+    probs   = [g.weight / total * g.probs[i] for g, i in entries]
+    report["/gamble mix"] = audit_table(table, [g.multipliers[i] for g, i in entries], probs,
+                                        rounds, wager, next(streams))
+    return report
+
+def simulate_economy(balances: List[int], rounds: int, wager: int = 100,
+                     seed: Optional[int] = None) -> dict:
+    """
+    Every holder plays `rounds` /gamble rounds at `wager` (or whatever they
+    have left); reports how the channel's total supply drifts and how many
+    go broke.
+    """
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    entries, table = games.mix()
+    prob, alias = np.array(table.prob), np.array(table.alias)
+    muls = np.array([g.multipliers[i] for g, i in entries], dtype=np.float64)
+    bal  = np.array(balances, dtype=np.int64)
+    start_total = int(bal.sum())
+    for _ in range(rounds):
+        bet = np.minimum(bal, wager)
+        mul = sample_returns(rng, prob, alias, muls, len(bal))
+        bal += (bet * mul).astype(np.int64) - bet
+    end_total = int(bal.sum())
+    return {
+        "holders": len(bal), "rounds": rounds, "wager": wager,
+        "start_total": start_total, "end_total": end_total,
+        "drift": (end_total - start_total) / start_total if start_total else 0.0,
+        "broke": int((bal == 0).sum()),
+        "median_balance": float(np.median(bal)) if len(bal) else 0.0,
+    }
+
+def format_audit(report: Dict[str, dict]) -> List[str]:
+    return [
+        f"{name}: RTP {a['rtp']:.4f} (exact {a['exact_rtp']:.4f}, 95% CI {a['ci95'][0]:.4f}-{a['ci95'][1]:.4f}), "
+        f"sd {math.sqrt(a['variance']):.3f}, edge {a['house_edge']:+.2%}"
+        for name, a in report.items()
+    ]
 
-    # 5) Payout if win/push
-    if payout > 0:
-        await add_user_points(user, channel, payout)
+@app.get("/admin/audit")
+async def admin_audit(token: Optional[str] = None, rounds: int = 1_000_000, wager: int = 100,
+                      seed: Optional[int] = None, channel: Optional[str] = None, economy_rounds: int = 100):
+    """RTP of every game; with `channel`, also that channel's balances gambled forward."""
+    require_admin(token)
+    if not (1 <= rounds <= AUDIT_MAX_ROUNDS) or wager < 1 or not (0 <= economy_rounds <= 10_000):
+        raise HTTPException(400, f"rounds must be 1-{AUDIT_MAX_ROUNDS}, wager positive, economy_rounds 0-10000")
+    balances = None
+    if channel:
+        if ledger is not None:
+            await ledger.flush()
+        balances = [pts for pts, in await dbx.fetchall("SELECT points FROM users WHERE channel = ?", (channel,))]
+
+    def run():
+        t0 = time.perf_counter()
+        report  = audit_games(rounds, wager, seed)
+        economy = simulate_economy(balances, economy_rounds, wager, seed) if balances else None
+        return report, economy, time.perf_counter() - t0
+
+    report, economy, elapsed = await asyncio.to_thread(run)
+    lines = [f"Audit: {rounds} rounds per game at wager {wager} in {elapsed:.1f}s"] + format_audit(report)
+    if economy:
+        lines.append(
+            f"{channel} economy: {economy['holders']} holders x {economy_rounds} rounds, "
+            f"supply {economy['start_total']} -> {economy['end_total']} ({economy['drift']:+.1%}), "
+            f"{economy['broke']} broke, median {economy['median_balance']:.0f}"
+        )
+    return PlainTextResponse("\n".join(lines))
 
-    # 6) Build response (no asterisks)
-    final = get_points_table(user, channel)
-    pname = get_points_name(channel)
+@app.get("/gamble")
+async def gamble(user: str, wager: str, channel: str = DEFAULT_CHANNEL):
+    def play(amount: int):
+        # game and outcome come from one draw over the compiled mix
+        game, mul, detail = games.pick()
+        return int(amount * mul), (game.name, mul, detail)
+
+    # balance check, wager validation, debit and payout in one settlement
+    status, final, amount, payout, outcome = await settle_wager(user, channel, wager, play)
+    pname = await get_points_name(channel)
+    refused = wager_refusal(status, user, final, pname)
+    if refused:
+        return refused
+
+    # build response (no asterisks)
+    game_name, mul, detail = outcome
+    record_game(game_name, amount, payout)
     emoji = "🎉" if mul > 1 else ("😐" if mul == 1 else "💀")
     msg = (
         f"{emoji} {user} played {game_name} for {amount} {pname}.\n"
@@ -727,37 +3335,32 @@ async def gamble(user: str, wager: str, channel: str = DEFAULT_CHANNEL):
 # ——— /slots ————————————————————————————————————————————————————
 @app.get("/slots")
 async def slots(user: str, wager: str, channel: str = DEFAULT_CHANNEL):
-    current = get_points_table(user, channel)
-    if current <= 0:
-        return PlainTextResponse(f"❌ {user}, you have no {get_points_name(channel)}!")
-    amount  = parse_wager(wager, current)
-    if amount <= 0:
-        raise HTTPException(400, "Wager must be positive")
-    if amount > current:
-        return PlainTextResponse(f"❌ {user}, you only have {current} {get_points_name(channel)}!")
-    await add_user_points(user, channel, -amount)
-
     symbols = ["🍒","🍋","🔔","🍉","⭐","🍀"]
-    reels   = [random.choice(symbols) for _ in range(3)]
-    await asyncio.sleep(1)
+    table   = games.get("Slots")
+
+    def play(amount: int):
+        mul, _ = table.play()
+        return int(amount * mul), mul
 
-    multipliers = [0, 1, 2, 5, 10, 20]
-    weights     = [50, 20, 15, 10, 4, 1]
-    mul         = random.choices(multipliers, weights=weights, k=1)[0]
-    payout      = amount * mul
+    status, final, amount, payout, mul = await settle_wager(user, channel, wager, play)
+    name    = await get_points_name(channel)
+    refused = wager_refusal(status, user, final, name)
+    if refused:
+        return refused
+
+    record_game(table.name, amount, payout)
+    reels = [random.choice(symbols) for _ in range(3)]
+    await asyncio.sleep(1)
 
     if payout > 0:
-        await add_user_points(user, channel, payout)
         result = (
             "😐 You got your wager back (×1)."
             if mul == 1 else
-            f"🎉 You hit a ×{mul} multiplier and won {payout} {get_points_name(channel)}!"
+            f"🎉 You hit a ×{mul} multiplier and won {payout} {name}!"
         )
     else:
         result = f"💔 No win this time. You lost your wager of {amount}."
 
-    final = get_points_table(user, channel)
-    name  = get_points_name(channel)
     return PlainTextResponse(
         f"🎰 {' | '.join(reels)} 🎰\n"
         f"{result}\n"
@@ -767,24 +3370,6 @@ async def slots(user: str, wager: str, channel: str = DEFAULT_CHANNEL):
 # ——— /blackjack —————————————————————————————————————————————————
 @app.get("/blackjack")
 async def blackjack(user: str, wager: str, channel: str = DEFAULT_CHANNEL):
-    current = get_points_table(user, channel)
-    if current <= 0:
-        return PlainTextResponse(f"❌ {user}, you have no {get_points_name(channel)}!")
-    if wager.lower() == "all":
-        wager_amount = current
-    else:
-        try:
-            wager_amount = int(wager)
-        except ValueError:
-            raise HTTPException(400, "Wager must be a number or 'all'")
-
-    if wager_amount <= 0:
-        raise HTTPException(400, "Wager must be positive")
-    if wager_amount > current:
-        return PlainTextResponse(f"❌ {user}, you only have {current} {get_points_name(channel)}!")
-
-    await add_user_points(user, channel, -wager_amount)
-
     def draw_card():
         cards = [2,3,4,5,6,7,8,9,10,10,10,10,11]
         return random.choice(cards)
@@ -796,33 +3381,50 @@ async def blackjack(user: str, wager: str, channel: str = DEFAULT_CHANNEL):
             total = sum(hand)
         return total
 
-    player = [draw_card(), draw_card()]
-    dealer = [draw_card(), draw_card()]
-    player_total = best_total(player)
-    dealer_total = best_total(dealer)
-
-    while player_total < 17:
-        player.append(draw_card())
+    def play(wager_amount: int):
+        player = [draw_card(), draw_card()]
+        dealer = [draw_card(), draw_card()]
         player_total = best_total(player)
-    while dealer_total < 17:
-        dealer.append(draw_card())
         dealer_total = best_total(dealer)
 
+        while player_total < 17:
+            player.append(draw_card())
+            player_total = best_total(player)
+        while dealer_total < 17:
+            dealer.append(draw_card())
+            dealer_total = best_total(dealer)
+
+        if player_total > 21:
+            payout = 0
+        elif dealer_total > 21 or player_total > dealer_total:
+            payout = wager_amount * 2
+        elif player_total == dealer_total:
+            payout = wager_amount
+        else:
+            payout = 0
+        return payout, (player, dealer, player_total, dealer_total)
+
+    # validate the wager up front so a bad one keeps its own error message
+    if wager.lower() != "all":
+        parse_wager(wager, 0, "Wager must be a number or 'all'")
+
+    status, final, wager_amount, payout, hands = await settle_wager(user, channel, wager, play)
+    name    = await get_points_name(channel)
+    refused = wager_refusal(status, user, final, name)
+    if refused:
+        return refused
+    record_game("Blackjack (dealt)", wager_amount, payout)
+
+    player, dealer, player_total, dealer_total = hands
     if player_total > 21:
         result = f"💥 {user} busted with {player_total}!"
     elif dealer_total > 21 or player_total > dealer_total:
-        payout = wager_amount * 2
-        await add_user_points(user, channel, payout)
         result = f"🎉 {user} wins! {player_total} vs {dealer_total}. Payout: {payout}."
     elif player_total == dealer_total:
-        payout = wager_amount
-        await add_user_points(user, channel, payout)
         result = f"😐 Push. Both had {player_total}. Wager returned."
     else:
         result = f"💀 Dealer wins. {player_total} vs {dealer_total}."
 
-    name = get_points_name(channel)
-    final = get_points_table(user, channel)
     return PlainTextResponse(
         f"🃏 Blackjack 🃏\n"
         f"{user}'s hand: {', '.join(map(str, player))} (Total: {player_total})\n"
@@ -832,58 +3434,294 @@ async def blackjack(user: str, wager: str, channel: str = DEFAULT_CHANNEL):
     )
 
 # ——— /raffle & /join & /ping ————————————————————————————————————————
-raffle = {"active": False, "amount": 0, "participants": set(), "task": None}
-
-async def raffle_timer(channel: str):
-    await asyncio.sleep(30)
-    entrants = list(raffle["participants"])
-    winners  = random.sample(entrants, k=min(3, len(entrants))) if entrants else []
-    split    = raffle["amount"] // max(1, len(winners))
-    for w in winners:
-        await add_user_points(w, channel, split)
-
-    name = get_points_name(channel)
-    if winners:
-        announcement = f"🎉 Raffle in #{channel}! Winners: {', '.join(winners)} — each wins {split} {name}! 🎉"
-    else:
-        announcement = f"😢 Raffle ended with no entrants in #{channel}."
+class Raffle:
+    """One channel's raffle: entrants in join order, plus a set for O(1) dedupe."""
+    __slots__ = ("channel", "amount", "duration", "max_entrants", "entrants", "seen", "task")
+
+    def __init__(self, channel: str, amount: int, duration: int, max_entrants: int):
+        self.channel      = channel
+        self.amount       = amount
+        self.duration     = duration
+        self.max_entrants = max_entrants
+        self.entrants: List[str] = []
+        self.seen: set = set()
+        self.task = None
+
+    def join(self, user: str) -> str:
+        key = user.lower()
+        if key in self.seen:
+            return "already"
+        if len(self.entrants) >= self.max_entrants:
+            return "full"
+        self.seen.add(key)
+        self.entrants.append(user)
+        return "joined"
+
+    def draw(self, k: int) -> List[str]:
+        # sampling indices from the entrant list is O(k), whatever its size
+        return random.sample(self.entrants, k=min(k, len(self.entrants)))
+
+class RaffleManager:
+    """Concurrent raffles, one per channel, each timed by its own task."""
+    def __init__(self):
+        self.active: Dict[str, Raffle] = {}
+
+    async def start(self, channel: str, amount: int, duration: int, max_entrants: int):
+        if channel in self.active:
+            raise HTTPException(400, "A raffle is already running!")
+        r = Raffle(channel, amount, duration, max_entrants)
+        self.active[channel] = r
+        r.task = asyncio.create_task(self._run(r))
+
+    async def join(self, channel: str, user: str) -> tuple:
+        """(status, entrants, max_entrants); status as Raffle.join."""
+        r = self.active.get(channel)
+        if r is None:
+            raise HTTPException(400, "No raffle is currently running.")
+        return r.join(user), len(r.entrants), r.max_entrants
+
+    def sizes(self) -> dict:
+        return {(chan,): len(r.entrants) for chan, r in self.active.items()}
+
+    # timers are per-raffle tasks in whichever worker started them
+    def start_timers(self):
+        pass
 
-    try:
-        r, w = await asyncio.open_connection('irc.chat.twitch.tv', 6667)
-        w.write(f"PASS {BOT_OAUTH}\r\n".encode())
-        w.write(f"NICK {BOT_NICK}\r\n".encode())
-        w.write("CAP REQ :twitch.tv/membership twitch.tv/tags twitch.tv/commands\r\n".encode())
-        w.write(f"JOIN #{channel}\r\n".encode())
-        await w.drain()
-        await asyncio.sleep(1)
-        w.write(f"PRIVMSG #{channel} :{announcement}\r\n".encode())
-        await w.drain()
-        w.close()
-        await w.wait_closed()
-    except:
+    async def stop_timers(self):
         pass
 
-    raffle.update(active=False, task=None)
-    raffle["participants"].clear()
+    async def _run(self, r: Raffle):
+        try:
+            await asyncio.sleep(r.duration)
+        finally:
+            self.active.pop(r.channel, None)
+        try:
+            await self.finish(r)
+        except Exception as e:
+            print(f"Raffle error in {r.channel}:", e)
+
+    async def finish(self, r: Raffle):
+        winners = r.draw(RAFFLE_WINNERS)
+        split   = r.amount // max(1, len(winners))
+        # all winners are paid in a single transaction
+        await bulk_add_points(winners, r.channel, split, chunk_size=None)
+        await self.announce_result(r, winners, split)
+
+    async def announce_result(self, r: Raffle, winners: List[str], split: int):
+        RAFFLE_SIZE.observe(len(r.entrants))
+        name = await get_points_name(r.channel)
+        if winners:
+            announcement = f"🎉 Raffle in #{r.channel}! Winners: {', '.join(winners)} — each wins {split} {name}! 🎉"
+        else:
+            announcement = f"😢 Raffle ended with no entrants in #{r.channel}."
+        await announce(r.channel, announcement)
+
+def _open_raffle(conn: sqlite3.Connection, channel: str, amount: int, ends: float, max_entrants: int) -> bool:
+    return conn.execute(
+        "INSERT OR IGNORE INTO raffles(channel, amount, ends, max_entrants) VALUES(?, ?, ?, ?)",
+        (channel, amount, ends, max_entrants)
+    ).rowcount == 1
+
+def _join_raffle(conn: sqlite3.Connection, channel: str, user: str, now: float) -> Optional[tuple]:
+    row = conn.execute("SELECT entrants, max_entrants FROM raffles WHERE channel = ? AND ends > ?",
+                       (channel, now)).fetchone()
+    if row is None:
+        return None
+    count, cap = row
+    if conn.execute("SELECT 1 FROM raffle_entrants WHERE channel = ? AND user_key = ?",
+                    (channel, user.lower())).fetchone():
+        return "already", count, cap
+    if count >= cap:
+        return "full", count, cap
+    conn.execute("INSERT INTO raffle_entrants(channel, user_key, username) VALUES(?, ?, ?)",
+                 (channel, user.lower(), user))
+    conn.execute("UPDATE raffles SET entrants = entrants + 1 WHERE channel = ?", (channel,))
+    return "joined", count + 1, cap
+
+def _settle_raffles(conn: sqlite3.Connection, now: float) -> List[tuple]:
+    """
+    Draw every raffle past its end, pay its winners and take it out of the
+    tables, all in one transaction: a raffle is either still there to be
+    drawn or already paid. Returns (raffle, winners, split) for each.
+    """
+    settled = []
+    for channel, amount, cap in conn.execute(
+        "SELECT channel, amount, max_entrants FROM raffles WHERE ends <= ?", (now,)
+    ).fetchall():
+        r = Raffle(channel, amount, 0, cap)
+        r.entrants = [u for (u,) in conn.execute(
+            "SELECT username FROM raffle_entrants WHERE channel = ? ORDER BY rowid", (channel,)
+        )]
+        winners = r.draw(RAFFLE_WINNERS)
+        split   = r.amount // max(1, len(winners))
+        if winners:
+            _bulk_credit(conn, channel, winners, split)
+        conn.execute("DELETE FROM raffle_entrants WHERE channel = ?", (channel,))
+        conn.execute("DELETE FROM raffles WHERE channel = ?", (channel,))
+        settled.append((r, winners, split))
+    return settled
+
+class SharedRaffles(RaffleManager):
+    """
+    Raffles kept in the raffles / raffle_entrants tables, for shared state:
+    any worker can start or join one (dedupe and the entrant cap are checked
+    in the join transaction), and only the leader runs timers. It polls for
+    raffles past their end and settles each in a single transaction (draw,
+    payout, delete), so a raffle is paid exactly once even if the lease
+    changes hands or the worker dies mid-draw; the announcement follows the
+    commit.
+    """
+    def __init__(self, poll: float = RAFFLE_POLL):
+        super().__init__()
+        self.poll   = poll
+        self.counts: Dict[str, int] = {}    # as of the leader's last poll
+        self._task  = None
+
+    async def start(self, channel: str, amount: int, duration: int, max_entrants: int):
+        if not await dbx.write(_open_raffle, channel, amount, time.time() + duration, max_entrants):
+            raise HTTPException(400, "A raffle is already running!")
+
+    async def join(self, channel: str, user: str) -> tuple:
+        result = await dbx.write(_join_raffle, channel, user, time.time())
+        if result is None:
+            raise HTTPException(400, "No raffle is currently running.")
+        return result
+
+    def sizes(self) -> dict:
+        return {(chan,): n for chan, n in self.counts.items()}
+
+    def start_timers(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._timer_loop())
+
+    async def stop_timers(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self.counts = {}
+
+    async def _timer_loop(self):
+        while True:
+            try:
+                rows = await dbx.fetchall("SELECT channel, entrants, ends FROM raffles")
+                self.counts = {chan: n for chan, n, _ in rows}
+                now = time.time()
+                if any(ends <= now for _, _, ends in rows):
+                    for r, winners, split in await dbx.write(_settle_raffles, now):
+                        self.counts.pop(r.channel, None)
+                        balances_changed(r.channel)
+                        try:
+                            await self.announce_result(r, winners, split)
+                        except Exception as e:
+                            print(f"Raffle error in {r.channel}:", e)
+            except Exception as e:
+                print("Raffle timer error:", e)
+            await asyncio.sleep(self.poll)
+
+raffles = SharedRaffles() if SHARED_STATE else RaffleManager()
+GaugeMetric("raffle_active_entrants", "Entrants in running raffles.", ("channel",),
+            collect=lambda: raffles.sizes())
+
+async def announce(channel: str, text: str):
+    chat.send(channel, text)
 
 @app.get("/raffle")
-async def start_raffle(amount: int, channel: str = DEFAULT_CHANNEL):
-    if raffle["active"]:
-        raise HTTPException(400, "A raffle is already running!")
+async def start_raffle(amount: int, channel: str = DEFAULT_CHANNEL,
+                       duration: int = RAFFLE_DURATION, max_entrants: int = RAFFLE_MAX_ENTRANTS):
     if amount <= 0:
         raise HTTPException(400, "Amount must be positive")
-    raffle.update(active=True, amount=amount, participants=set(),
-                  task=asyncio.create_task(raffle_timer(channel)))
-    name = get_points_name(channel)
-    return PlainTextResponse(f"🎉 Raffle started in #{channel} for {amount} {name}! Type !join to enter (30s).")
+    if duration <= 0 or max_entrants <= 0:
+        raise HTTPException(400, "Duration and entrant cap must be positive")
+    await raffles.start(channel, amount, duration, max_entrants)
+    name = await get_points_name(channel)
+    return PlainTextResponse(f"🎉 Raffle started in #{channel} for {amount} {name}! Type !join to enter ({duration}s).")
 
 @app.get("/join")
-async def join_raffle(user: str):
-    if not raffle["active"]:
-        raise HTTPException(400, "No raffle is currently running.")
-    raffle["participants"].add(user)
-    return PlainTextResponse(f"✅ {user} joined the raffle ({len(raffle['participants'])} entrants).")
+async def join_raffle(user: str, channel: str = DEFAULT_CHANNEL):
+    clean_user = user.lstrip("@").strip()
+    status, count, cap = await raffles.join(channel, clean_user)
+    if status == "full":
+        return PlainTextResponse(f"❌ Sorry {clean_user}, the raffle is full ({cap} entrants).")
+    if status == "already":
+        return PlainTextResponse(f"👍 {clean_user}, you're already in the raffle ({count} entrants).")
+    return PlainTextResponse(f"✅ {clean_user} joined the raffle ({count} entrants).")
 
 @app.get("/ping")
 async def ping():
     return {"status": "alive"}
+
+# ——— Lifecycle ——————————————————————————————————————————————————
+# Startup does only what a correct first response needs: the schema check
+# (a single pragma read on a file that is already current), the league and
+# the rob cooldowns. What talks to the outside world (the leader lease,
+# whose holder connects to IRC and runs reward ticks, and the keep-alive
+# ping) and the heavy optional imports wait
+# until the first request has been answered, or STARTUP_DEFER seconds if
+# none arrives, so a cold start's first byte never waits on Twitch.
+WARM_IMPORTS = ("numpy",)
+
+class Lifecycle:
+    def __init__(self):
+        self.pending  = False     # startup done, background not started yet
+        self.timings: Dict[str, float] = {}
+        self._first   = None
+        self._boot    = None
+        self._pinger  = None
+
+    async def startup(self):
+        start = time.perf_counter()
+        if SHARED_STATE:
+            print(f"State: shared through {DB_FILE} (WEB_CONCURRENCY={WORKERS}, pid {os.getpid()})")
+        else:
+            print("State: in this process only; set WEB_CONCURRENCY or SHARED_STATE=1 for several workers")
+        await asyncio.gather(load_league(), cooldowns.start())
+        self._first  = asyncio.Event()
+        self.pending = True
+        self._boot   = asyncio.create_task(self._start_background())
+        self.timings["startup"] = time.perf_counter() - start
+
+    def request_served(self):
+        """Called by the middleware after each response until background work starts."""
+        if self._first is not None:
+            self._first.set()
+
+    async def _start_background(self):
+        try:
+            await asyncio.wait_for(self._first.wait(), STARTUP_DEFER)
+        except asyncio.TimeoutError:
+            pass
+        self.pending = False
+        start = time.perf_counter()
+        leader.start()
+        if KEEPALIVE_URL:
+            self._pinger = asyncio.create_task(keepalive(KEEPALIVE_URL, KEEPALIVE_INTERVAL))
+        await asyncio.to_thread(warm_imports)
+        self.timings["background"] = time.perf_counter() - start
+
+    async def shutdown(self):
+        self.pending = False
+        tasks = [t for t in (self._boot, self._pinger) if t is not None]
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._boot = self._pinger = None
+        await cooldowns.stop()
+        await leader.stop()
+        await chat.stop()
+        await presence.stop()
+        # last, so everything above can still write
+        if ledger is not None:
+            await ledger.close()
+        await asyncio.to_thread(dbx.close)
+        db.close()
+
+def warm_imports():
+    for name in WARM_IMPORTS:
+        try:
+            __import__(name)
+        except ImportError:
+            pass
+    get_templates()
+
+lifecycle = Lifecycle()